@@ -0,0 +1,265 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, request, jsonify, g
+from sqlalchemy.exc import IntegrityError
+from extensions import db, begin_immediate
+from models import ApiToken, AppSetting, MediaItem, Stocktake, generate_inventory_number, replace_tracks, normalize_barcode, find_barcode_duplicates, DUPLICATE_CHECK_MAX
+from export_utils import build_location_paths
+from import_utils import category_lookup
+from changes import changes_since, min_cursor, maybe_prune_tombstones, CHANGES_DEFAULT_LIMIT, CHANGES_MAX_LIMIT
+from stocktake import add_scans, subtree_contains, STOCKTAKE_MAX_BATCH
+
+# JSON API for scanner apps and other clients. Authenticated with bearer tokens
+# (Settings > API), so it is exempt from CSRF protection (see app.py).
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+API_MAX_BATCH = 1000
+TOKEN_TOUCH_INTERVAL = timedelta(minutes=5)  # last_used_at is only written this often
+
+def api_error(message, status):
+    return jsonify({'success': False, 'message': message}), status
+
+def token_required(f):
+    """Resolves 'Authorization: Bearer <token>' to g.api_user, 401 otherwise."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = ApiToken.find(header[7:].strip()) if header.startswith('Bearer ') else None
+        if token is None or token.user is None:
+            return api_error('Invalid or missing API token', 401)
+
+        now = datetime.utcnow()
+        if token.last_used_at is None or now - token.last_used_at > TOKEN_TOUCH_INTERVAL:
+            token.last_used_at = now
+            db.session.commit()
+        g.api_user = token.user
+        return f(*args, **kwargs)
+    return decorated
+
+@api.route('/locations')
+@token_required
+def locations():
+    """All locations with their full path, for clients that reference locations by id."""
+    paths = build_location_paths()
+    return jsonify({'success': True, 'locations': [{'id': loc_id, 'path': path} for loc_id, path in sorted(paths.items(), key=lambda x: x[1])]})
+
+@api.route('/changes')
+@token_required
+def changes():
+    """
+    Incremental sync: GET /api/v1/changes?since=<cursor>&limit=<n>.
+    Start with since=0, then pass the returned cursor; repeat while 'more' is true.
+    A cursor older than the kept tombstones gets 410: drop the local copy and start again at 0.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', CHANGES_DEFAULT_LIMIT, type=int), 1), CHANGES_MAX_LIMIT)
+    maybe_prune_tombstones()
+    if 0 < since < min_cursor():
+        return api_error('Cursor too old, deletions were pruned: sync again from since=0', 410)
+    return jsonify({'success': True, **changes_since(since, limit)})
+
+@api.route('/items/check_duplicates', methods=['POST'])
+@token_required
+def check_duplicates():
+    """
+    Batch duplicate check for scanners: {"codes": [...]} -> {"duplicates": {code: [{id, inventory_number, title}]}}.
+    Codes are compared by normalized key (ISBN-10/ISBN-13, UPC/EAN).
+    """
+    data = request.get_json(silent=True)
+    codes = data.get('codes') if isinstance(data, dict) else None
+    if not isinstance(codes, list):
+        return api_error("Expected a JSON object with a 'codes' list", 400)
+    if len(codes) > DUPLICATE_CHECK_MAX:
+        return api_error(f"At most {DUPLICATE_CHECK_MAX} codes per batch", 413)
+    found = find_barcode_duplicates(str(c) for c in codes if c is not None)
+    return jsonify({'success': True, 'duplicates': {
+        code: [{'id': i.id, 'inventory_number': i.inventory_number, 'title': i.title} for i in items]
+        for code, items in found.items()}})
+
+# -- BATCH CREATE / UPDATE --
+
+class BatchContext:
+    """Lookups for one batch, each loaded with a single query instead of one per item."""
+
+    def __init__(self, entries):
+        self.categories = category_lookup()
+        paths = build_location_paths()
+        self.location_ids = set(paths)
+        self.location_paths = {path.lower(): loc_id for loc_id, path in paths.items()}
+
+        ids = {e['id'] for e in entries if isinstance(e.get('id'), int)}
+        numbers = {e['inventory_number'] for e in entries if isinstance(e.get('inventory_number'), str)}
+        self.by_id = {i.id: i for i in MediaItem.query.filter(MediaItem.id.in_(ids))} if ids else {}
+        self.by_number = {i.inventory_number: i for i in MediaItem.query.filter(MediaItem.inventory_number.in_(numbers))} if numbers else {}
+
+        setting = AppSetting.query.filter_by(key='duplicate_check').first()
+        self.duplicate_check = bool(setting and setting.value == 'true')
+        self.barcode_keys = set()
+        if self.duplicate_check:
+            found = find_barcode_duplicates(str(e['barcode']) for e in entries if e.get('barcode'))
+            self.barcode_keys = {normalize_barcode(code) for code in found}
+
+    def resolve_location(self, entry):
+        if entry.get('location_id') is not None:
+            loc_id = entry['location_id']
+            if not isinstance(loc_id, int) or loc_id not in self.location_ids:
+                raise ValueError(f"unknown location_id {loc_id!r}")
+            return loc_id
+        path = " > ".join(p.strip() for p in str(entry['location']).split('>') if p.strip()).lower()
+        if path not in self.location_paths:
+            raise ValueError(f"unknown location '{entry['location']}'")
+        return self.location_paths[path]
+
+def _text(entry, key, max_length=None):
+    value = entry.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return (value[:max_length] if max_length else value) or None
+
+def parse_entry(entry, ctx):
+    """Validates a batch entry. Returns (item fields, tracks or None), raises ValueError."""
+    if not isinstance(entry, dict):
+        raise ValueError("entry must be an object")
+
+    # Only the fields present in the entry are changed (partial update)
+    values = {}
+    if 'title' in entry:
+        if not _text(entry, 'title'):
+            raise ValueError("title must not be empty")
+        values['title'] = _text(entry, 'title', 200)
+    if 'author_artist' in entry:
+        values['author_artist'] = _text(entry, 'author_artist', 200)
+    if 'description' in entry:
+        values['description'] = _text(entry, 'description')
+    if 'category' in entry:
+        category = ctx.categories.get(str(entry['category']).lower())
+        if not category:
+            raise ValueError(f"unknown category '{entry['category']}'")
+        values['category'] = category
+    if 'release_year' in entry:
+        year = entry['release_year']
+        if year not in (None, '') and not str(year).isdigit():
+            raise ValueError(f"invalid release_year '{year}'")
+        values['release_year'] = int(year) if year not in (None, '') else None
+    if 'barcode' in entry:
+        values['barcode'] = _text(entry, 'barcode', 50)
+    if 'location_id' in entry or 'location' in entry:
+        values['location_id'] = ctx.resolve_location(entry)
+    if 'lent_to' in entry:
+        values['lent_to'] = _text(entry, 'lent_to', 100)
+
+    tracks = entry.get('tracks')
+    if tracks is not None:
+        if not isinstance(tracks, list):
+            raise ValueError("tracks must be a list")
+        parsed = []
+        for idx, t in enumerate(tracks):
+            if not isinstance(t, dict) or not str(t.get('title') or '').strip():
+                raise ValueError(f"track {idx + 1}: title is missing")
+            position = t.get('position')
+            parsed.append({'title': str(t['title']).strip()[:200],
+                           'position': position if isinstance(position, int) else idx + 1,
+                           'duration': _text(t, 'duration', 20)})
+        tracks = parsed
+    return values, tracks
+
+def apply_entry(entry, ctx):
+    """Creates or updates one item from a batch entry. Returns (status, item), raises ValueError."""
+    values, tracks = parse_entry(entry, ctx)
+
+    item = None
+    if entry.get('id') is not None:
+        item = ctx.by_id.get(entry['id'])
+        if item is None:
+            raise ValueError(f"item {entry['id']!r} not found")
+    elif entry.get('inventory_number'):
+        item = ctx.by_number.get(str(entry['inventory_number']))
+
+    if item is None:
+        status = 'created'
+        if 'title' not in values:
+            raise ValueError("title is missing")
+        if ctx.duplicate_check and normalize_barcode(values.get('barcode')) in ctx.barcode_keys:
+            raise ValueError(f"duplicate barcode '{values['barcode']}'")
+        item = MediaItem(inventory_number=_text(entry, 'inventory_number', 50) or generate_inventory_number(),
+                         category='Sonstiges', user_id=g.api_user.id)
+        db.session.add(item)
+    else:
+        status = 'updated'
+
+    for key, value in values.items():
+        setattr(item, key, value)
+    if 'lent_to' in values:
+        if item.lent_to and not item.lent_at: item.lent_at = datetime.now()
+        if not item.lent_to: item.lent_at = None
+    db.session.flush()
+
+    # Given tracks replace the existing ones
+    if tracks is not None:
+        replace_tracks(item.id, tracks)
+
+    if item.barcode_key: ctx.barcode_keys.add(item.barcode_key)
+    ctx.by_number[item.inventory_number] = item
+    return status, item
+
+@api.route('/items/batch', methods=['POST'])
+@token_required
+def items_batch():
+    """
+    Creates/updates up to API_MAX_BATCH items in one transaction.
+    Body: {"items": [{"inventory_number"|"id": ..., "title": ..., "location": "A > B", "tracks": [...]}, ...]}
+    Entries with an existing id/inventory_number are updated, all others are created.
+    Every entry runs in its own savepoint, so a bad entry is reported without losing the others.
+    """
+    data = request.get_json(silent=True)
+    entries = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return api_error("Expected a JSON object with an 'items' list", 400)
+    if len(entries) > API_MAX_BATCH:
+        return api_error(f"At most {API_MAX_BATCH} items per batch", 413)
+
+    begin_immediate(db.session.connection())  # One transaction around the savepoints
+    ctx = BatchContext([e for e in entries if isinstance(e, dict)])
+    results = []
+    counts = {'created': 0, 'updated': 0, 'error': 0}
+    for index, entry in enumerate(entries):
+        savepoint = db.session.begin_nested()
+        try:
+            status, item = apply_entry(entry, ctx)
+            savepoint.commit()
+            results.append({'index': index, 'status': status, 'id': item.id, 'inventory_number': item.inventory_number})
+        except (ValueError, IntegrityError) as e:
+            savepoint.rollback()
+            status = 'error'
+            message = str(e.orig) if isinstance(e, IntegrityError) else str(e)
+            results.append({'index': index, 'status': status, 'error': message})
+        counts[status] += 1
+
+    db.session.commit()
+    return jsonify({'success': True, 'created': counts['created'], 'updated': counts['updated'],
+                    'errors': counts['error'], 'results': results})
+
+@api.route('/stocktakes/<int:stocktake_id>/scans', methods=['POST'])
+@token_required
+def stocktake_scans(stocktake_id):
+    """Adds scanned codes to an open stocktake: {"codes": [...], "location_id": optional}."""
+    if not g.api_user.has_role('Admin'):
+        return api_error('Permission denied', 403)
+    stocktake = db.session.get(Stocktake, stocktake_id)
+    if stocktake is None:
+        return api_error('Stocktake not found', 404)
+    if stocktake.status != 'open':
+        return api_error('Stocktake is closed', 409)
+
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    if not isinstance(codes, list) or len(codes) > STOCKTAKE_MAX_BATCH:
+        return api_error(f'Expected {{"codes": [...]}} with at most {STOCKTAKE_MAX_BATCH} entries', 400)
+    location_id = data.get('location_id')
+    if location_id is not None and (not isinstance(location_id, int) or not subtree_contains(stocktake, location_id)):
+        return api_error('location_id is not part of the audited location', 400)
+
+    added = add_scans(stocktake, codes, location_id)
+    db.session.commit()
+    return jsonify({'success': True, 'added': added, 'scans': stocktake.scans.count()})
@@ -1,140 +1,120 @@
 import os
 from datetime import timedelta
-from flask import Flask
-from sqlalchemy import text, inspect
-from extensions import db, login_manager, csrf
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from extensions import db, login_manager, csrf, use_sqlite_pragmas, SQLITE_PRAGMAS, parse_sqlite_pragmas
 from routes import main, create_initial_data
+from api import api
+from migrations import upgrade_database
+from backup_utils import recover_interrupted_restore
+from backup_chain import backup_cli
+from backup_schedule import parse_cron, start_backup_scheduler
+from replication import replica_cli, start_replicator
+
+def create_app(config=None):
+    """
+    Application factory. Only configures the app, it does not touch the database, so
+    a WSGI server can preload it and fork workers. Schema migrations and default data
+    are a separate step: `flask --app app init-db` (python app.py does both).
+    """
+    # 1. instance_relative_config=True activates the separate "instance" folder for the DB
+    app = Flask(__name__, instance_relative_config=True)
+
+    # -- CONFIGURATION --
+
+    # 2. Set database path dynamically
+    # The database now lands in: /app/instance/inventory.db
+    db_filename = 'inventory.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, db_filename)}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Continuous WAL replication (replication.py), off without REPLICA_DIR
+    app.config['REPLICA_DIR'] = os.environ.get('REPLICA_DIR') or ''
+    app.config['REPLICA_INTERVAL'] = float(os.environ.get('REPLICA_INTERVAL') or 1)
+    app.config['REPLICA_SNAPSHOT_HOURS'] = float(os.environ.get('REPLICA_SNAPSHOT_HOURS') or 24)
+    app.config['REPLICA_RETENTION_DAYS'] = float(os.environ.get('REPLICA_RETENTION_DAYS') or 7)
+
+    # SQLite tuning (WAL, cache, mmap, busy timeout); single values can be overridden,
+    # e.g. SQLITE_PRAGMAS="cache_size=-64000,mmap_size=0"
+    # With replication only the replicator checkpoints, after it has copied the frames
+    replica_pragmas = {'wal_autocheckpoint': '0'} if app.config['REPLICA_DIR'] else {}
+    app.config['SQLITE_PRAGMAS'] = {**SQLITE_PRAGMAS, **replica_pragmas, **parse_sqlite_pragmas(os.environ.get('SQLITE_PRAGMAS'))}
+
+    # Secret Key (Ideally load via environment variable later)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-bitte-aendern')
+
+    # Remember Me: Stay logged in for 7 days
+    app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=7)
+
+    # Upload Configuration
+    # We use app.root_path to ensure we stay in the app directory
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static/uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 128 * 1024 * 1024  # Max 128 MB
+
+    # Incremental backups (flask --app app backup ...), ideally on another disk
+    app.config['BACKUP_FOLDER'] = os.environ.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+    # Automatic backups (cron syntax, e.g. "30 3 * * *"; off unless set), read limit in MB/s and retention
+    schedule = os.environ.get('BACKUP_SCHEDULE') or ''
+    app.config['BACKUP_SCHEDULE'] = '' if schedule.strip().lower() == 'off' else schedule
+    app.config['BACKUP_IO_LIMIT'] = float(os.environ.get('BACKUP_IO_LIMIT') or 20)
+    app.config['BACKUP_KEEP_DAILY'] = int(os.environ.get('BACKUP_KEEP_DAILY') or 7)
+    app.config['BACKUP_KEEP_WEEKLY'] = int(os.environ.get('BACKUP_KEEP_WEEKLY') or 4)
+    app.config['BACKUP_KEEP_MONTHLY'] = int(os.environ.get('BACKUP_KEEP_MONTHLY') or 6)
+
+    if config:
+        app.config.update(config)
+    if app.config['BACKUP_SCHEDULE']:
+        parse_cron(app.config['BACKUP_SCHEDULE'])  # Fail at startup, not at 3 am
 
-# 1. instance_relative_config=True activates the separate "instance" folder for the DB
-app = Flask(__name__, instance_relative_config=True)
-
-# -- CONFIGURATION --
-
-# 2. Set database path dynamically
-# The database now lands in: /app/instance/inventory.db
-db_filename = 'inventory.db'
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, db_filename)}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Secret Key (Ideally load via environment variable later)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-bitte-aendern')
-
-# Remember Me: Stay logged in for 7 days
-app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=7)
-
-# Upload Configuration
-# We use app.root_path to ensure we stay in the app directory
-app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static/uploads')
-app.config['MAX_CONTENT_LENGTH'] = 128 * 1024 * 1024  # Max 128 MB
-
-# -- INITIALIZATION --
-db.init_app(app)
-login_manager.init_app(app)
-csrf.init_app(app)
-login_manager.login_view = 'main.login'
-
-app.register_blueprint(main)
-
-if __name__ == '__main__':
     # 3. IMPORTANT: Create folders if they don't exist
     # This prevents crashes when starting the app for the first time (or without Docker Volume).
-    
-    # Instance Folder (for database)
-    try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass # Folder already exists, all good
-
-    # Upload Folder (for images)
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
+    os.makedirs(app.instance_path, exist_ok=True)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-    # Database Initialization
+    # -- INITIALIZATION --
+    db.init_app(app)
+    with app.app_context():
+        use_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    login_manager.init_app(app)
+    csrf.init_app(app)
+    login_manager.login_view = 'main.login'
+
+    app.register_blueprint(main)
+
+    # The JSON API authenticates with bearer tokens instead of the session cookie
+    csrf.exempt(api)
+    app.register_blueprint(api)
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(backup_cli)
+    app.cli.add_command(replica_cli)
+    return app
+
+def init_db():
+    # A restore killed mid-swap (container stopped) is rolled back first
+    if recover_interrupted_restore():
+        current_app.logger.warning("Interrupted restore rolled back")
+    # Creates a new database or applies the pending migrations (see migrations.py)
+    upgrade_database()
+
+    # Create Admin User & Default Data
+    create_initial_data()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or migrate the database and add the default data."""
+    init_db()
+    click.echo('Database is up to date.')
 
+if __name__ == '__main__':
+    # Development server (single process). Production: see wsgi.py / gunicorn.conf.py
+    app = create_app()
     with app.app_context():
-        # Creates tables only if the file inventory.db does not exist/is empty
-        db.create_all()
-
-        # -- MIGRATION CHECK --
-        try:
-            inspector = inspect(db.engine)
-            if 'user' in inspector.get_table_names():
-                columns = [col['name'] for col in inspector.get_columns('user')]
-                if 'language' not in columns:
-                    with db.engine.connect() as conn:
-                        conn.execute(text("ALTER TABLE user ADD COLUMN language VARCHAR(10) DEFAULT 'en'"))
-                        conn.commit()
-                
-                if 'theme' not in columns:
-                    with db.engine.connect() as conn:
-                        conn.execute(text("ALTER TABLE user ADD COLUMN theme VARCHAR(20) DEFAULT 'cerulean'"))
-                        conn.commit()
-
-                if 'sort_field' not in columns:
-                    with db.engine.connect() as conn:
-                        conn.execute(text("ALTER TABLE user ADD COLUMN sort_field VARCHAR(50) DEFAULT 'added'"))
-                        conn.commit()
-
-                if 'sort_order' not in columns:
-                    with db.engine.connect() as conn:
-                        conn.execute(text("ALTER TABLE user ADD COLUMN sort_order VARCHAR(10) DEFAULT 'desc'"))
-                        conn.commit()
-
-            if 'media_item' in inspector.get_table_names():
-                # On SQLite, UNIQUE constraints can be represented as indexes OR unique constraints
-                indexes = inspector.get_indexes('media_item')
-                constraints = inspector.get_unique_constraints('media_item')
-                
-                has_unique_barcode = False
-                # Check indexes
-                for idx in indexes:
-                    if 'barcode' in idx['column_names'] and idx['unique']:
-                        has_unique_barcode = True
-                        break
-                
-                # Check unique constraints if not found in indexes
-                if not has_unique_barcode:
-                    for cnst in constraints:
-                        if 'barcode' in cnst['column_names']:
-                            has_unique_barcode = True
-                            break
-                
-                if has_unique_barcode:
-                    try:
-                        with db.engine.connect() as conn:
-                            # 1. Disable FKs
-                            conn.execute(text("PRAGMA foreign_keys=OFF"))
-                            
-                            # 2. Rename old table
-                            conn.execute(text("ALTER TABLE media_item RENAME TO media_item_old"))
-                            conn.commit()
-                        
-                        # 3. Create new table (with current model: unique=False)
-                        db.create_all()
-                        
-                        with db.engine.connect() as conn:
-                            # 4. Copy data (explicit columns to avoid issues with order/count)
-                            cols = "id, inventory_number, barcode, title, category, author_artist, release_year, description, image_filename, location_id, collection_id, volume_number, lent_to, lent_at, created_at, user_id"
-                            conn.execute(text(f"INSERT INTO media_item ({cols}) SELECT {cols} FROM media_item_old"))
-                            
-                            # 5. Drop old table
-                            conn.execute(text("DROP TABLE media_item_old"))
-                            
-                            # 6. Re-enable FKs
-                            conn.execute(text("PRAGMA foreign_keys=ON"))
-                            conn.commit()
-                    except Exception:
-                        # Clean up if possible
-                        try:
-                            with db.engine.connect() as conn:
-                                conn.execute(text("PRAGMA foreign_keys=ON"))
-                                conn.commit()
-                        except: pass
-        except Exception:
-            pass
-        
-        # Create Admin User & Default Data
-        create_initial_data()
-        
+        init_db()
+    start_backup_scheduler(app)
+    start_replicator(app)
+
     # Start
     app.run(host='0.0.0.0', port=5000, debug=False)
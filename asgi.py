@@ -0,0 +1,87 @@
+import io
+import os
+import re
+import asyncio
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask_login import current_user
+from app import create_app
+from routes import get_config_value, set_config_value
+from lookups import LOOKUPS, lookup_client, lookup_ready
+
+# Production entry point (uvicorn workers under gunicorn, see gunicorn.conf.py).
+# The external lookups run as coroutines on the event loop of the worker, so any number
+# of them can wait on Discogs & co. at once without occupying a thread. Every other
+# request goes to the Flask app on its own pool of WEB_THREADS threads, which therefore
+# stays free for pages no matter how many scanners are waiting.
+
+flask_app = create_app()
+pages = WSGIMiddleware(flask_app, workers=int(os.environ.get('WEB_THREADS') or 4))
+
+def _search_args(match, query):
+    return {'artist': query.get('artist', '').strip(), 'title': query.get('title', '').strip()}
+
+# GET path -> (lookup, arguments); same URLs and answers as the Flask routes
+ASYNC_ROUTES = [
+    (re.compile(r'/api/lookup/([^/]+)'), 'barcode', lambda match, query: {'barcode': match.group(1)}),
+    (re.compile(r'/api/search_discogs'), 'discogs', _search_args),
+    (re.compile(r'/api/spotify/search'), 'spotify', _search_args),
+]
+
+_client = None  # One connection pool per worker process, opened at startup
+
+def _shared_client():
+    global _client
+    if _client is None:
+        _client = lookup_client()
+    return _client
+
+def _load_settings(scope, name):
+    """Session check and settings in a Flask request context (on a thread: DB access blocks)."""
+    with flask_app.request_context(build_environ(scope, io.BytesIO())):
+        if not current_user.is_authenticated:
+            return None
+        return {key: get_config_value(key) for key in LOOKUPS[name][1]}
+
+def _save_settings(updates):
+    with flask_app.app_context():
+        for key, value in updates.items():
+            set_config_value(key, value)
+
+async def _lookup(scope, receive, send, name, args):
+    settings = await asyncio.to_thread(_load_settings, scope, name)
+    if settings is None or not lookup_ready(name, settings, args):
+        # Not logged in, not configured, missing input: the Flask route answers as usual
+        return await pages(scope, receive, send)
+
+    data, updates = await LOOKUPS[name][0](_shared_client(), settings, **args)
+    if updates:
+        await asyncio.to_thread(_save_settings, updates)
+
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': flask_app.json.dumps(data).encode()})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _shared_client()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _client is not None:
+                await _client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, name, get_args in ASYNC_ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                query = {key: values[0] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+                return await _lookup(scope, receive, send, name, get_args(match, query))
+    await pages(scope, receive, send)
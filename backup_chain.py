@@ -0,0 +1,269 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import time
+import zipfile
+import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from backup_utils import snapshot_database, restore_database_file, BACKUP_CHUNK_SIZE
+
+# Incremental backups. Each archive in the backup folder holds the database snapshot, the
+# images that are new or changed since the previous archive and a manifest.json with the
+# complete upload folder at that point: path -> size, mtime, sha256 and the archive that
+# holds the file. Any archive can therefore be restored from itself plus the archives its
+# manifest points to (its chain), without replaying the chain in order.
+# Unchanged size + mtime reuse the previous hash, so a backup only reads new covers.
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+def backup_folder():
+    path = current_app.config['BACKUP_FOLDER']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def list_backups():
+    """Archive names in the backup folder, oldest first (the names sort by time)."""
+    return sorted(name for name in os.listdir(backup_folder())
+                  if name.startswith('backup_') and name.endswith('.zip'))
+
+def read_manifest(name):
+    with zipfile.ZipFile(os.path.join(backup_folder(), name)) as zipf:
+        return json.loads(zipf.read(MANIFEST_NAME))
+
+class IOThrottle:
+    """Limits the bytes read per second (scheduled backups leave disk time to the app)."""
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self._start = time.monotonic()
+        self._bytes = 0
+
+    def consume(self, count):
+        self._bytes += count
+        ahead = self._bytes / self.rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def _chunks(fileobj, throttle=None):
+    while True:
+        chunk = fileobj.read(BACKUP_CHUNK_SIZE)
+        if not chunk:
+            return
+        if throttle:
+            throttle.consume(len(chunk))
+        yield chunk
+
+def file_hash(fileobj, throttle=None):
+    digest = hashlib.sha256()
+    for chunk in _chunks(fileobj, throttle):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def _hash_path(path, throttle=None):
+    with open(path, 'rb') as f:
+        return file_hash(f, throttle)
+
+def _archive_file(zipf, path, arcname, compress_type, throttle=None):
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = compress_type
+    with open(path, 'rb') as src, zipf.open(info, 'w') as dest:
+        for chunk in _chunks(src, throttle):
+            dest.write(chunk)
+
+def _scan_uploads(previous, throttle=None):
+    """Current upload folder as manifest entries; `archive` is None for new/changed files."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    files = {}
+    for root, dirs, names in os.walk(upload_folder):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]  # Staging folders of a running restore
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, upload_folder).replace(os.sep, '/')
+            stat = os.stat(path)
+            old = previous.get(rel)
+            if old and old['size'] == stat.st_size and old['mtime'] == int(stat.st_mtime):
+                files[rel] = dict(old)
+            else:
+                files[rel] = {'size': stat.st_size, 'mtime': int(stat.st_mtime), 'sha256': _hash_path(path, throttle), 'archive': None}
+                if old and old['sha256'] == files[rel]['sha256']:
+                    files[rel]['archive'] = old['archive']  # Touched, same content
+    return files
+
+def create_incremental_backup(full=False, throttle=None):
+    """
+    Writes the next archive of the chain to the backup folder and returns its manifest.
+    The first backup (or full=True) archives every image. An IOThrottle limits the
+    reading of images (the database snapshot itself is one short read transaction).
+    """
+    folder = backup_folder()
+    existing = list_backups()
+    base = existing[-1] if existing and not full else None
+    previous = read_manifest(base)['files'] if base else {}
+
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    name = f"backup_{timestamp}_{'incremental' if base else 'full'}.zip"
+    if name in existing:
+        raise Exception(f"Backup {name} already exists.")
+
+    files = _scan_uploads(previous, throttle)
+    added = sorted(rel for rel, entry in files.items() if entry['archive'] is None)
+    for rel in added:
+        files[rel]['archive'] = name
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    fd, snapshot_path = tempfile.mkstemp(dir=folder, suffix='.sqlite')
+    os.close(fd)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    os.close(fd)
+    try:
+        snapshot_database(snapshot_path)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'name': name,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'base': base,
+            'database': {'size': os.path.getsize(snapshot_path), 'sha256': _hash_path(snapshot_path)},
+            'added': len(added),
+            'files': files
+        }
+        with zipfile.ZipFile(tmp_path, 'w') as zipf:
+            _archive_file(zipf, snapshot_path, 'database.sqlite', zipfile.ZIP_DEFLATED, throttle)
+            for rel in added:
+                _archive_file(zipf, os.path.join(upload_folder, rel), f"uploads/{rel}", zipfile.ZIP_STORED, throttle)
+            zipf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(tmp_path, os.path.join(folder, name))  # Complete archives only
+    finally:
+        for path in (snapshot_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return manifest
+
+def backup_chain(name):
+    """Archives needed to restore `name`: itself and every archive its manifest points to."""
+    manifest = read_manifest(name)
+    return manifest, sorted({name} | {entry['archive'] for entry in manifest['files'].values()})
+
+def verify_backup(name, quick=False):
+    """
+    Checks a restore point without extracting anything: every archive of the chain is
+    present and every file in it is streamed through sha256 and compared with the
+    manifest. quick=True only compares the sizes in the ZIP directories (reads no data).
+    Returns a list of problems (empty = restorable).
+    """
+    folder = backup_folder()
+    manifest, chain = backup_chain(name)
+    wanted = {archive: {} for archive in chain}
+    for rel, entry in manifest['files'].items():
+        wanted[entry['archive']][f"uploads/{rel}"] = entry
+    wanted[name]['database.sqlite'] = manifest['database']
+
+    problems = []
+    for archive in chain:
+        path = os.path.join(folder, archive)
+        if not os.path.exists(path):
+            problems.append(f"{archive}: missing ({len(wanted[archive])} files)")
+            continue
+        with zipfile.ZipFile(path) as zipf:
+            members = {info.filename: info for info in zipf.infolist()}
+            for member, entry in wanted[archive].items():
+                if member not in members:
+                    problems.append(f"{archive}: {member} missing")
+                    continue
+                if members[member].file_size != entry['size']:
+                    problems.append(f"{archive}: {member} size mismatch")
+                    continue
+                if quick:
+                    continue
+                with zipf.open(member) as f:
+                    if file_hash(f) != entry['sha256']:
+                        problems.append(f"{archive}: {member} hash mismatch")
+    return problems
+
+def restore_incremental_backup(name):
+    """
+    Restores the database and the upload folder of a restore point from its chain.
+    Images are overwritten/added like with the ZIP upload restore.
+    """
+    problems = verify_backup(name)
+    if problems:
+        raise Exception(f"Backup {name} cannot be restored: " + '; '.join(problems[:5]))
+
+    folder = backup_folder()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    manifest, chain = backup_chain(name)
+    for archive in chain:
+        with zipfile.ZipFile(os.path.join(folder, archive)) as zipf:
+            for rel, entry in manifest['files'].items():
+                if entry['archive'] != archive:
+                    continue
+                target = os.path.normpath(os.path.join(upload_folder, rel))
+                if not target.startswith(os.path.normpath(upload_folder) + os.sep):
+                    raise Exception(f"Invalid path in manifest: {rel}")
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with zipf.open(f"uploads/{rel}") as src, open(target, 'wb') as dest:
+                    shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)
+
+    fd, snapshot_path = tempfile.mkstemp(dir=folder, suffix='.sqlite')
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(os.path.join(folder, name)) as zipf, zipf.open('database.sqlite') as src, \
+                open(snapshot_path, 'wb') as dest:
+            shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)
+        restore_database_file(snapshot_path)
+    finally:
+        os.remove(snapshot_path)
+    return manifest
+
+# -- CLI: flask --app app backup create|list|verify|restore --
+
+backup_cli = AppGroup('backup', help='Incremental backups in the backup folder.')
+
+def _resolve(name):
+    if name == 'latest':
+        names = list_backups()
+        if not names:
+            raise click.ClickException('No backups yet.')
+        return names[-1]
+    if name not in list_backups():
+        raise click.ClickException(f'Unknown backup: {name}')
+    return name
+
+@backup_cli.command('create')
+@click.option('--full', is_flag=True, help='Archive every image and start a new chain.')
+def create_command(full):
+    """Write the next backup (only new or changed images)."""
+    manifest = create_incremental_backup(full=full)
+    click.echo(f"{manifest['name']}: {manifest['added']} of {len(manifest['files'])} images archived")
+
+@backup_cli.command('list')
+def list_command():
+    """Show the backups and the archives each one needs."""
+    for name in list_backups():
+        manifest, chain = backup_chain(name)
+        click.echo(f"{name}  images: {len(manifest['files'])} (+{manifest['added']})  chain: {len(chain)} archive(s)")
+
+@backup_cli.command('verify')
+@click.argument('name', default='latest')
+@click.option('--quick', is_flag=True, help='Only check that every file is present with its size.')
+def verify_command(name, quick):
+    """Check the hashes of a restore point without extracting it."""
+    name = _resolve(name)
+    problems = verify_backup(name, quick=quick)
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise click.ClickException(f'{name}: {len(problems)} problem(s)')
+    click.echo(f'{name}: OK')
+
+@backup_cli.command('restore')
+@click.argument('name')
+@click.confirmation_option(prompt='Replace the database and images with this backup?')
+def restore_command(name):
+    """Restore database and images of a backup (stop the app first)."""
+    name = _resolve(name)
+    restore_incremental_backup(name)
+    click.echo(f'{name} restored.')
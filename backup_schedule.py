@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db
+from backup_chain import backup_cli, backup_folder, list_backups, backup_chain, create_incremental_backup, IOThrottle
+
+# Automatic backups. Every worker process runs a small scheduler thread that wakes once a
+# minute; when BACKUP_SCHEDULE (cron syntax) matches, the first worker to take the lock in
+# the backup folder writes an incremental backup (a full one every FULL_BACKUP_DAYS) and
+# prunes the archives by the retention policy. Runs and durations are kept in
+# instance/backup_status.json for the admin page.
+
+FULL_BACKUP_DAYS = 7      # A scheduled backup starts a new chain when the last full one is older
+STATUS_HISTORY = 20       # Runs kept in the status file
+STALE_TEMP_AGE = 24 * 3600  # Leftovers of interrupted runs are removed after one day
+
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]  # minute hour day month weekday (0 = Sunday)
+MONTH_DAYS = {1: 31, 2: 29, 3: 31, 4: 30, 5: 31, 6: 30, 7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31}
+NEXT_RUN_DAYS = 8 * 366  # Search window of next_run; 29 February can be 8 years away
+
+def parse_cron(expr):
+    """
+    '30 3 * * *' -> list of value sets. Supports *, lists, ranges and steps (*/15, 1-5).
+    Raises ValueError for invalid expressions and for dates that never occur (30 February).
+    """
+    parts = (expr or '').split()
+    if len(parts) != 5:
+        raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+    fields = []
+    for part, (low, high) in zip(parts, CRON_FIELDS):
+        values = set()
+        for item in part.split(','):
+            spec, _, step = item.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-', 1))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = high
+            if high == 6 and end == 7:
+                values.add(0)  # 7 = Sunday as well
+                if start == 7:
+                    continue
+                end = 6
+            if start < low or end > high or start > end:
+                raise ValueError(f"Value out of range in cron field {part!r}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        fields.append(values)
+
+    days, months, weekdays = fields[2:]
+    if len(weekdays) == 7 and not any(day <= MONTH_DAYS[month] for day in days for month in months):
+        raise ValueError(f"Cron expression never matches: {expr!r}")
+    return fields
+
+def _day_matches(fields, moment):
+    _, _, day, month, weekday = fields
+    if moment.month not in month:
+        return False
+    day_ok, weekday_ok = moment.day in day, (moment.weekday() + 1) % 7 in weekday
+    # As in cron: if day and weekday are both restricted, either one is enough
+    if len(day) < 31 and len(weekday) < 7:
+        return day_ok or weekday_ok
+    return day_ok and weekday_ok
+
+def cron_matches(fields, moment):
+    return moment.minute in fields[0] and moment.hour in fields[1] and _day_matches(fields, moment)
+
+def next_run(fields, after):
+    """First matching minute after `after`, searched day by day (None if none within NEXT_RUN_DAYS)."""
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = start.replace(hour=0, minute=0)
+    for _ in range(NEXT_RUN_DAYS):
+        if _day_matches(fields, day):
+            for hour in sorted(fields[1]):
+                for minute in sorted(fields[0]):
+                    moment = day.replace(hour=hour, minute=minute)
+                    if moment >= start:
+                        return moment
+        day += timedelta(days=1)
+    return None
+
+# -- RETENTION --
+
+def backup_time(name):
+    return datetime.strptime(name[len('backup_'):len('backup_') + 19], "%Y-%m-%d_%H-%M-%S")
+
+def select_retained(names, daily, weekly, monthly):
+    """Newest archive per day/ISO week/month for the last N of each (plus the newest overall)."""
+    newest_first = sorted(names, reverse=True)
+    keep = set(newest_first[:1])
+    for count, period in ((daily, lambda t: t.date()),
+                          (weekly, lambda t: t.isocalendar()[:2]),
+                          (monthly, lambda t: (t.year, t.month))):
+        seen = []
+        for name in newest_first:
+            key = period(backup_time(name))
+            if key not in seen:
+                if len(seen) == count:
+                    break
+                seen.append(key)
+                keep.add(name)
+    return keep
+
+def prune_backups(daily, weekly, monthly):
+    """Removes archives outside the retention policy; archives a kept one builds on stay."""
+    folder = backup_folder()
+    names = list_backups()
+    needed = set()
+    for name in select_retained(names, daily, weekly, monthly):
+        needed.update(backup_chain(name)[1])
+
+    removed = [name for name in names if name not in needed]
+    for name in removed:
+        os.remove(os.path.join(folder, name))
+
+    limit = time.time() - STALE_TEMP_AGE
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        if filename.endswith(('.tmp', '.sqlite')) and os.path.getmtime(path) < limit:
+            os.remove(path)
+    return removed
+
+# -- STATUS --
+
+def _status_path():
+    return os.path.join(current_app.instance_path, 'backup_status.json')
+
+def read_status():
+    try:
+        with open(_status_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'last_slot': None, 'runs': []}
+
+def _write_status(status):
+    fd, tmp_path = tempfile.mkstemp(dir=current_app.instance_path, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, _status_path())
+
+def _full_due():
+    fulls = [name for name in list_backups() if name.endswith('_full.zip')]
+    return not fulls or datetime.now() - backup_time(fulls[-1]) >= timedelta(days=FULL_BACKUP_DAYS)
+
+def run_backup(trigger='schedule', slot=None):
+    """
+    One backup run (backup + pruning) under the backup lock, recorded in the status file.
+    Returns the run, or None if another process is running one or already ran this slot.
+    """
+    config = current_app.config
+    with open(os.path.join(backup_folder(), '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        status = read_status()
+        if slot and status.get('last_slot') == slot:
+            return None  # Another worker took this slot already
+        if slot:
+            status['last_slot'] = slot
+            _write_status(status)
+
+        started = time.monotonic()
+        run = {'started_at': datetime.now().isoformat(timespec='seconds'), 'trigger': trigger}
+        try:
+            limit = config['BACKUP_IO_LIMIT']
+            manifest = create_incremental_backup(full=trigger == 'schedule' and _full_due(),
+                                                 throttle=IOThrottle(limit * 1024 * 1024) if limit else None)
+            run['backup_seconds'] = round(time.monotonic() - started, 1)
+            run['pruned'] = len(prune_backups(config['BACKUP_KEEP_DAILY'], config['BACKUP_KEEP_WEEKLY'],
+                                              config['BACKUP_KEEP_MONTHLY']))
+            run.update(status='ok', archive=manifest['name'], added=manifest['added'],
+                       size=os.path.getsize(os.path.join(backup_folder(), manifest['name'])))
+        except Exception as e:
+            current_app.logger.exception("Backup (%s) failed", trigger)
+            run.update(status='failed', message=str(e))
+        run['seconds'] = round(time.monotonic() - started, 1)
+
+        status = read_status()
+        status['runs'] = ([run] + status.get('runs', []))[:STATUS_HISTORY]
+        _write_status(status)
+        return run
+
+def run_backup_job(job_id, progress):
+    """Job function (see jobs.start_job) for the "Back up now" button."""
+    run = run_backup(trigger='manual')
+    if run is None:
+        raise Exception("Another backup is running.")
+    if run['status'] != 'ok':
+        raise Exception(run['message'])
+    return {key: run[key] for key in ('archive', 'added', 'pruned', 'seconds')}
+
+def backup_overview():
+    """Schedule, retention, archives and recent runs for the admin page."""
+    config = current_app.config
+    names = list_backups()
+    schedule = config['BACKUP_SCHEDULE']
+    return {
+        'schedule': schedule,
+        'next_run': next_run(parse_cron(schedule), datetime.now()) if schedule else None,
+        'keep': (config['BACKUP_KEEP_DAILY'], config['BACKUP_KEEP_WEEKLY'], config['BACKUP_KEEP_MONTHLY']),
+        'io_limit': config['BACKUP_IO_LIMIT'],
+        'archives': len(names),
+        'size': sum(os.path.getsize(os.path.join(backup_folder(), name)) for name in names),
+        'runs': read_status()['runs']
+    }
+
+def start_backup_scheduler(app):
+    """Starts the scheduler thread of this process (no-op without BACKUP_SCHEDULE)."""
+    if not app.config['BACKUP_SCHEDULE']:
+        return None
+    fields = parse_cron(app.config['BACKUP_SCHEDULE'])
+
+    def loop():
+        while True:
+            now = datetime.now()
+            time.sleep(60 - now.second + 1)  # Just after the start of the next minute
+            slot = datetime.now().replace(second=0, microsecond=0)
+            if not cron_matches(fields, slot):
+                continue
+            with app.app_context():
+                try:
+                    run_backup(slot=slot.isoformat())
+                except Exception:
+                    app.logger.exception("Backup scheduler failed")
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=loop, name='backup-scheduler', daemon=True)
+    thread.start()
+    return thread
+
+# -- CLI (for an external cron/sidecar with BACKUP_SCHEDULE=off) --
+
+@backup_cli.command('run')
+def run_command():
+    """Backup plus pruning, recorded like a scheduled run."""
+    run = run_backup(trigger='cli')
+    if run is None:
+        raise click.ClickException('Another backup is running.')
+    if run['status'] != 'ok':
+        raise click.ClickException(run['message'])
+    click.echo(f"{run['archive']}: {run['added']} images, {run['pruned']} old archive(s) removed, {run['seconds']} s")
+
+@backup_cli.command('prune')
+def prune_command():
+    """Remove archives outside the retention policy."""
+    config = current_app.config
+    removed = prune_backups(config['BACKUP_KEEP_DAILY'], config['BACKUP_KEEP_WEEKLY'], config['BACKUP_KEEP_MONTHLY'])
+    click.echo(f"{len(removed)} archive(s) removed.")
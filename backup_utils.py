@@ -1,70 +1,124 @@
+import io
 import os
+import json
+import fcntl
 import shutil
+import sqlite3
 import zipfile
 import datetime
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from flask import current_app
 from extensions import db
+from migrations import upgrade_database
 
-def create_backup_zip():
+# Pages copied per backup step in rollback-journal mode (WAL needs no steps, see below)
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_PAUSE = 0.01  # Seconds between steps, writers get the database in between
+BACKUP_CHUNK_SIZE = 1024 * 1024  # Bytes read per file chunk while streaming an archive
+RESTORE_THREADS = 4  # Parallel image extraction on restore
+
+def snapshot_database(target_path):
+    """
+    Consistent copy of the live database through SQLite's online backup API, checked
+    with PRAGMA integrity_check. In WAL mode the copy runs in one read transaction,
+    which never blocks writers; otherwise it copies page steps with pauses in between
+    (SQLite restarts the copy if another connection writes meanwhile).
     """
-    Creates a ZIP archive containing the database and the upload folder.
-    Returns the path to the ZIP file.
+    source = db.engine.raw_connection()
+    try:
+        source_db = source.driver_connection
+        wal = source_db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        target = sqlite3.connect(target_path)
+        try:
+            source_db.backup(target, pages=-1 if wal else BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_PAUSE)
+            # The snapshot is one self-contained file (no -wal next to it)
+            target.execute("PRAGMA journal_mode=DELETE")
+            result = target.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            target.close()
+    finally:
+        source.close()
+    if result != [('ok',)]:
+        raise Exception(f"Backup snapshot failed the integrity check: {result[0][0]}")
+    return target_path
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink for ZipFile that hands out what was written so far (not seekable:
+    zipfile then writes data descriptors, so nothing has to be patched afterwards)."""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def prepare_backup():
+    """
+    Takes the database snapshot for a backup archive (before the response starts, so
+    errors can still be shown) in the system temp folder. Returns (snapshot_path,
+    download filename); the caller removes the snapshot when the response is closed.
     """
-    # 1. Determine paths
     db_uri = current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
-    
     if 'sqlite' not in db_uri:
         raise Exception("Backup currently only works with SQLite databases.")
 
-    # Extract path from URI
-    if '///' in db_uri:
-        db_path = db_uri.split('///')[1]
-    else:
-        db_path = 'inventory.db'
+    # The live file may change while it is read, so a consistent snapshot is archived
+    fd, snapshot_path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    try:
+        snapshot_database(snapshot_path)
+    except Exception:
+        os.remove(snapshot_path)
+        raise
 
-    # If the path in config is absolute (which it is in the new app.py), use it directly.
-    # If it is relative, look in the instance folder.
-    if not os.path.isabs(db_path):
-        possible_path = os.path.join(current_app.instance_path, db_path)
-        if not os.path.exists(possible_path):
-            possible_path = os.path.join(current_app.root_path, db_path)
-        db_path = possible_path
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return snapshot_path, f"backup_inventory_{timestamp}.zip"
 
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(f"Database file not found at: {db_path}")
+def _stream_file(zipf, stream, path, arcname, compress_type):
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = compress_type
+    with open(path, 'rb') as src, zipf.open(info, 'w') as dest:
+        while True:
+            chunk = src.read(BACKUP_CHUNK_SIZE)
+            if not chunk:
+                break
+            dest.write(chunk)
+            yield stream.pop()
 
+def iter_backup_zip(snapshot_path):
+    """
+    Yields the backup archive (database snapshot + upload folder) while it is built, so
+    the download starts at once and nothing is stored on disk. Only the database is
+    deflated; images are already compressed and stored as they are.
+    """
     upload_folder = current_app.config['UPLOAD_FOLDER']
-    
-    # 2. Generate filename for backup
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    backup_filename = f"backup_inventory_{timestamp}.zip"
-    backup_path = os.path.join(current_app.instance_path, backup_filename)
-    
-    if not os.path.exists(current_app.instance_path):
-        os.makedirs(current_app.instance_path)
-
-    # 3. Create Zip
-    with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as zipf:
         # We always save the DB as 'database.sqlite' in the zip, regardless of its original name
-        zipf.write(db_path, arcname='database.sqlite')
-        
+        yield from _stream_file(zipf, stream, snapshot_path, 'database.sqlite', zipfile.ZIP_DEFLATED)
+
         if os.path.exists(upload_folder):
             for root, dirs, files in os.walk(upload_folder):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]  # Staging folders of a running restore
                 for file in files:
                     file_path = os.path.join(root, file)
                     # Relative path in Zip (e.g. uploads/image.jpg)
                     arcname = os.path.join('uploads', os.path.relpath(file_path, upload_folder))
-                    zipf.write(file_path, arcname=arcname)
-    
-    return backup_path, backup_filename
+                    yield from _stream_file(zipf, stream, file_path, arcname, zipfile.ZIP_STORED)
+    yield stream.pop()  # Central directory
 
-def restore_backup_zip(zip_filepath):
-    """
-    Restores database and images from a ZIP.
-    Uses copyfile instead of move to avoid Docker mount problems (Errno 16).
-    """
-    # 1. Determine paths
+def database_path():
     db_uri = current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
     if 'sqlite' not in db_uri:
         raise Exception("Restore only possible with SQLite.")
@@ -76,67 +130,262 @@ def restore_backup_zip(zip_filepath):
 
     # Determine target path (Preference: Instance Path)
     if not os.path.isabs(db_file_name):
-         target_db_path = os.path.join(current_app.instance_path, db_file_name)
-    else:
-        # If the path in config is absolute (new app.py does this), use it directly
-        target_db_path = db_file_name
+         return os.path.join(current_app.instance_path, db_file_name)
+    # If the path in config is absolute (new app.py does this), use it directly
+    return db_file_name
 
-    upload_folder = current_app.config['UPLOAD_FOLDER']
+def check_database_file(path):
+    """A restored database must be intact and contain the inventory tables."""
+    con = sqlite3.connect(path)
+    try:
+        result = con.execute("PRAGMA integrity_check").fetchall()
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as e:
+        raise Exception(f"Invalid database in backup: {e}")
+    finally:
+        con.close()
+    if result != [('ok',)]:
+        raise Exception(f"Database in backup failed the integrity check: {result[0][0]}")
+    if not {'media_item', 'user'} <= tables:
+        raise Exception("Invalid database in backup: inventory tables missing.")
 
-    # 2. Disconnect connections
+def _copy_into_live(source_path):
+    """
+    Copies the database at source_path over the live one with SQLite's backup API. The
+    copy is one write transaction on the live file: writers of every worker wait for it,
+    then all connections see the new content. The file is never replaced, so no process
+    keeps writing to an old one, and a copy cut short is rolled back by SQLite itself.
+    """
     db.session.remove()
-    db.engine.dispose()
-    
-    # Short pause for file locks
-    time.sleep(0.5)
-
-    # 3. Check and extract Zip
-    with zipfile.ZipFile(zip_filepath, 'r') as zipf:
-        if 'database.sqlite' not in zipf.namelist():
-            raise Exception("Invalid backup archive: 'database.sqlite' missing.")
-        
-        # Create Temp Folder
-        temp_extract_path = os.path.join(current_app.instance_path, 'temp_restore')
-        if os.path.exists(temp_extract_path):
-            shutil.rmtree(temp_extract_path)
-        os.makedirs(temp_extract_path)
-        
-        # Extract database temporarily
-        zipf.extract('database.sqlite', temp_extract_path)
-        extracted_db = os.path.join(temp_extract_path, 'database.sqlite')
-        
-        # A) Restore database
-        
-        # Backup of current DB (if possible)
-        if os.path.exists(target_db_path):
-            try:
-                shutil.copyfile(target_db_path, target_db_path + ".bak")
-            except OSError:
-                print("Warning: Could not create .bak of the database.")
+    source = sqlite3.connect(source_path)
+    target = db.engine.raw_connection()
+    try:
+        target_db = target.driver_connection
+        page_size = target_db.execute("PRAGMA page_size").fetchone()[0]
+        if source.execute("PRAGMA page_size").fetchone()[0] != page_size:
+            # A database in WAL mode only takes a copy with its own page size
+            source.execute("PRAGMA journal_mode=DELETE")
+            source.execute(f"PRAGMA page_size={page_size}")
+            source.execute("VACUUM")
+        source.backup(target_db, pages=-1)
+    finally:
+        target.close()
+        source.close()
 
-        # Overwrite new DB (copyfile keeps inodes/mounts)
-        try:
-            shutil.copyfile(extracted_db, target_db_path)
-        except OSError as e:
-            raise Exception(f"Database file is locked. Please restart container. Error: {e}")
-
-        # B) Extract images
-        # We do NOT delete the upload folder beforehand, but only overwrite/add.
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        for member in zipf.namelist():
-            if member.startswith('uploads/'):
-                filename = os.path.basename(member)
-                if not filename: continue 
-                
-                source = zipf.open(member)
-                target_path = os.path.join(upload_folder, filename)
-                
-                with source, open(target_path, "wb") as target:
-                    shutil.copyfileobj(source, target)
-
-        # Clean up Temp
-        shutil.rmtree(temp_extract_path)
-        
+def keep_previous_database():
+    """Snapshot of the live database as <db>.bak, for rollback_database(). Returns its path."""
+    backup_path = database_path() + '.bak'
+    if os.path.exists(backup_path):
+        os.remove(backup_path)
+    return snapshot_database(backup_path)
+
+def rollback_database(backup_path):
+    _copy_into_live(backup_path)
+
+# A restore holds the lock file for its whole run and writes the marker before it touches
+# live files. A marker whose lock is free belongs to a restore that was killed mid-swap
+# (worker recycled or reloaded); recover_interrupted_restore() rolls it back.
+
+def _marker_path():
+    return database_path() + '.restoring'
+
+def _write_marker(state):
+    tmp_path = _marker_path() + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _marker_path())
+
+def _clear_marker():
+    if os.path.exists(_marker_path()):
+        os.remove(_marker_path())
+
+def _restore_lock():
+    """Open lock file, exclusively locked; raises if another restore is running."""
+    lock = open(database_path() + '.restore-lock', 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        raise Exception("Another restore is running.")
+    return lock
+
+def _undo_images(state):
+    """Puts the parked originals back and removes the images the restore added."""
+    for rel in state['images']:
+        target = os.path.join(state['upload_folder'], rel)
+        original = os.path.join(state['rollback'], rel)
+        if os.path.exists(original):
+            os.replace(original, target)
+        elif not os.path.exists(os.path.join(state['staging'], rel)) and os.path.exists(target):
+            os.remove(target)  # Moved in, nothing was there before
+
+def _roll_back(state):
+    """Undoes a swap described by a marker state; the marker is removed once it worked."""
+    if state['images']:
+        _undo_images(state)
+    if state['database']:
+        rollback_database(state['backup'])
+    _clear_marker()
+
+def recover_interrupted_restore():
+    """
+    Rolls back a restore that was cut short (see above). Called by init-db and in every
+    new worker process. Returns True if there was one.
+    """
+    if not os.path.exists(_marker_path()):
+        return False
+    try:
+        lock = _restore_lock()
+    except Exception:
+        return False  # Still running in another process
+    with lock:
+        if not os.path.exists(_marker_path()):
+            return False
+        with open(_marker_path()) as f:
+            state = json.load(f)
+        _roll_back(state)
+        if state['images']:
+            for path in (state['staging'], state['rollback']):
+                shutil.rmtree(path, ignore_errors=True)
     return True
+
+def restore_database_file(source_path):
+    """Replaces the live database with the SQLite file at source_path (keeps a .bak)."""
+    side_path = database_path() + '.restore'
+    with _restore_lock():
+        shutil.copyfile(source_path, side_path)
+        try:
+            check_database_file(side_path)
+            state = {'backup': keep_previous_database(), 'database': True, 'images': []}
+            _write_marker(state)
+            try:
+                _copy_into_live(side_path)
+                upgrade_database()  # Backups of older versions
+            except Exception:
+                _roll_back(state)
+                raise
+            _clear_marker()
+        finally:
+            if os.path.exists(side_path):
+                os.remove(side_path)
+
+def _image_members(zipf):
+    """uploads/ members of an archive, with their path inside the upload folder."""
+    members = []
+    for name in zipf.namelist():
+        if not name.startswith('uploads/') or name.endswith('/'):
+            continue
+        rel = name[len('uploads/'):]
+        parts = rel.split('/')
+        if '\\' in rel or any(part in ('', '.', '..') for part in parts) or ':' in parts[0]:
+            raise Exception(f"Invalid path in backup archive: {name}")
+        members.append((name, rel))
+    return members
+
+def _extract_images(zip_filepath, members, staging, progress, done):
+    """
+    Extracts the images into the staging folder on RESTORE_THREADS threads, each with its
+    own handle on the archive. At most two files per thread are queued, and each file is
+    copied in BACKUP_CHUNK_SIZE pieces, so memory stays flat for any archive size.
+    """
+    local = threading.local()
+    handles = []
+
+    def extract(name, rel):
+        if not hasattr(local, 'zipf'):
+            local.zipf = zipfile.ZipFile(zip_filepath)
+            handles.append(local.zipf)
+        target = os.path.join(staging, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with local.zipf.open(name) as src, open(target, 'wb') as dest:
+            shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)  # Raises on a CRC mismatch
+
+    try:
+        with ThreadPoolExecutor(RESTORE_THREADS) as pool:
+            pending = set()
+            for name, rel in members:
+                if len(pending) >= 2 * RESTORE_THREADS:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                    done += len(finished)
+                    progress(done)
+                pending.add(pool.submit(extract, name, rel))
+            for future in pending:
+                future.result()
+            done += len(pending)
+            progress(done)
+    finally:
+        for zipf in handles:
+            zipf.close()
+    return done
+
+def _swap_images(staging, upload_folder, rollback):
+    """Moves the staged images into place; files they replace are parked in `rollback`."""
+    for root, dirs, files in os.walk(staging):
+        for name in files:
+            staged = os.path.join(root, name)
+            rel = os.path.relpath(staged, staging)
+            target = os.path.join(upload_folder, rel)
+            if os.path.exists(target):
+                original = os.path.join(rollback, rel)
+                os.makedirs(os.path.dirname(original), exist_ok=True)
+                os.replace(target, original)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(staged, target)
+
+def run_restore_job(job_id, progress, zip_filepath):
+    """
+    Job function (see jobs.start_job): restores database and images from a backup ZIP.
+    Nothing live is touched until the archive is validated, the database is extracted
+    and checked in a side file and all images are extracted to a staging folder (inside
+    the upload folder, so they can be renamed into place). Then the images are moved in
+    and the database is copied over the live one; any failure up to the migration of the
+    restored database puts the previous files and database back, in this run or, if the
+    run is killed, at the next start. Images not in the backup are kept.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    side_path = database_path() + f'.restore-{job_id}'
+    staging = os.path.join(upload_folder, f'.restore-{job_id}')
+    rollback = os.path.join(upload_folder, f'.rollback-{job_id}')
+    try:
+        with _restore_lock():
+            # 1. Validate the archive
+            with zipfile.ZipFile(zip_filepath, 'r') as zipf:
+                if 'database.sqlite' not in zipf.namelist():
+                    raise Exception("Invalid backup archive: 'database.sqlite' missing.")
+                members = _image_members(zipf)
+                total = len(members) + 1
+                progress(0, total, force=True)
+
+                # 2. Database into a side file next to the live one
+                with zipf.open('database.sqlite') as src, open(side_path, 'wb') as dest:
+                    shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)
+            check_database_file(side_path)
+            progress(1, total, force=True)
+
+            # 3. Images into the staging folder
+            _extract_images(zip_filepath, members, staging, progress, 1)
+
+            # 4. Swap: images first, the database last
+            state = {'backup': keep_previous_database(), 'database': False, 'images': [rel for _, rel in members],
+                     'upload_folder': upload_folder, 'staging': staging, 'rollback': rollback}
+            _write_marker(state)
+            try:
+                _swap_images(staging, upload_folder, rollback)
+                state['database'] = True
+                _write_marker(state)
+                _copy_into_live(side_path)
+                upgrade_database()  # Backups of older versions
+            except Exception:
+                _roll_back(state)
+                raise
+            _clear_marker()
+    finally:
+        for path in (staging, rollback):
+            shutil.rmtree(path, ignore_errors=True)
+        for path in (side_path, zip_filepath):
+            if os.path.exists(path):
+                os.remove(path)
+    progress(total, total, force=True)
+    return {'images': len(members), 'database': 'database.sqlite'}
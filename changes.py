@@ -0,0 +1,141 @@
+import time
+from datetime import datetime, date, timedelta
+from sqlalchemy import event, inspect, select, text, func, delete, update
+from extensions import db, begin_immediate
+from models import Location, MediaItem, Track, ChangeTombstone, ChangeSequence
+
+# -- CHANGE FEED --
+# Every insert/update of a tracked row stamps it with the next value of a global counter
+# (row_version), every delete leaves a tombstone with its own version. Clients keep the
+# highest version they have seen as cursor and ask for everything newer.
+# This is done with SQLite triggers rather than ORM events, so bulk UPDATE/DELETE statements
+# and executemany inserts (bulk actions, import, batch API) are tracked as well.
+# Writers are serialized by SQLite, so versions increase in commit order.
+# Tombstones are kept for TOMBSTONE_RETENTION_DAYS. Pruning records the newest removed
+# version as the minimum cursor: a client with an older cursor may have missed deletions
+# and has to drop its copy and sync again from 0.
+
+# table -> (model, columns sent to clients)
+TRACKED_TABLES = {
+    'location': (Location, ['id', 'name', 'parent_id', 'updated_at']),
+    'media_item': (MediaItem, ['id', 'inventory_number', 'barcode', 'title', 'category', 'author_artist',
+                               'release_year', 'description', 'image_filename', 'location_id', 'collection_id',
+                               'volume_number', 'lent_to', 'lent_at', 'updated_at']),
+    'track': (Track, ['id', 'media_item_id', 'position', 'title', 'duration', 'duration_seconds', 'updated_at'])
+}
+
+CHANGES_DEFAULT_LIMIT = 1000
+CHANGES_MAX_LIMIT = 5000
+TOMBSTONE_RETENTION_DAYS = 90
+TOMBSTONE_PRUNE_INTERVAL = 3600  # Seconds between prune runs of a process
+_last_prune = None
+
+_NEXT_VERSION = "UPDATE change_sequence SET value = value + 1 WHERE id = 1;"
+_CURRENT_VERSION = "(SELECT value FROM change_sequence WHERE id = 1)"
+
+def _trigger_ddl(table):
+    stamp = f"UPDATE {table} SET row_version = {_CURRENT_VERSION} WHERE id = NEW.id;"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_insert AFTER INSERT ON {table} "
+        f"BEGIN {_NEXT_VERSION} {stamp} END",
+        # Skipped for the stamping UPDATEs themselves (they change row_version)
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_update AFTER UPDATE ON {table} "
+        f"WHEN NEW.row_version IS OLD.row_version BEGIN {_NEXT_VERSION} {stamp} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_delete AFTER DELETE ON {table} "
+        f"BEGIN {_NEXT_VERSION} INSERT INTO change_tombstone (row_version, table_name, row_id, deleted_at) "
+        f"VALUES ({_CURRENT_VERSION}, '{table}', OLD.id, strftime('%Y-%m-%d %H:%M:%f000', 'now')); END"
+    ]
+
+def install_change_tracking(connection):
+    """
+    Idempotent: adds the row_version/updated_at columns to existing databases, creates the
+    counter row and the triggers, and stamps rows that have no version yet.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    inspector = inspect(connection)
+    for table in TRACKED_TABLES:
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if 'row_version' not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER"))
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_row_version ON {table} (row_version)"))
+        if 'updated_at' not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME"))
+
+    connection.execute(text("INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)"))
+    for table in TRACKED_TABLES:
+        for ddl in _trigger_ddl(table):
+            connection.execute(text(ddl))
+        # Fires the update trigger once per unstamped row (existing data, rows written without triggers)
+        connection.execute(text(f"UPDATE {table} SET row_version = NULL WHERE row_version IS NULL"))
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_after_create(target, connection, **kw):
+    install_change_tracking(connection)
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def changes_since(cursor, limit=CHANGES_DEFAULT_LIMIT):
+    """
+    Returns the rows changed and deleted after cursor (a row_version), oldest first, at most
+    limit in total. Rows are sent as value lists with one field list per table to keep the
+    payload small. Clients should apply 'deleted' before 'tables' of the same page.
+    """
+    candidates = []
+    for table, (model, fields) in TRACKED_TABLES.items():
+        cols = [model.__table__.c[f] for f in fields]
+        version = model.__table__.c.row_version
+        stmt = select(version, *cols).where(version > cursor).order_by(version).limit(limit + 1)
+        for row in db.session.execute(stmt):
+            candidates.append((row[0], table, [_json_value(v) for v in row[1:]]))
+
+    stmt = select(ChangeTombstone.row_version, ChangeTombstone.table_name, ChangeTombstone.row_id) \
+        .where(ChangeTombstone.row_version > cursor).order_by(ChangeTombstone.row_version).limit(limit + 1)
+    for version, table, row_id in db.session.execute(stmt):
+        candidates.append((version, 'deleted', (table, row_id)))
+
+    candidates.sort(key=lambda c: c[0])
+    page = candidates[:limit]
+
+    tables = {table: {'fields': fields, 'rows': []} for table, (_, fields) in TRACKED_TABLES.items()}
+    deleted = {table: [] for table in TRACKED_TABLES}
+    for version, kind, payload in page:
+        if kind == 'deleted':
+            deleted[payload[0]].append(payload[1])
+        else:
+            tables[kind]['rows'].append(payload)
+
+    return {
+        'cursor': page[-1][0] if page else cursor,
+        'more': len(candidates) > limit,
+        'tables': tables,
+        'deleted': deleted
+    }
+
+def min_cursor():
+    """Oldest cursor that still gets every deletion (0 until tombstones were pruned)."""
+    return db.session.execute(select(ChangeSequence.pruned).where(ChangeSequence.id == 1)).scalar() or 0
+
+def prune_tombstones(retention_days=TOMBSTONE_RETENTION_DAYS):
+    """Removes tombstones older than the retention period and raises min_cursor(). Returns the count."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    newest = db.session.execute(select(func.max(ChangeTombstone.row_version))
+                                .where(ChangeTombstone.deleted_at < cutoff)).scalar()
+    if newest is None:
+        return 0
+    begin_immediate(db.session.connection())
+    removed = db.session.execute(delete(ChangeTombstone).where(ChangeTombstone.row_version <= newest)).rowcount
+    db.session.execute(update(ChangeSequence).where(ChangeSequence.id == 1, ChangeSequence.pruned < newest)
+                       .values(pruned=newest))
+    db.session.commit()
+    return removed
+
+def maybe_prune_tombstones():
+    """prune_tombstones() at most every TOMBSTONE_PRUNE_INTERVAL seconds per process."""
+    global _last_prune
+    if _last_prune is None or time.monotonic() - _last_prune >= TOMBSTONE_PRUNE_INTERVAL:
+        _last_prune = time.monotonic()
+        prune_tombstones()
@@ -0,0 +1,165 @@
+import re
+import difflib
+import unicodedata
+from sqlalchemy import event, inspect, select, delete, insert, update, func
+from sqlalchemy.orm import Session, aliased
+from extensions import db
+from models import MediaItem, MediaBlockKey, Loan
+
+# Fuzzy duplicate detection. Every item gets a few blocking keys (normalized title/artist
+# tokens, year) in the indexed media_block_key table; only items sharing a key are compared,
+# so the report never does the O(n^2) comparison over the whole catalogue.
+
+MAX_BLOCK_SIZE = 100   # Larger blocks are too generic ("the", "best of") and skipped
+MIN_SCORE = 0.75       # Pairs below this are not reported
+MAX_CANDIDATES = 500   # Rows on the report page
+KEY_FIELDS = ('title', 'author_artist', 'release_year')
+
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'of', 'der', 'die', 'das', 'ein', 'eine', 'und', 'von',
+    'le', 'la', 'les', 'un', 'une', 'et', 'du', 'des', 'el', 'los', 'las', 'y', 'de'
+}
+
+def normalize_text(value):
+    """Lower case ASCII words without accents/punctuation: 'Mötley Crüe!' -> 'motley crue'."""
+    value = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', value.lower()))
+
+def significant_tokens(value):
+    return [t for t in normalize_text(value).split() if t not in STOPWORDS] or normalize_text(value).split()
+
+def block_keys(title, artist, year):
+    """
+    Blocking keys of one item. Several keys per item keep the recall up when one
+    word is misspelled: two items only need to share one key to be compared.
+    """
+    words = significant_tokens(title)
+    if not words:
+        return set()
+    artist_words = significant_tokens(artist)
+    artist_key = artist_words[0][:4] if artist_words else ''
+
+    keys = {
+        # First two title words (in order) + artist prefix
+        'w:' + ' '.join(words[:2]) + '|' + artist_key,
+        # Prefixes of the two longest words, tolerates typos/endings ("Beatles" vs "Beatle's")
+        'p:' + ' '.join(sorted(w[:4] for w in sorted(words, key=len, reverse=True)[:2])),
+    }
+    if artist_key:
+        # Same artist, title starting alike ("Dark Sde of the Moon")
+        keys.add('a:' + artist_key + '|' + words[0][:3])
+    if year:
+        keys.add(f'y:{year}|' + max(words, key=len)[:5])
+    return {k[:64] for k in keys}
+
+def update_block_keys(connection, item_ids):
+    """Rewrites the keys of the given items (Core statements, usable inside a flush)."""
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), 500):
+        chunk = item_ids[start:start + 500]
+        connection.execute(delete(MediaBlockKey).where(MediaBlockKey.media_item_id.in_(chunk)))
+        rows = connection.execute(select(MediaItem.id, MediaItem.title, MediaItem.author_artist, MediaItem.release_year)
+                                  .where(MediaItem.id.in_(chunk))).all()
+        keys = [{'media_item_id': item_id, 'key': key}
+                for item_id, title, artist, year in rows for key in block_keys(title, artist, year)]
+        if keys:
+            connection.execute(insert(MediaBlockKey), keys)
+
+def rebuild_block_keys(connection):
+    """Builds the keys of all items (migration backfill)."""
+    connection.execute(delete(MediaBlockKey))
+    ids = [item_id for (item_id,) in connection.execute(select(MediaItem.id))]
+    update_block_keys(connection, ids)
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_block_keys(session, flush_context):
+    # Keeps the keys in sync with ORM writes (deletes cascade via MediaItem.block_keys);
+    # bulk paths (import, bulk delete) call update_block_keys / delete the keys themselves.
+    changed = {obj.id for obj in session.new if isinstance(obj, MediaItem)}
+    for obj in session.dirty:
+        if isinstance(obj, MediaItem) and any(inspect(obj).attrs[f].history.has_changes() for f in KEY_FIELDS):
+            changed.add(obj.id)
+    if changed:
+        update_block_keys(session.connection(), changed)
+
+def _similarity(a, b, minimum=0.0):
+    if not a or not b:
+        return None
+    matcher = difflib.SequenceMatcher(None, a, b)
+    # quick_ratio() is an upper bound; the exact ratio is only computed when it can matter
+    if matcher.quick_ratio() < minimum:
+        return 0.0
+    return matcher.ratio()
+
+def score_pair(a, b, min_score=0.0):
+    """
+    0..1 similarity of two (title, artist, year) tuples with normalized text. The title
+    weighs most; artist and year only count when both items have them.
+    """
+    weights = [0.6, 0.3 if a[1] and b[1] else 0.0, 0.1 if a[2] and b[2] else 0.0]
+    total = sum(weights)
+    # The title alone must be good enough to reach min_score if everything else matched
+    title = _similarity(a[0], b[0], 1 - (1 - min_score) * total / weights[0])
+    if title is None:
+        return 0.0
+    score = title * weights[0]
+    if weights[1]:
+        score += _similarity(a[1], b[1]) * weights[1]
+    if weights[2]:
+        score += (1.0 if a[2] == b[2] else 0.0) * weights[2]
+    return score / total
+
+def duplicate_candidates(min_score=MIN_SCORE, limit=MAX_CANDIDATES):
+    """
+    Ranked merge candidates: ([(score, item_a, item_b)], total). Candidate pairs come from
+    one self-join over the key index (same key, same category, block not too large);
+    only those pairs are scored, and only the reported items are loaded as objects.
+    """
+    small_blocks = select(MediaBlockKey.key).group_by(MediaBlockKey.key) \
+        .having(func.count() <= MAX_BLOCK_SIZE).subquery()
+    ka, kb = aliased(MediaBlockKey), aliased(MediaBlockKey)
+    ia, ib = aliased(MediaItem), aliased(MediaItem)
+    pairs = db.session.execute(
+        select(ka.media_item_id, kb.media_item_id).distinct()
+        .join(kb, (kb.key == ka.key) & (kb.media_item_id > ka.media_item_id))
+        .join(ia, ia.id == ka.media_item_id).join(ib, ib.id == kb.media_item_id)
+        .where(ka.key.in_(select(small_blocks.c.key)), ia.category == ib.category)).all()
+
+    values = {}
+    ids = list({i for pair in pairs for i in pair})
+    for start in range(0, len(ids), 500):
+        rows = db.session.execute(select(MediaItem.id, MediaItem.title, MediaItem.author_artist, MediaItem.release_year)
+                                  .where(MediaItem.id.in_(ids[start:start + 500])))
+        for item_id, title, artist, year in rows:
+            values[item_id] = (normalize_text(title), normalize_text(artist), year)
+
+    scored = []
+    for id_a, id_b in pairs:
+        score = score_pair(values[id_a], values[id_b], min_score)
+        if score >= min_score:
+            scored.append((round(score, 3), id_a, id_b))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+
+    top = scored[:limit]
+    shown = {i for _, a, b in top for i in (a, b)}
+    items = {item.id: item for item in MediaItem.query.filter(MediaItem.id.in_(shown))} if shown else {}
+    return [(score, items[a], items[b]) for score, a, b in top], len(scored)
+
+def merge_items(keep, drop):
+    """
+    Fills empty fields of keep from drop, moves drop's tracks if keep has none and its
+    loans (lending history and an open loan), deletes drop.
+    Raises ValueError if both items are lent right now.
+    """
+    if keep.lent_to and drop.lent_to:
+        raise ValueError("Both items are lent")
+    for field in ('barcode', 'author_artist', 'release_year', 'description', 'image_filename', 'collection_id', 'volume_number'):
+        if not getattr(keep, field) and getattr(drop, field):
+            setattr(keep, field, getattr(drop, field))
+    if keep.tracks.count() == 0:
+        drop.tracks.update({'media_item_id': keep.id}, synchronize_session=False)
+    # Deleting drop would cascade to its loans
+    db.session.execute(update(Loan).where(Loan.media_item_id == drop.id).values(media_item_id=keep.id))
+    if drop.lent_to:
+        keep.lent_to, keep.lent_at = drop.lent_to, drop.lent_at
+    db.session.delete(drop)
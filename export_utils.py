@@ -0,0 +1,221 @@
+import os
+import io
+import csv
+import itertools
+from datetime import datetime
+from extensions import db
+from models import Location, Track, media_filter_query, apply_media_sort
+from jobs import jobs_folder, update_job
+from translations import TRANSLATIONS
+
+# -- COLUMN REGISTRY --
+# field id -> (translation key of the header, accessor(item, ctx))
+# Shared by all export formats (CSV, Excel, background jobs) and the export dialog.
+
+def _location(item, ctx):
+    return ctx.location_paths.get(item.location_id, "") if item.location_id else ""
+
+def _lent_at(item, ctx):
+    return item.lent_at.strftime('%Y-%m-%d %H:%M') if item.lent_at else ""
+
+def format_tracks(tracks):
+    """'1. Title (3:45) | 2. Other Title' - the import parses the same format back."""
+    parts = []
+    for t in tracks:
+        text = f"{t.position}. {t.title}" if t.position is not None else t.title
+        if t.duration: text += f" ({t.duration})"
+        parts.append(text)
+    return " | ".join(parts)
+
+def _tracks(item, ctx):
+    return format_tracks(ctx.tracks.get(item.id, []))
+
+EXPORT_COLUMNS = {
+    'inventory_number': ('inventory_num', lambda item, ctx: item.inventory_number),
+    'title': ('title', lambda item, ctx: item.title),
+    'author_artist': ('author_artist', lambda item, ctx: item.author_artist),
+    'category': ('category', lambda item, ctx: ctx.get_text(item.category)),
+    'release_year': ('release_year', lambda item, ctx: item.release_year),
+    'barcode': ('isbn_barcode', lambda item, ctx: item.barcode),
+    'location': ('location', _location),
+    'lent_to': ('lent_to', lambda item, ctx: item.lent_to),
+    'lent_at': ('since', _lent_at),
+    'description': ('description', lambda item, ctx: item.description),
+    'tracks': ('tracklist', _tracks)
+}
+
+CSV_DELIMITERS = {'comma': ',', 'semicolon': ';', 'tab': '\t'}
+
+def build_location_paths():
+    """
+    Returns {location_id: 'Grandpa > Father > Child'} for all locations with a single query,
+    instead of walking the lazy parent chain of Location.full_path for every exported row.
+    """
+    rows = {loc_id: (name, parent_id) for loc_id, name, parent_id in
+            db.session.query(Location.id, Location.name, Location.parent_id)}
+    paths = {}
+    for loc_id in rows:
+        chain = []
+        current = loc_id
+        while current in rows:
+            name, parent_id = rows[current]
+            chain.insert(0, name)
+            current = parent_id
+            # Safety brake against infinite loops (same limit as Location.full_path)
+            if len(chain) > 20:
+                break
+        paths[loc_id] = " > ".join(chain)
+    return paths
+
+class ExportContext:
+    """Per-export state for the accessors: translation function and pre-computed lookups."""
+
+    def __init__(self, fields, get_text):
+        self.fields = [f for f in fields if f in EXPORT_COLUMNS]
+        self.get_text = get_text
+        self.location_paths = build_location_paths() if 'location' in self.fields else {}
+        self.tracks = {}
+
+    def prepare(self, items, batch_size=500):
+        """
+        Wraps the item iterable: if tracks are exported, they are loaded with one query
+        per batch of items instead of one query per item.
+        """
+        if 'tracks' not in self.fields:
+            yield from items
+            return
+        items = iter(items)
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                break
+            self.tracks = {}
+            for t in Track.query.filter(Track.media_item_id.in_([i.id for i in batch])).order_by(Track.media_item_id, Track.position):
+                self.tracks.setdefault(t.media_item_id, []).append(t)
+            yield from batch
+
+    def header(self):
+        return [self.get_text(EXPORT_COLUMNS[f][0]) for f in self.fields]
+
+    def row(self, item):
+        values = []
+        for f in self.fields:
+            val = EXPORT_COLUMNS[f][1](item, self)
+            values.append(val if val is not None else "")
+        return values
+
+CSV_CHUNK_SIZE = 64 * 1024
+
+def iter_csv(items, ctx, delimiter=';'):
+    """
+    Generator: yields the CSV export in chunks of ~64 KB (with BOM for Excel).
+    items can be any iterable (e.g. a yield_per query), so memory use stays constant.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+    buffer.write("\ufeff")
+    writer.writerow(ctx.header())
+
+    for item in ctx.prepare(items):
+        writer.writerow(ctx.row(item))
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XLSX_WIDTH_SAMPLE = 200
+XLSX_MAX_WIDTH = 60
+
+def write_xlsx(items, ctx, fileobj, sample_size=XLSX_WIDTH_SAMPLE):
+    """
+    Writes the export as .xlsx into fileobj using openpyxl's write-only mode.
+    Rows go straight to the file; only the first sample_size rows are buffered to size the
+    columns (write-only sheets need the widths before the first row is written).
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Oryvian Export")
+
+    header = ctx.header()
+    items = iter(ctx.prepare(items))
+    sample = [ctx.row(item) for item in itertools.islice(items, sample_size)]
+
+    # Column widths from header + sample
+    for idx, label in enumerate(header):
+        max_length = max([len(str(label))] + [len(str(row[idx])) for row in sample])
+        ws.column_dimensions[get_column_letter(idx + 1)].width = min(max_length + 2, XLSX_MAX_WIDTH)
+
+    header_cells = []
+    for label in header:
+        cell = WriteOnlyCell(ws, value=label)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in sample:
+        ws.append(row)
+    for item in items:
+        ws.append(ctx.row(item))
+
+    wb.save(fileobj)
+
+def iter_file(fileobj, chunk_size=64 * 1024):
+    """Generator: streams a (temporary) file object and closes it afterwards."""
+    try:
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+# -- BACKGROUND EXPORT --
+
+def translator(lang):
+    """get_text replacement for code running outside a request (no current_user)."""
+    texts = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+    return lambda key: texts.get(key, key)
+
+def _counting(items, progress, total):
+    for done, item in enumerate(items, 1):
+        yield item
+        if done % 500 == 0:
+            progress(done, total)
+
+def run_export_job(job_id, progress, filters, sort_field, sort_order, fields, export_format, delimiter_name, lang):
+    """
+    Job function (see jobs.start_job): exports every item matching the dashboard filter state
+    into an artifact file next to the job state. Rows are streamed with yield_per.
+    """
+    query = media_filter_query(filters)
+    total = query.order_by(None).count()
+    progress(0, total, force=True)
+
+    ctx = ExportContext(fields, translator(lang))
+    items = _counting(apply_media_sort(query, sort_field, sort_order).yield_per(1000), progress, total)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if export_format == 'excel':
+        artifact = f"{job_id}.xlsx"
+        with open(os.path.join(jobs_folder(), artifact), 'wb') as f:
+            write_xlsx(items, ctx, f)
+        download_name = f"oryvian_export_{timestamp}.xlsx"
+    else:
+        artifact = f"{job_id}.csv"
+        with open(os.path.join(jobs_folder(), artifact), 'w', encoding='utf-8', newline='') as f:
+            for chunk in iter_csv(items, ctx, delimiter=CSV_DELIMITERS.get(delimiter_name, ';')):
+                f.write(chunk)
+        download_name = f"oryvian_export_{timestamp}.csv"
+
+    update_job(job_id, artifact=artifact, download_name=download_name, progress=total, total=total)
+    return {'rows': total}
@@ -1,3 +1,5 @@
+import re
+from sqlalchemy import event
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
@@ -6,3 +8,64 @@ from flask_wtf.csrf import CSRFProtect
 db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()
+
+def begin_immediate(connection):
+    """
+    Opens the SQLite transaction of `connection` with BEGIN IMMEDIATE, for work that reads
+    and then writes (batch API) or runs DDL (migrations). pysqlite otherwise only emits a
+    deferred BEGIN right before the first INSERT/UPDATE/DELETE: DDL and a SAVEPOINT issued
+    first run outside of it (the SAVEPOINT's RELEASE already commits). Taking the write
+    lock up front also waits for other writers (busy_timeout) instead of failing when one
+    committed in between.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+# Pragma profile for every SQLite connection. WAL lets readers (exports, backups) run
+# next to the writer; busy_timeout lets a connection wait that long for the write lock.
+# It does not help a transaction that has read and then writes after another connection
+# committed: that write fails with "database is locked" at once (see begin_immediate).
+# Values can be overridden with SQLITE_PRAGMAS (see app.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',   # Safe with WAL: a power loss can only drop the last commits
+    'foreign_keys': 'ON',
+    'busy_timeout': '5000',    # ms
+    'cache_size': '-32000',    # Negative = KiB, i.e. 32 MB page cache per connection
+    'mmap_size': '268435456',  # 256 MB memory-mapped reads
+    'temp_store': 'MEMORY',
+}
+
+def parse_sqlite_pragmas(value):
+    """'cache_size=-64000, mmap_size=0' -> {'cache_size': '-64000', 'mmap_size': '0'}"""
+    pragmas = {}
+    for part in (value or '').replace(';', ',').split(','):
+        if not part.strip():
+            continue
+        name, sep, setting = part.partition('=')
+        name, setting = name.strip().lower(), setting.strip()
+        if not sep or not re.fullmatch(r'[a-z_]+', name) or not re.fullmatch(r'-?\w+', setting):
+            raise ValueError(f"Invalid SQLite pragma: {part.strip()!r}")
+        pragmas[name] = setting
+    return pragmas
+
+def use_sqlite_pragmas(engine, pragmas):
+    """Applies the pragma profile to each new pooled connection (before any transaction)."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def sqlite_pragma_status(connection, pragmas):
+    """[(name, configured, active)] - what SQLite actually uses (e.g. mmap_size is capped at compile time)."""
+    if connection.dialect.name != 'sqlite':
+        return []
+    return [(name, value, connection.exec_driver_sql(f"PRAGMA {name}").scalar())
+            for name, value in pragmas.items()]
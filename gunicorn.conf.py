@@ -0,0 +1,43 @@
+import os
+import multiprocessing
+
+# Production serving: several worker processes, forked from a preloaded app.
+# Each worker runs an event loop (uvicorn) for the external lookups and a pool of
+# WEB_THREADS threads for the Flask pages (asgi.py). SQLite (WAL) serves reads from all
+# workers in parallel and serializes the writes, so extra processes help with CPU work
+# (pages, PDFs, QR codes, exports); waiting lookups cost neither threads nor processes.
+#   WEB_WORKERS  processes, default: number of CPU cores (2 to 8)
+#   WEB_THREADS  page threads per process, default: 4
+# kill -HUP <master pid> replaces the workers gracefully (running requests finish).
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_WORKERS') or min(max(multiprocessing.cpu_count(), 2), 8))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Import the app once in the master; workers are forked from it (faster start, shared memory)
+preload_app = True
+
+timeout = 120          # Large uploads/restores
+graceful_timeout = 30  # Time for running requests on reload/shutdown
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+def post_fork(server, worker):
+    # Pooled SQLite connections must not be shared across processes
+    from asgi import flask_app
+    from extensions import db
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+        # The worker this one replaces may have died in the middle of a restore
+        from backup_utils import recover_interrupted_restore
+        recover_interrupted_restore()
+
+    # Every worker runs the backup scheduler; a lock in the backup folder picks one per run
+    from backup_schedule import start_backup_scheduler
+    start_backup_scheduler(flask_app)
+
+    # Same for WAL replication: one worker ships, the others stand by
+    from replication import start_replicator
+    start_replicator(flask_app)
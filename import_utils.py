@@ -0,0 +1,276 @@
+import os
+import re
+import csv
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db
+from models import Location, MediaItem, Track, CATEGORIES, track_row, generate_inventory_number, normalize_barcode, find_barcode_duplicates
+from export_utils import EXPORT_COLUMNS, build_location_paths
+from duplicates import update_block_keys
+from loans import sync_loans
+from translations import TRANSLATIONS
+
+# Bulk import of CSV/XLSX files in the export column format (see export_utils.EXPORT_COLUMNS).
+# Rows are streamed, validated and inserted in batches with one executemany per table.
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+def _normalize_header(value):
+    return re.sub(r'\s+', ' ', str(value or '')).strip().lower()
+
+def map_columns(header):
+    """
+    Maps the header row to field ids. Accepted are the field ids themselves and the
+    translated column labels of every language (so exports can be re-imported as they are).
+    Returns (list of field id or None per column, list of ignored column names).
+    """
+    candidates = {}
+    for field, (label_key, _) in EXPORT_COLUMNS.items():
+        names = {field} | {texts.get(label_key, label_key) for texts in TRANSLATIONS.values()}
+        for name in names:
+            candidates.setdefault(_normalize_header(name), []).append(field)
+
+    mapping = []
+    ignored = []
+    assigned = set()
+    for col in header:
+        # Ambiguous labels: take the first field (in registry order) that is still unassigned
+        field = next((f for f in candidates.get(_normalize_header(col), []) if f not in assigned), None)
+        if field:
+            assigned.add(field)
+        elif col not in (None, ''):
+            ignored.append(str(col))
+        mapping.append(field)
+    return mapping, ignored
+
+def category_lookup():
+    lookup = {}
+    for cat in CATEGORIES:
+        lookup[cat.lower()] = cat
+        for texts in TRANSLATIONS.values():
+            lookup[texts.get(cat, cat).lower()] = cat
+    return lookup
+
+_TRACK_PATTERN = re.compile(r'^(?:(\d+)\.\s*)?(.*?)(?:\s+\((\d{1,2}:\d{2}(?::\d{2})?)\))?$')
+
+def parse_tracks(value):
+    """Parses '1. Title (3:45) | 2. Other' (see export_utils.format_tracks) into track dicts."""
+    tracks = []
+    for idx, part in enumerate(str(value).split(' | ')):
+        part = part.strip()
+        if not part: continue
+        match = _TRACK_PATTERN.match(part)
+        position, title, duration = match.groups()
+        if not title: continue
+        tracks.append({'position': int(position) if position else idx + 1, 'title': title[:200], 'duration': duration})
+    return tracks
+
+def _parse_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"invalid date '{value}'")
+
+class _SemicolonDialect(csv.excel):
+    """Fallback when sniffing fails (European Excel exports use ';')."""
+    delimiter = ';'
+
+def iter_rows(path):
+    """Streams the rows of a CSV (delimiter sniffed, BOM tolerated) or XLSX file as lists."""
+    if path.lower().endswith('.xlsx'):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+        return
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = _SemicolonDialect
+        yield from csv.reader(f, dialect)
+
+class ImportRun:
+    """State of one import: lookups, counters and the report."""
+
+    def __init__(self, user_id, default_location_id, create_locations, dry_run):
+        self.user_id = user_id
+        self.default_location_id = default_location_id
+        self.create_locations = create_locations
+        self.dry_run = dry_run
+        self.categories = category_lookup()
+        self.location_ids = {path.lower(): loc_id for loc_id, path in build_location_paths().items()}
+        self.seen_barcode_keys = set()
+        self.seen_inventory_numbers = set()
+        self.report = {
+            'rows': 0, 'created': 0, 'duplicates': 0, 'errors': 0,
+            'locations_created': 0, 'tracks': 0, 'ignored_columns': [], 'error_details': []
+        }
+
+    def error(self, line, message):
+        self.report['errors'] += 1
+        if len(self.report['error_details']) < MAX_REPORTED_ERRORS:
+            self.report['error_details'].append(f"{line}: {message}")
+
+    def resolve_location(self, path):
+        """'Keller > Regal A' -> location id; missing levels are created if allowed."""
+        parts = [p.strip() for p in str(path).split('>') if p.strip()]
+        if not parts:
+            return self.default_location_id
+        key = " > ".join(parts).lower()
+        if key in self.location_ids:
+            return self.location_ids[key]
+        if not self.create_locations:
+            raise ValueError(f"unknown location '{path}'")
+
+        parent_id = None
+        for depth in range(1, len(parts) + 1):
+            sub_key = " > ".join(parts[:depth]).lower()
+            if sub_key not in self.location_ids:
+                if self.dry_run:
+                    self.location_ids[sub_key] = None
+                else:
+                    loc = Location(name=parts[depth - 1], parent_id=parent_id)
+                    db.session.add(loc)
+                    db.session.flush()
+                    self.location_ids[sub_key] = loc.id
+                self.report['locations_created'] += 1
+            parent_id = self.location_ids[sub_key]
+        return parent_id
+
+    def build_item(self, values):
+        """Validates one mapped row. Returns (item dict, tracks) or raises ValueError."""
+        title = str(values.get('title') or '').strip()
+        if not title:
+            raise ValueError("title is missing")
+
+        category_raw = str(values.get('category') or '').strip()
+        category = self.categories.get(category_raw.lower()) if category_raw else 'Sonstiges'
+        if not category:
+            raise ValueError(f"unknown category '{category_raw}'")
+
+        year = values.get('release_year')
+        if year not in (None, ''):
+            try:
+                year = int(float(year))
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid year '{year}'")
+        else:
+            year = None
+
+        barcode = str(values.get('barcode') or '').strip()[:50] or None
+        lent_to = str(values.get('lent_to') or '').strip() or None
+        lent_at = None
+        if lent_to:
+            lent_at = _parse_datetime(values['lent_at']) if values.get('lent_at') else datetime.now()
+
+        item = {
+            'inventory_number': str(values.get('inventory_number') or '').strip() or generate_inventory_number(),
+            'barcode': barcode,
+            'barcode_key': normalize_barcode(barcode),  # executemany bypasses MediaItem's validator
+            'title': title[:200],
+            'category': category,
+            'author_artist': str(values.get('author_artist') or '').strip()[:200] or None,
+            'release_year': year,
+            'description': values.get('description') or None,
+            'location_id': self.resolve_location(values.get('location') or ''),
+            'lent_to': lent_to,
+            'lent_at': lent_at,
+            'user_id': self.user_id
+        }
+        tracks = parse_tracks(values['tracks']) if values.get('tracks') else []
+        return item, tracks
+
+    def process_batch(self, batch):
+        """Dedupe a batch (file + database) and insert it with one executemany per table."""
+        inventory_numbers = {item['inventory_number'] for _, item, _ in batch}
+        existing_keys = {normalize_barcode(code) for code in find_barcode_duplicates(item['barcode'] for _, item, _ in batch)}
+        existing_numbers = {n for (n,) in db.session.query(MediaItem.inventory_number).filter(MediaItem.inventory_number.in_(inventory_numbers))}
+
+        rows = []
+        tracks_by_number = {}
+        for line, item, tracks in batch:
+            key = item['barcode_key']
+            number = item['inventory_number']
+            if (key and (key in existing_keys or key in self.seen_barcode_keys)) \
+                    or number in existing_numbers or number in self.seen_inventory_numbers:
+                self.report['duplicates'] += 1
+                continue
+            if key: self.seen_barcode_keys.add(key)
+            self.seen_inventory_numbers.add(number)
+            rows.append(item)
+            if tracks: tracks_by_number[number] = tracks
+
+        self.report['created'] += len(rows)
+        self.report['tracks'] += sum(len(t) for t in tracks_by_number.values())
+        if self.dry_run or not rows:
+            return
+
+        db.session.execute(insert(MediaItem), rows)
+        ids = dict(db.session.query(MediaItem.inventory_number, MediaItem.id)
+                   .filter(MediaItem.inventory_number.in_([row['inventory_number'] for row in rows])))
+        update_block_keys(db.session.connection(), ids.values())
+        if any(row['lent_to'] for row in rows):
+            sync_loans(db.session.connection(), list(ids.values()))
+        if tracks_by_number:
+            track_rows = [track_row(ids[number], **t)
+                          for number, tracks in tracks_by_number.items() for t in tracks]
+            db.session.execute(insert(Track), track_rows)
+        db.session.commit()
+
+def run_import_job(job_id, progress, path, user_id, default_location_id, create_locations, dry_run):
+    """
+    Job function (see jobs.start_job): imports the uploaded file at path.
+    Every batch is committed on its own; with dry_run nothing is written and the
+    report shows what would happen.
+    """
+    run = ImportRun(user_id, default_location_id, create_locations, dry_run)
+    try:
+        rows = iter_rows(path)
+        header = next(rows, None)
+        if not header:
+            raise ValueError("The file is empty.")
+        mapping, run.report['ignored_columns'] = map_columns(header)
+        if 'title' not in mapping:
+            raise ValueError("No title column found.")
+
+        batch = []
+        for line, row in enumerate(rows, 2):
+            if not any(v not in (None, '') for v in row):
+                continue
+            run.report['rows'] += 1
+            values = {field: value for field, value in zip(mapping, row) if field}
+            try:
+                item, tracks = run.build_item(values)
+                batch.append((line, item, tracks))
+            except ValueError as e:
+                run.error(line, str(e))
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                run.process_batch(batch)
+                batch = []
+                progress(run.report['rows'], message=f"{run.report['created']} / {run.report['rows']}")
+
+        if batch:
+            run.process_batch(batch)
+        if dry_run:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if os.path.exists(path): os.remove(path)
+
+    progress(run.report['rows'], run.report['rows'], message=f"{run.report['created']} / {run.report['rows']}", force=True)
+    return run.report
@@ -0,0 +1,176 @@
+import os
+import json
+import uuid
+import time
+import socket
+import tempfile
+import threading
+from datetime import datetime
+from flask import current_app
+
+# Background jobs (exports, imports, restores) run on a thread outside the request.
+# Their state lives in small JSON files in instance/jobs, so every worker process can report
+# progress and the state survives a database restore.
+# The threads die with their process (worker replaced on reload, recycled or crashed), so a
+# running job records its process and a heartbeat; a job whose process is gone or whose
+# heartbeat stopped is reported as failed.
+
+JOB_MAX_AGE = 24 * 3600  # Finished jobs and their artifacts are removed after one day
+JOB_HEARTBEAT = 5        # Seconds between heartbeats of a running job
+JOB_STALE = 60           # A running job without heartbeat for this long was interrupted
+JOB_INTERRUPTED = "Interrupted: the process running the job stopped."
+
+_update_lock = threading.Lock()  # Heartbeat and progress of a job are written by two threads
+
+def jobs_folder():
+    path = os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _job_path(job_id):
+    return os.path.join(jobs_folder(), f"{job_id}.json")
+
+def _write_job(job):
+    # Atomic replace: readers never see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=jobs_folder(), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _job_path(job['id']))
+
+def _read_job(job_id):
+    # Job ids are uuid hex strings, reject everything else (path traversal)
+    if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+        return None
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _process_gone(job):
+    if job.get('host') != socket.gethostname() or not job.get('pid'):
+        return False  # Another machine/container: only the heartbeat tells
+    try:
+        os.kill(job['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def job_interrupted(job):
+    """True for an unfinished job whose process is gone or whose heartbeat is stale."""
+    if job['status'] not in ('queued', 'running'):
+        return False
+    return _process_gone(job) or time.time() - job.get('heartbeat', 0) > JOB_STALE
+
+def get_job(job_id):
+    """State of a job; an interrupted one is reported as failed."""
+    job = _read_job(job_id)
+    if job is not None and job_interrupted(job):
+        last_seen = datetime.fromtimestamp(job.get('heartbeat', 0))
+        job.update(status='failed', message=JOB_INTERRUPTED, finished_at=last_seen.isoformat(timespec='seconds'))
+    return job
+
+def create_job(kind, user_id=None, **params):
+    prune_jobs()
+    job = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'status': 'queued',
+        'progress': 0,
+        'total': None,
+        'message': '',
+        'artifact': None,
+        'download_name': None,
+        'result': None,
+        'user_id': user_id,
+        'params': params,
+        'pid': os.getpid(),
+        'host': socket.gethostname(),
+        'heartbeat': time.time(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'finished_at': None
+    }
+    _write_job(job)
+    return job
+
+def update_job(job_id, **fields):
+    with _update_lock:
+        job = _read_job(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        _write_job(job)
+        return job
+
+def artifact_path(job):
+    """Absolute path of the file a job produced (stored next to its state file)."""
+    if not job or not job.get('artifact'):
+        return None
+    return os.path.join(jobs_folder(), job['artifact'])
+
+class JobProgress:
+    """Progress reporter handed to job functions. Writes at most every `interval` seconds."""
+
+    def __init__(self, job_id, interval=1.0):
+        self.job_id = job_id
+        self.interval = interval
+        self._last_write = 0
+
+    def __call__(self, done, total=None, message=None, force=False):
+        now = time.time()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        fields = {'progress': done, 'heartbeat': now}
+        if total is not None: fields['total'] = total
+        if message is not None: fields['message'] = message
+        update_job(self.job_id, **fields)
+
+def start_job(job, func, *args, **kwargs):
+    """
+    Runs func(job_id, progress, *args, **kwargs) on a background thread with an app context.
+    The return value of func is stored as job['result']; exceptions mark the job as failed.
+    """
+    app = current_app._get_current_object()
+
+    def heartbeat(stop):
+        with app.app_context():
+            while not stop.wait(JOB_HEARTBEAT):
+                update_job(job['id'], heartbeat=time.time())
+
+    def runner():
+        with app.app_context():
+            from extensions import db
+            progress = JobProgress(job['id'])
+            update_job(job['id'], status='running', heartbeat=time.time())
+            stop = threading.Event()
+            threading.Thread(target=heartbeat, args=(stop,), name=f"job-heartbeat-{job['id'][:8]}", daemon=True).start()
+            try:
+                result = func(job['id'], progress, *args, **kwargs)
+                update_job(job['id'], status='done', result=result,
+                           finished_at=datetime.now().isoformat(timespec='seconds'))
+            except Exception as e:
+                app.logger.exception("Job %s (%s) failed", job['id'], job['kind'])
+                update_job(job['id'], status='failed', message=str(e),
+                           finished_at=datetime.now().isoformat(timespec='seconds'))
+            finally:
+                stop.set()
+                db.session.remove()
+
+    thread = threading.Thread(target=runner, name=f"job-{job['kind']}-{job['id'][:8]}", daemon=True)
+    thread.start()
+    return thread
+
+def prune_jobs(max_age=JOB_MAX_AGE):
+    """Removes state files and artifacts of jobs older than max_age seconds."""
+    folder = jobs_folder()
+    limit = time.time() - max_age
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
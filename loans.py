@@ -0,0 +1,81 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, select, insert, update, exists, func, case, literal
+from sqlalchemy.orm import Session
+from extensions import db
+from models import MediaItem, Borrower, Loan
+
+# Lending history. MediaItem.lent_to/lent_at stay the "current state" that forms, search,
+# exports and the API work with; the loan table records every lending with its return date.
+# sync_loans() reconciles both for any selection of items with three set-based statements,
+# so single edits (ORM listener below) and bulk actions/imports use the same code path.
+
+LENDING_STATS_LIMIT = 10
+LENDING_HISTORY_LIMIT = 20  # Loans shown on the item page
+
+def sync_loans(connection, item_ids, now=None):
+    """
+    Brings the loans of the selected items (id list or SELECT of ids) in line with lent_to:
+    creates missing borrowers, closes open loans that no longer match and opens new ones.
+    """
+    now = now or datetime.now()
+    items, loans, borrowers = MediaItem.__table__, Loan.__table__, Borrower.__table__
+    selected = items.c.id.in_(item_ids)
+    lent = items.join(borrowers, borrowers.c.name == items.c.lent_to)  # NOCASE (borrower.name collation)
+
+    connection.execute(insert(borrowers).prefix_with('OR IGNORE').from_select(
+        ['name', 'created_at'],
+        select(items.c.lent_to, literal(now)).where(selected, items.c.lent_to != None).distinct()))
+
+    still_lent = select(1).select_from(lent).where(items.c.id == loans.c.media_item_id, borrowers.c.id == loans.c.borrower_id)
+    connection.execute(update(loans)
+                       .where(loans.c.returned_at == None, loans.c.media_item_id.in_(item_ids), ~exists(still_lent))
+                       .values(returned_at=now))
+
+    has_open = select(1).where(loans.c.media_item_id == items.c.id, loans.c.returned_at == None)
+    connection.execute(insert(loans).from_select(
+        ['media_item_id', 'borrower_id', 'lent_at'],
+        select(items.c.id, borrowers.c.id, func.coalesce(items.c.lent_at, now)).select_from(lent)
+        .where(selected, ~exists(has_open))))
+
+@event.listens_for(Session, 'after_flush')
+def _record_loans(session, flush_context):
+    # ORM writes (edit form, batch API); bulk actions and the import call sync_loans themselves
+    changed = [obj.id for obj in session.new if isinstance(obj, MediaItem) and obj.lent_to]
+    changed += [obj.id for obj in session.dirty
+                if isinstance(obj, MediaItem) and inspect(obj).attrs.lent_to.history.has_changes()]
+    if changed:
+        sync_loans(session.connection(), changed)
+
+def open_loans_query(person=None):
+    """Items currently lent (optionally to one borrower), via the open-loan indexes."""
+    query = MediaItem.query.join(Loan, (Loan.media_item_id == MediaItem.id) & (Loan.returned_at == None)) \
+        .join(Borrower, Borrower.id == Loan.borrower_id)
+    if person:
+        query = query.filter(Borrower.name == person)
+    return query.order_by(Borrower.name, Loan.lent_at)
+
+def current_borrowers():
+    """[(name, open loans)] of everyone who currently has something."""
+    return db.session.execute(
+        select(Borrower.name, func.count(Loan.id)).join(Loan, Loan.borrower_id == Borrower.id)
+        .where(Loan.returned_at == None).group_by(Borrower.id).order_by(Borrower.name)).all()
+
+def lending_stats(limit=LENDING_STATS_LIMIT):
+    """Historical figures from the loan table alone (no media_item scan)."""
+    days = func.julianday(Loan.returned_at) - func.julianday(Loan.lent_at)
+    total, returned, avg_days = db.session.execute(
+        select(func.count(Loan.id), func.count(Loan.returned_at), func.avg(case((Loan.returned_at != None, days))))).one()
+
+    top_borrowers = db.session.execute(
+        select(Borrower.name, func.count(Loan.id).label('loans'), func.count(Loan.id) - func.count(Loan.returned_at))
+        .join(Loan, Loan.borrower_id == Borrower.id).group_by(Borrower.id)
+        .order_by(func.count(Loan.id).desc(), Borrower.name).limit(limit)).all()
+
+    counts = select(Loan.media_item_id, func.count(Loan.id).label('loans')).group_by(Loan.media_item_id) \
+        .order_by(func.count(Loan.id).desc()).limit(limit).subquery()
+    most_borrowed = db.session.execute(
+        select(MediaItem.id, MediaItem.title, counts.c.loans).join(counts, counts.c.media_item_id == MediaItem.id)
+        .order_by(counts.c.loans.desc(), MediaItem.title)).all()
+
+    return {'total': total, 'returned': returned, 'avg_days': avg_days,
+            'top_borrowers': top_borrowers, 'most_borrowed': most_borrowed}
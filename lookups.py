@@ -0,0 +1,280 @@
+import re
+import time
+import base64
+import difflib
+import asyncio
+import httpx
+
+# External metadata lookups (Google Books, Open Library, Amazon covers, Discogs, Blu-ray.com,
+# Spotify). They are coroutines on a non-blocking HTTP client: the routes in routes.py run
+# them as Flask async views, asgi.py serves them directly on the event loop of each worker,
+# so many waiting lookups share one thread instead of holding one each.
+#
+# Every lookup gets (client, settings, **args) and returns (data, settings_to_save); the
+# caller reads the settings listed in LOOKUPS beforehand and stores the returned ones.
+
+LOOKUP_TIMEOUT = 5.0
+USER_AGENT = 'HomeInventoryApp/1.0'
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def lookup_client():
+    # Redirects are followed like requests did (blu-ray.com redirects to the detail page)
+    return httpx.AsyncClient(timeout=LOOKUP_TIMEOUT, follow_redirects=True)
+
+def _discogs_headers(token):
+    return {"User-Agent": USER_AGENT, "Authorization": f"Discogs token={token}"}
+
+def _discogs_tracks(release):
+    return [{"position": t.get("position", ""), "title": t.get("title", ""), "duration": t.get("duration", "")}
+            for t in release.get("tracklist", []) if t.get("type_") != "heading"]
+
+# -- BARCODE LOOKUP --
+
+async def _google_books(client, isbn):
+    try:
+        res = await client.get(f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}")
+        if res.status_code == 200 and res.json().get("items"):
+            return res.json()["items"][0].get("volumeInfo", {})
+    except Exception: pass
+    return None
+
+async def _open_library(client, isbn):
+    try:
+        res = await client.get(f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data")
+        if res.status_code == 200 and res.json():
+            return list(res.json().values())[0]
+    except Exception: pass
+    return None
+
+async def _amazon_cover(client, isbn):
+    # Amazon returns a 43 byte 1x1 gif for "not found"
+    url = f"https://images-na.ssl-images-amazon.com/images/P/{isbn}.01.LZZZZZZZ.jpg"
+    try:
+        check = await client.get(url, timeout=3)
+        if check.status_code == 200 and len(check.content) > 100:
+            return url
+    except Exception as e:
+        print(f"DEBUG: Amazon Fallback Fehler: {e}")
+    return None
+
+async def _discogs_barcode(client, data, barcode, token):
+    h = _discogs_headers(token)
+    res = await client.get("https://api.discogs.com/database/search", headers=h,
+                           params={"barcode": barcode, "type": "release", "per_page": 1})
+    if res.status_code != 200 or not res.json().get("results"):
+        return
+    it = res.json()["results"][0]
+    data["success"] = True
+
+    # Title/Author separation at Discogs often "Artist - Title"
+    full_title = it.get("title", "")
+    if " - " in full_title and not data["author"]:
+        parts = full_title.split(" - ", 1)
+        data["author"] = parts[0].strip()
+        data["title"] = parts[1].strip()
+    elif not data["title"]:
+        data["title"] = full_title
+
+    if not data["year"]: data["year"] = it.get("year", "")
+    if not data["image_url"]:
+        data["image_url"] = it.get("cover_image", "")
+
+    fmts = it.get("format", [])
+    if "Vinyl" in fmts: data["category"] = "Vinyl/LP"
+    elif "CD" in fmts: data["category"] = "CD"
+    elif "DVD" in fmts: data["category"] = "Film (DVD/BluRay)"
+
+    if it.get("resource_url"):
+        det = (await client.get(it["resource_url"], headers=h)).json()
+        data["tracks"].extend(_discogs_tracks(det))
+
+async def _bluray(client, data, barcode):
+    # Blu-ray.com EAN search (replaces TMDB and OFDb, which are unreliable for EANs)
+    headers = {'User-Agent': BROWSER_USER_AGENT}
+    res = await client.get(f"https://www.blu-ray.com/search/?quicksearch=1&quicksearch_country=all&quicksearch_keyword={barcode}",
+                           headers=headers)
+    if res.status_code != 200:
+        return
+    movie_url, d_content = None, ""
+    if "/movies/" in str(res.url):
+        # Redirected to the detail page
+        movie_url, d_content = str(res.url), res.text
+    else:
+        link_match = re.search(r'href="(https://www.blu-ray.com/movies/[^"]+)"[^>]*title="([^"]+)"', res.text)
+        if link_match:
+            detail_res = await client.get(link_match.group(1), headers=headers)
+            if detail_res.status_code == 200:
+                movie_url, d_content = link_match.group(1), detail_res.text
+    if not (movie_url and d_content):
+        return
+
+    data["success"] = True
+    data["category"] = "Film (DVD/BluRay)"
+    title_match = re.search(r'<meta property="og:title" content="([^"]+)"', d_content)
+    if title_match:
+        t = title_match.group(1)
+        for suffix in (r'\s+\(Blu-ray\)', r'\s+\(4K\)', r'\s+\(3D\)'):
+            t = re.sub(suffix, '', t)
+        data["title"] = t.strip()
+    desc_match = re.search(r'<meta property="og:description" content="([^"]+)"', d_content)
+    if desc_match:
+        data["description"] = desc_match.group(1)
+    img_match = re.search(r'<meta property="og:image" content="([^"]+)"', d_content)
+    if img_match:
+        data["image_url"] = img_match.group(1)
+    year_match = re.search(r'href="https://www.blu-ray.com/movies/movies.php\?year=(\d{4})"', d_content)
+    if year_match:
+        data["year"] = year_match.group(1)
+    dir_match = re.search(r'Directors?:.*?<a[^>]+>([^<]+)</a>', d_content, re.DOTALL)
+    if dir_match:
+        data["author"] = dir_match.group(1)
+
+async def lookup_barcode(client, settings, barcode):
+    data = {"success": False, "title": "", "author": "", "year": "", "description": "", "image_url": "", "category": "", "tracks": []}
+    clean_isbn = ''.join(c for c in barcode if c.isdigit() or c.upper() == 'X')
+
+    # 1./2. Google Books and Open Library at the same time; Google's metadata wins
+    info, bk = await asyncio.gather(_google_books(client, clean_isbn), _open_library(client, clean_isbn))
+    if info:
+        published = info.get("publishedDate", "")
+        data.update({
+            "success": True, "title": info.get("title", ""),
+            "author": ", ".join(info.get("authors", [])),
+            "description": info.get("description", "")[:800], "category": "Buch",
+            "year": published[:4] if len(published) >= 4 else ""
+        })
+        thumbnail = info.get("imageLinks", {}).get("thumbnail")
+        if thumbnail: data["image_url"] = thumbnail.replace("http://", "https://")
+    if bk and (not data["success"] or not data["image_url"]):
+        if not data["success"]:
+            data.update({
+                "success": True, "title": bk.get("title", ""),
+                "author": ", ".join([a["name"] for a in bk.get("authors", [])]),
+                "category": "Buch"
+            })
+            match = re.search(r'\d{4}', bk.get("publish_date", ""))
+            if match: data["year"] = match.group(0)
+        if "cover" in bk: data["image_url"] = bk["cover"].get("large", "")
+
+    # 3. Amazon direct image (often has covers of German books)
+    if data["success"] and not data["image_url"]:
+        data["image_url"] = await _amazon_cover(client, clean_isbn) or ""
+
+    # 4. Discogs (music)
+    token = settings.get('discogs_token')
+    if token and (not data["success"] or data["category"] == ""):
+        try:
+            await _discogs_barcode(client, data, barcode, token)
+        except Exception: pass
+
+    # 5. Blu-ray.com (films)
+    if not data["success"] or data["category"] == "":
+        try:
+            await _bluray(client, data, barcode)
+        except Exception as e:
+            print(f"Blu-ray.com Error: {e}")
+
+    return data, {}
+
+# -- DISCOGS TEXT SEARCH --
+
+async def search_discogs(client, settings, artist, title):
+    data = {"success": False, "images": [], "tracks": [], "year": "", "category": ""}
+    headers = _discogs_headers(settings['discogs_token'])
+    try:
+        res = await client.get("https://api.discogs.com/database/search", headers=headers,
+                               params={"artist": artist, "release_title": title, "type": "release", "per_page": 1})
+        if res.status_code == 200 and res.json().get("results"):
+            item = res.json()["results"][0]
+            data["success"] = True
+            data["year"] = item.get("year", "")
+
+            formats = item.get("format", [])
+            if "Vinyl" in formats: data["category"] = "Vinyl/LP"
+            elif "CD" in formats: data["category"] = "CD"
+
+            resource_url = item.get("resource_url")
+            if resource_url:
+                det_res = await client.get(resource_url, headers=headers)
+                if det_res.status_code == 200:
+                    det = det_res.json()
+                    data["images"] = [img.get("uri", "") for img in det.get("images", []) if img.get("uri")]
+                    if not data["images"]:
+                        thumb = item.get("cover_image") or item.get("thumb")
+                        if thumb: data["images"].append(thumb)
+                    data["tracks"] = _discogs_tracks(det)
+    except Exception as e:
+        return {"success": False, "message": str(e)}, {}
+    return data, {}
+
+# -- SPOTIFY SEARCH --
+
+async def spotify_access_token(client, settings):
+    """(token, settings_to_save): the cached token while it is valid, otherwise a new one."""
+    token, expiry = settings.get('spotify_access_token'), settings.get('spotify_token_expiry')
+    try:
+        if token and expiry and float(expiry) > time.time():
+            return token, {}
+    except ValueError: pass
+
+    try:
+        auth = base64.b64encode(f"{settings['spotify_client_id']}:{settings['spotify_client_secret']}".encode()).decode()
+        res = await client.post('https://accounts.spotify.com/api/token', headers={'Authorization': f'Basic {auth}'},
+                                data={'grant_type': 'client_credentials'})
+        if res.status_code == 200:
+            js = res.json()
+            new_token = js.get('access_token')
+            # Stored with a 60 s buffer
+            expiry = str(time.time() + js.get('expires_in', 3600) - 60)
+            return new_token, {'spotify_access_token': new_token, 'spotify_token_expiry': expiry}
+        print(f"DEBUG: Spotify Auth Failed. Status: {res.status_code}, Response: {res.text}")
+    except Exception as e:
+        print(f"Spotify Auth Error: {e}")
+    return None, {}
+
+def _best_spotify_match(items, artist, title):
+    target_artist, target_title = artist.lower(), title.lower()
+    for item in items or []:
+        # 1. Artist: substring or similar enough (ratio > 0.6)
+        sp_artists = [a.get('name', '').lower() for a in item.get('artists', [])]
+        if not any(target_artist in sp_a or sp_a in target_artist
+                   or difflib.SequenceMatcher(None, target_artist, sp_a).ratio() > 0.6 for sp_a in sp_artists):
+            continue
+        # 2. Title
+        sp_album = item.get('name', '').lower()
+        if target_title in sp_album or sp_album in target_title \
+                or difflib.SequenceMatcher(None, target_title, sp_album).ratio() > 0.6:
+            return item.get('id')
+    return None
+
+async def search_spotify(client, settings, artist, title):
+    token, updates = await spotify_access_token(client, settings)
+    if not token:
+        return {"success": False, "message": "Spotify not configured or auth failed"}, updates
+
+    try:
+        # Strict with fields first, then loose (also finds "Remastered" etc.).
+        # market=DE improves the hit rate for German users and filters unplayable content.
+        for query in (f'artist:"{artist}" album:"{title}"', f"{artist} {title}"):
+            res = await client.get("https://api.spotify.com/v1/search", headers={"Authorization": f"Bearer {token}"},
+                                   params={"q": query, "type": "album", "limit": 5, "market": "DE"})
+            if res.status_code == 200:
+                match_id = _best_spotify_match(res.json().get("albums", {}).get("items", []), artist, title)
+                if match_id:
+                    return {"success": True, "spotify_id": match_id}, updates
+    except Exception as e:
+        print(f"Spotify Search Error: {e}")
+    return {"success": False, "message": "Not found"}, updates
+
+# name -> (coroutine, settings read beforehand, settings/arguments that must be set)
+LOOKUPS = {
+    'barcode': (lookup_barcode, ['discogs_token'], []),
+    'discogs': (search_discogs, ['discogs_token'], ['discogs_token']),
+    'spotify': (search_spotify, ['spotify_client_id', 'spotify_client_secret', 'spotify_access_token', 'spotify_token_expiry'],
+                ['spotify_client_id', 'spotify_client_secret', 'artist', 'title']),
+}
+
+def lookup_ready(name, settings, args):
+    """False if a required setting/argument is missing (the route answers those cases itself)."""
+    values = {**settings, **args}
+    return all(values.get(key) for key in LOOKUPS[name][2])
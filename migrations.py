@@ -0,0 +1,193 @@
+from datetime import datetime
+from sqlalchemy import text, inspect, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+from extensions import db, begin_immediate
+from models import MediaItem, SchemaVersion, normalize_barcode, parse_duration
+from changes import install_change_tracking
+from loans import sync_loans
+from duplicates import rebuild_block_keys
+
+# -- SCHEMA MIGRATIONS --
+# schema_version records every applied step. Startup reads its highest version once and
+# runs only the newer steps, each in its own transaction: a failing step is rolled back
+# completely and stops the upgrade. New databases are created from the models and stamped
+# with the latest version without running any step.
+# To change the schema (new column, index for a slow query, ...) append a step with the
+# next version number. Never edit or renumber a step that has been released.
+
+MIGRATIONS = []  # [(version, description, function(connection), foreign_keys)]
+REBUILD_BATCH_SIZE = 5000  # Rows copied per statement when a table is rebuilt
+
+class MigrationError(Exception):
+    pass
+
+def migration(version, description, foreign_keys=True):
+    """Registers a step. foreign_keys=False runs it with FK enforcement off (table rebuilds)."""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func, foreign_keys))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def _columns(connection, table):
+    return [col['name'] for col in inspect(connection).get_columns(table)]
+
+def _add_column(connection, table, column, ddl):
+    if column not in _columns(connection, table):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def rebuild_table(connection, model):
+    """
+    Recreates a table from its current model definition (SQLite cannot drop a constraint):
+    new table, rows copied in id batches, count verified, old table dropped, new one renamed,
+    indexes and change triggers recreated. Needs foreign_keys=False on the step.
+    """
+    table = model.__table__
+    name, temp = table.name, f"{table.name}_rebuild"
+    old_columns = set(_columns(connection, name))
+    columns = ', '.join(c.name for c in table.columns if c.name in old_columns)
+
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect))
+    if f"CREATE TABLE {name} (" not in ddl:
+        raise MigrationError(f"Unexpected DDL for {name}")
+    connection.execute(text(f"DROP TABLE IF EXISTS {temp}"))
+    connection.execute(text(ddl.replace(f"CREATE TABLE {name} (", f"CREATE TABLE {temp} (", 1)))
+
+    total = connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+    copied, last_id = 0, 0
+    while True:
+        upper = connection.execute(text(f"SELECT MAX(id) FROM (SELECT id FROM {name} WHERE id > :last ORDER BY id LIMIT :n)"),
+                                   {'last': last_id, 'n': REBUILD_BATCH_SIZE}).scalar()
+        if upper is None:
+            break
+        copied += connection.execute(text(f"INSERT INTO {temp} ({columns}) SELECT {columns} FROM {name} "
+                                          f"WHERE id > :last AND id <= :upper"),
+                                     {'last': last_id, 'upper': upper}).rowcount
+        last_id = upper
+        print(f"  {name}: {copied}/{total} rows copied")
+
+    if connection.execute(text(f"SELECT COUNT(*) FROM {temp}")).scalar() != total or copied != total:
+        raise MigrationError(f"Rebuild of {name}: copied {copied} of {total} rows")
+
+    connection.execute(text(f"DROP TABLE {name}"))
+    connection.execute(text(f"ALTER TABLE {temp} RENAME TO {name}"))
+    for index in table.indexes:
+        index.create(connection)
+    install_change_tracking(connection)  # Triggers went with the old table
+
+def _read_version(connection):
+    try:
+        return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except OperationalError:
+        return None  # No schema_version yet: new database or one from before versioned migrations
+
+def _record(connection, version, description):
+    connection.execute(insert(SchemaVersion).values(version=version, description=description,
+                                                    applied_at=datetime.utcnow()))
+
+def _run_step(version, description, func, foreign_keys):
+    with db.engine.connect() as conn:
+        if not foreign_keys:
+            # PRAGMA foreign_keys is ignored inside a transaction, so set it before BEGIN
+            conn.connection.driver_connection.execute("PRAGMA foreign_keys=OFF")
+        try:
+            with conn.begin():
+                begin_immediate(conn)  # DDL is part of the transaction as well
+                violations = len(conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall()) if not foreign_keys else 0
+                func(conn)
+                if not foreign_keys:
+                    after = len(conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall())
+                    if after > violations:
+                        raise MigrationError(f"Version {version} leaves {after - violations} broken references")
+                _record(conn, version, description)
+        finally:
+            if not foreign_keys:
+                conn.invalidate()  # The next connection gets the regular pragma profile
+
+def upgrade_database():
+    """Brings the database to the latest version. Returns the versions applied."""
+    with db.engine.connect() as conn:
+        version = _read_version(conn)
+    if version is not None and version >= latest_version():
+        return []
+
+    if version is None:
+        existing = inspect(db.engine).get_table_names()
+        db.create_all()  # Missing tables; existing ones are upgraded by the steps
+        if 'media_item' not in existing:
+            with db.engine.begin() as conn:
+                for step_version, description, _, _ in MIGRATIONS:
+                    _record(conn, step_version, description)
+            return []
+        version = 0
+
+    applied = []
+    for step_version, description, func, foreign_keys in MIGRATIONS:
+        if step_version <= version:
+            continue
+        print(f"Database migration {step_version}: {description}")
+        _run_step(step_version, description, func, foreign_keys)
+        applied.append(step_version)
+    return applied
+
+# -- STEPS --
+
+@migration(1, "User preferences (language, theme, sorting)")
+def _user_preferences(connection):
+    _add_column(connection, 'user', 'language', "VARCHAR(10) DEFAULT 'en'")
+    _add_column(connection, 'user', 'theme', "VARCHAR(20) DEFAULT 'cerulean'")
+    _add_column(connection, 'user', 'sort_field', "VARCHAR(50) DEFAULT 'added'")
+    _add_column(connection, 'user', 'sort_order', "VARCHAR(10) DEFAULT 'desc'")
+
+@migration(2, "Barcode no longer unique (several copies of one release)", foreign_keys=False)
+def _barcode_not_unique(connection):
+    # index_list also shows the automatic indexes of UNIQUE constraints (column or table level)
+    for _, index_name, unique, *_ in connection.exec_driver_sql("PRAGMA index_list(media_item)").all():
+        columns = [row[2] for row in connection.exec_driver_sql(f"PRAGMA index_info('{index_name}')")]
+        if unique and columns == ['barcode']:
+            rebuild_table(connection, MediaItem)
+            return
+
+@migration(3, "Change feed columns and triggers")
+def _change_tracking(connection):
+    install_change_tracking(connection)
+
+@migration(4, "Normalized barcode key (ISBN-10/EAN-13/UPC)")
+def _barcode_key(connection):
+    _add_column(connection, 'media_item', 'barcode_key', "VARCHAR(50)")
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_media_item_barcode_key ON media_item (barcode_key)"))
+    rows = connection.execute(text("SELECT id, barcode FROM media_item WHERE barcode IS NOT NULL AND barcode_key IS NULL")).all()
+    updates = [{'id': item_id, 'key': normalize_barcode(barcode)} for item_id, barcode in rows]
+    updates = [u for u in updates if u['key']]
+    if updates:
+        connection.execute(text("UPDATE media_item SET barcode_key = :key WHERE id = :id"), updates)
+
+@migration(5, "Blocking keys for the duplicate report")
+def _block_keys(connection):
+    if connection.execute(text("SELECT 1 FROM media_block_key LIMIT 1")).first() is None:
+        rebuild_block_keys(connection)
+
+@migration(6, "Track durations in seconds and tracklist index")
+def _track_durations(connection):
+    if 'duration_seconds' not in _columns(connection, 'track'):
+        connection.execute(text("ALTER TABLE track ADD COLUMN duration_seconds INTEGER"))
+        rows = connection.execute(text("SELECT id, duration FROM track WHERE duration IS NOT NULL")).all()
+        updates = [{'id': track_id, 'seconds': parse_duration(duration)} for track_id, duration in rows]
+        updates = [u for u in updates if u['seconds'] is not None]
+        if updates:
+            connection.execute(text("UPDATE track SET duration_seconds = :seconds WHERE id = :id"), updates)
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_track_media_item_position ON track (media_item_id, position)"))
+
+@migration(7, "Lending history from the items lent right now")
+def _lending_history(connection):
+    if connection.execute(text("SELECT 1 FROM loan LIMIT 1")).first() is None:
+        sync_loans(connection, select(MediaItem.id).where(MediaItem.lent_to != None))
+
+@migration(8, "Tombstone retention for the change feed")
+def _tombstone_retention(connection):
+    _add_column(connection, 'change_sequence', 'pruned', "INTEGER NOT NULL DEFAULT 0")
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_change_tombstone_deleted_at ON change_tombstone (deleted_at)"))
@@ -1,6 +1,12 @@
+import re
+import uuid
+import hashlib
+import secrets
 from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import validates
 from extensions import db, login_manager
 
 # -- USER & RBAC --
@@ -61,12 +67,41 @@ class AppSetting(db.Model):
     def __repr__(self):
         return f'<AppSetting {self.key}>'
 
+class ApiToken(db.Model):
+    # Bearer tokens for the JSON API (scanner apps). Only the SHA-256 of the token is stored.
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+    user = db.relationship('User')
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, name, user):
+        """Creates a token for user. Returns (ApiToken, plaintext) - the plaintext is shown only once."""
+        plaintext = secrets.token_urlsafe(32)
+        return cls(name=name, token_hash=cls.hash_token(plaintext), user_id=user.id), plaintext
+
+    @classmethod
+    def find(cls, plaintext):
+        return cls.query.filter_by(token_hash=cls.hash_token(plaintext)).first() if plaintext else None
+
+    def __repr__(self):
+        return f'<ApiToken {self.name}>'
+
 # -- MEDIA MODELS --
 
 class Location(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    row_version = db.Column(db.Integer, index=True)  # Set by trigger, see changes.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     children = db.relationship('Location', backref=db.backref('parent', remote_side=[id]))
     items = db.relationship('MediaItem', backref='location', lazy='dynamic')
 
@@ -91,10 +126,45 @@ class Collection(db.Model):
     description = db.Column(db.Text, nullable=True)
     items = db.relationship('MediaItem', backref='collection', lazy='dynamic')
 
+CATEGORIES = ["Buch", "Film (DVD/BluRay)", "CD", "Vinyl/LP", "Videospiel", "Sonstiges"]
+
+def generate_inventory_number():
+    year = datetime.now().year
+    unique = str(uuid.uuid4())[:8].upper()
+    return f"INV-{year}-{unique}"
+
+def _ean_check_digit(digits):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+def _isbn10_valid(code):
+    total = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(code))
+    return total % 11 == 0
+
+def normalize_barcode(code):
+    """
+    Canonical form of a barcode for duplicate detection: ISBN-10, UPC-A, EAN-8 and GTIN-14
+    are converted to EAN-13, so '0-306-40615-2' and '9780306406157' get the same key.
+    Other codes are only stripped of spaces/hyphens and upper-cased. Empty -> None.
+    """
+    cleaned = re.sub(r'[\s\-]', '', str(code or '')).upper()
+    if not cleaned:
+        return None
+    if re.fullmatch(r'\d{9}[\dX]', cleaned) and _isbn10_valid(cleaned):
+        ean = '978' + cleaned[:9]
+        return ean + _ean_check_digit(ean)
+    if cleaned.isdigit():
+        if len(cleaned) in (8, 12):
+            return cleaned.zfill(13)
+        if len(cleaned) == 14 and cleaned.startswith('0'):
+            return cleaned[1:]
+    return cleaned[:50]
+
 class MediaItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     inventory_number = db.Column(db.String(50), unique=True, nullable=False)
     barcode = db.Column(db.String(50), nullable=True)
+    barcode_key = db.Column(db.String(50), index=True)  # normalize_barcode(barcode), kept in sync below
     title = db.Column(db.String(200), nullable=False)
     category = db.Column(db.String(50), nullable=False)
     author_artist = db.Column(db.String(200))
@@ -108,11 +178,214 @@ class MediaItem(db.Model):
     lent_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    row_version = db.Column(db.Integer, index=True)  # Set by trigger, see changes.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     tracks = db.relationship('Track', backref='media_item', cascade="all, delete-orphan", lazy='dynamic')
+    loans = db.relationship('Loan', backref='media_item', cascade="all, delete-orphan", lazy='dynamic')
+    block_keys = db.relationship('MediaBlockKey', cascade="all, delete-orphan", lazy='dynamic')
+
+    @validates('barcode')
+    def _sync_barcode_key(self, key, value):
+        # Bulk inserts (import) bypass this and set barcode_key themselves
+        self.barcode_key = normalize_barcode(value)
+        return value
+
+def parse_duration(value):
+    """'4:05' / '1:02:03' / '245' -> seconds (None if empty or not a duration)."""
+    value = str(value or '').strip()
+    if not re.fullmatch(r'\d+(:\d{1,2}){0,2}', value):
+        return None
+    seconds = 0
+    for part in value.split(':'):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def format_duration(seconds):
+    """Seconds -> '4:05' / '1:02:03'."""
+    if seconds is None:
+        return ''
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
 
 class Track(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     media_item_id = db.Column(db.Integer, db.ForeignKey('media_item.id'), nullable=False)
     position = db.Column(db.Integer)
     title = db.Column(db.String(200), nullable=False)
-    duration = db.Column(db.String(20))
+    duration = db.Column(db.String(20))  # As entered/imported, shown as is
+    duration_seconds = db.Column(db.Integer)  # parse_duration(duration), for SUM() etc.
+    row_version = db.Column(db.Integer, index=True)  # Set by trigger, see changes.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Tracklist of an item in order; also serves lookups/deletes by media_item_id
+    __table_args__ = (db.Index('ix_track_media_item_position', 'media_item_id', 'position'),)
+
+    @validates('duration')
+    def _sync_duration_seconds(self, key, value):
+        self.duration_seconds = parse_duration(value)
+        return value
+
+def track_row(media_item_id, title, position=None, duration=None):
+    """Column values of one track for executemany inserts (which bypass the validator)."""
+    duration = str(duration).strip()[:20] if duration else None
+    return {'media_item_id': media_item_id, 'title': title, 'position': position,
+            'duration': duration, 'duration_seconds': parse_duration(duration)}
+
+def replace_tracks(media_item_id, tracks):
+    """Replaces the tracklist of an item with one DELETE and one executemany INSERT."""
+    db.session.execute(delete(Track).where(Track.media_item_id == media_item_id))
+    if tracks:
+        db.session.execute(insert(Track), [track_row(media_item_id, **t) for t in tracks])
+
+class MediaBlockKey(db.Model):
+    # Blocking keys for fuzzy duplicate detection, maintained on write (see duplicates.py)
+    id = db.Column(db.Integer, primary_key=True)
+    media_item_id = db.Column(db.Integer, db.ForeignKey('media_item.id'), nullable=False, index=True)
+    key = db.Column(db.String(64), nullable=False)
+    __table_args__ = (db.Index('ix_media_block_key_key_item', 'key', 'media_item_id'),)  # Covers the block self-join
+
+# -- LENDING (see loans.py) --
+
+class Borrower(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100, collation='NOCASE'), unique=True, nullable=False)  # "alex" == "Alex"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    loans = db.relationship('Loan', backref='borrower', lazy='dynamic')
+
+class Loan(db.Model):
+    # One row per lending; MediaItem.lent_to/lent_at mirror the open loan of an item
+    id = db.Column(db.Integer, primary_key=True)
+    media_item_id = db.Column(db.Integer, db.ForeignKey('media_item.id'), nullable=False, index=True)
+    borrower_id = db.Column(db.Integer, db.ForeignKey('borrower.id'), nullable=False, index=True)
+    lent_at = db.Column(db.DateTime, nullable=False)
+    returned_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        # Open loans only: at most one per item, and the "who has what" lookups
+        db.Index('uq_loan_open_item', 'media_item_id', unique=True, sqlite_where=db.text('returned_at IS NULL')),
+        db.Index('ix_loan_open_borrower', 'borrower_id', sqlite_where=db.text('returned_at IS NULL')),
+    )
+
+# -- STOCKTAKE (see stocktake.py) --
+
+class Stocktake(db.Model):
+    # Inventory audit of a location subtree; scans are collected until the session is closed
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open / closed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_at = db.Column(db.DateTime, nullable=True)
+    location = db.relationship('Location')
+    scans = db.relationship('StocktakeScan', backref='stocktake', cascade="all, delete-orphan", lazy='dynamic')
+
+class StocktakeScan(db.Model):
+    # One row per scanned code and session; scanning again updates location and time
+    __table_args__ = (db.UniqueConstraint('stocktake_id', 'code', name='uq_stocktake_scan_code'),)
+    id = db.Column(db.Integer, primary_key=True)
+    stocktake_id = db.Column(db.Integer, db.ForeignKey('stocktake.id'), nullable=False)
+    code = db.Column(db.String(50), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)  # Where it was found (None = anywhere in the subtree)
+    scanned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# -- CHANGE TRACKING (see changes.py) --
+
+class ChangeSequence(db.Model):
+    # Single row (id=1) holding the last row_version handed out
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    pruned = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Newest tombstone removed
+
+class ChangeTombstone(db.Model):
+    # One row per deleted MediaItem/Track/Location, so clients can drop their copy
+    id = db.Column(db.Integer, primary_key=True)
+    row_version = db.Column(db.Integer, nullable=False, index=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SchemaVersion(db.Model):
+    # One row per applied migration (see migrations.py); the highest version is the schema state
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# -- QUERY HELPERS --
+
+DUPLICATE_CHECK_MAX = 1000  # Codes per batch duplicate check
+
+def find_barcode_duplicates(codes):
+    """
+    Existing items per scanned code, matched on the normalized key with one indexed query.
+    Returns {code: [MediaItem, ...]} for the codes that already exist.
+    """
+    keys = {}
+    for code in codes:
+        key = normalize_barcode(code)
+        if key: keys.setdefault(key, []).append(code)
+    if not keys:
+        return {}
+
+    found = {}
+    for item in MediaItem.query.filter(MediaItem.barcode_key.in_(list(keys))).order_by(MediaItem.id):
+        for code in keys[item.barcode_key]:
+            found.setdefault(code, []).append(item)
+    return found
+
+MEDIA_FILTER_KEYS = ['q', 'category', 'location', 'lent']
+
+def media_filter_query(filters):
+    """
+    MediaItem query for the dashboard filter state (dict with q, category, location, lent).
+    Shared by the dashboard, background exports and bulk actions on "all matching" items.
+    """
+    query = MediaItem.query
+    q_str = filters.get('q') or ''
+    cat = filters.get('category') or ''
+    loc = filters.get('location') or ''
+    lent = filters.get('lent') or ''
+
+    if q_str:
+        s = f"%{q_str}%"
+        query = query.filter(db.or_(
+            MediaItem.title.ilike(s),
+            MediaItem.author_artist.ilike(s),
+            MediaItem.inventory_number.ilike(s),
+            MediaItem.barcode.ilike(s),
+            MediaItem.lent_to.ilike(s), # Also search for borrower!
+            MediaItem.tracks.any(Track.title.ilike(s)) # Search in tracks
+        ))
+    
+    if cat: 
+        query = query.filter(MediaItem.category == cat)
+    
+    if loc: 
+        query = query.filter(MediaItem.location_id == int(loc))
+
+    # Rental status filter
+    if lent == 'yes':
+        query = query.filter(MediaItem.lent_to != None)
+    elif lent == 'no':
+        query = query.filter(MediaItem.lent_to == None)
+
+    return query
+
+def apply_media_sort(query, sort_field, sort_order):
+    """Flexible sorting with cascading secondary sorts (e.g. author -> title -> year)."""
+    if sort_field == 'title':
+        primary_sort = MediaItem.title
+        secondary_sorts = [MediaItem.author_artist.asc()] 
+    elif sort_field == 'author':
+        primary_sort = MediaItem.author_artist
+        secondary_sorts = [MediaItem.title.asc(), MediaItem.release_year.desc()]
+    elif sort_field == 'year':
+        primary_sort = MediaItem.release_year
+        secondary_sorts = [MediaItem.author_artist.asc(), MediaItem.title.asc()]
+    else: # 'added' oder Fallback
+        primary_sort = MediaItem.id
+        secondary_sorts = []
+
+    # Apply direction
+    if sort_order == 'asc':
+        return query.order_by(primary_sort.asc(), *secondary_sorts)
+    return query.order_by(primary_sort.desc(), *secondary_sorts)
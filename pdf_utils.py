@@ -0,0 +1,400 @@
+import zlib
+import unicodedata
+
+# Minimal streaming PDF writer (PDF 1.4, standard Type1 fonts, no dependencies).
+# All public coordinates are in millimetres, origin top-left (like the CSS of the HTML views).
+
+PT_PER_MM = 72 / 25.4
+
+PAGE_SIZES = {
+    'a4': (210.0, 297.0),
+    'letter': (215.9, 279.4)
+}
+
+# Glyph widths for ASCII 32..126 in 1/1000 em (from the standard AFM metrics)
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+]
+_HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584
+]
+
+# Style -> (resource name, BaseFont, widths); Courier is monospaced (600)
+FONTS = {
+    'regular': ('F1', 'Helvetica', _HELVETICA_WIDTHS),
+    'bold': ('F2', 'Helvetica-Bold', _HELVETICA_BOLD_WIDTHS),
+    'italic': ('F3', 'Helvetica-Oblique', _HELVETICA_WIDTHS),
+    'mono': ('F4', 'Courier', None)
+}
+
+def _char_width(ch, widths):
+    if widths is None:
+        return 600
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return widths[code - 32]
+    # Accented latin characters: use the width of the base letter (ä -> a)
+    base = unicodedata.normalize('NFD', ch)[0]
+    if 32 <= ord(base) <= 126:
+        return widths[ord(base) - 32]
+    return 556
+
+def text_width(text, font, size):
+    """Width of text in mm for the given font style and size (pt)."""
+    widths = FONTS[font][2]
+    return sum(_char_width(ch, widths) for ch in text) * size / 1000 / PT_PER_MM
+
+def wrap_text(text, font, size, max_width, max_lines=None):
+    """
+    Word-wraps text to max_width (mm). Words longer than a line are broken hard.
+    If max_lines is exceeded, the last line is shortened and ends with '...'.
+    """
+    lines = []
+    current = ''
+    for word in str(text).split():
+        candidate = f"{current} {word}" if current else word
+        if text_width(candidate, font, size) <= max_width:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        # Hard break for single words that do not fit
+        while text_width(word, font, size) > max_width and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and text_width(word[:cut], font, size) > max_width:
+                cut -= 1
+            lines.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        lines.append(current)
+
+    if max_lines is not None and len(lines) > max_lines:
+        lines = lines[:max_lines]
+        last = lines[-1]
+        while last and text_width(last + '...', font, size) > max_width:
+            last = last[:-1]
+        lines[-1] = last.rstrip() + '...'
+    return lines
+
+def _pdf_string(text):
+    raw = str(text).encode('cp1252', errors='replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def _num(value):
+    return f"{value:.3f}".rstrip('0').rstrip('.') or '0'
+
+class PdfCanvas:
+    """Collects the drawing operations of a single page."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.ops = []
+
+    def _x(self, x):
+        return _num(x * PT_PER_MM)
+
+    def _y(self, y):
+        return _num((self.height - y) * PT_PER_MM)
+
+    def text(self, x, y, text, font='regular', size=10, align='left'):
+        """Draws a single line. y is the baseline."""
+        if align == 'center':
+            x -= text_width(text, font, size) / 2
+        elif align == 'right':
+            x -= text_width(text, font, size)
+        self.ops.append(b'BT /' + FONTS[font][0].encode() + f" {_num(size)} Tf {self._x(x)} {self._y(y)} Td ".encode()
+                        + _pdf_string(text) + b' Tj ET')
+
+    def line(self, x1, y1, x2, y2, width=0.2, gray=0):
+        self.ops.append(f"q {_num(gray)} G {_num(width * PT_PER_MM)} w {self._x(x1)} {self._y(y1)} m "
+                        f"{self._x(x2)} {self._y(y2)} l S Q".encode())
+
+    def rect(self, x, y, w, h, stroke_width=0.2, gray=0):
+        self.ops.append(f"q {_num(gray)} G {_num(stroke_width * PT_PER_MM)} w {self._x(x)} {self._y(y + h)} "
+                        f"{_num(w * PT_PER_MM)} {_num(h * PT_PER_MM)} re S Q".encode())
+
+    def qr(self, x, y, size, matrix):
+        """
+        Draws a QR matrix as vector rectangles into a size x size mm square.
+        Runs of dark modules are merged; the coordinate system is scaled to module units.
+        """
+        modules = len(matrix)
+        scale = size / modules * PT_PER_MM
+        ops = [f"q {_num(scale)} 0 0 {_num(-scale)} {self._x(x)} {self._y(y)} cm".encode()]
+        for row_idx, row in enumerate(matrix):
+            col = 0
+            while col < modules:
+                if row[col]:
+                    start = col
+                    while col < modules and row[col]:
+                        col += 1
+                    ops.append(f"{start} {row_idx} {col - start} 1 re".encode())
+                else:
+                    col += 1
+        ops.append(b'f Q')
+        self.ops.append(b'\n'.join(ops))
+
+    def content(self):
+        return b'\n'.join(self.ops)
+
+class PdfStreamWriter:
+    """
+    Writes a PDF object by object. Every method returns the bytes to send, so the document
+    can be streamed page by page. Only the byte offsets of the objects are kept in memory.
+    """
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    RESOURCES_ID = 3
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4 + len(FONTS)
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.position
+        return self._emit(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _new_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def begin(self):
+        out = [self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")]
+        font_refs = []
+        for idx, (name, base_font, _) in enumerate(FONTS.values()):
+            font_id = 4 + idx
+            out.append(self._object(font_id, f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
+                                             f"/Encoding /WinAnsiEncoding >>".encode()))
+            font_refs.append(f"/{name} {font_id} 0 R")
+        out.append(self._object(self.RESOURCES_ID, f"<< /Font << {' '.join(font_refs)} >> >>".encode()))
+        return b''.join(out)
+
+    def page(self, canvas):
+        stream = zlib.compress(canvas.content())
+        content_id = self._new_id()
+        page_id = self._new_id()
+        self.page_ids.append(page_id)
+        out = self._object(content_id, f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode()
+                           + stream + b"\nendstream")
+        out += self._object(page_id, f"<< /Type /Page /Parent {self.PAGES_ID} 0 R /Resources {self.RESOURCES_ID} 0 R "
+                                     f"/MediaBox [0 0 {_num(canvas.width * PT_PER_MM)} {_num(canvas.height * PT_PER_MM)}] "
+                                     f"/Contents {content_id} 0 R >>".encode())
+        return out
+
+    def end(self):
+        kids = ' '.join(f"{pid} 0 R" for pid in self.page_ids)
+        out = self._object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        out += self._object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode())
+
+        xref_pos = self.position
+        size = self.next_id
+        xref = [f"xref\n0 {size}\n0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            xref.append(f"{self.offsets.get(obj_id, 0):010d} 00000 n \n")
+        xref.append(f"trailer\n<< /Size {size} /Root {self.CATALOG_ID} 0 R >>\nstartxref\n{xref_pos}\n%%EOF\n")
+        return out + self._emit(''.join(xref).encode())
+
+# -- LABELS --
+
+LINE_HEIGHT = 1.2
+PT_TO_MM = 1 / PT_PER_MM
+
+def _label_blocks(item, config, owner):
+    """Text blocks of one label in drawing order: (text, font, size_factor, separator_above)"""
+    blocks = []
+    if config['show_title']:
+        blocks.append((item.title or '', 'bold', 1.0, False))
+    if config['show_artist'] and item.author_artist:
+        blocks.append((item.author_artist, 'italic', 0.9, False))
+    if config['show_id']:
+        blocks.append((item.inventory_number, 'mono', 0.85, False))
+    owner_lines = []
+    if config['show_owner'] and owner.get('name'): owner_lines.append(owner['name'])
+    if config['show_address'] and owner.get('address'): owner_lines.append(owner['address'])
+    if config['show_phone'] and owner.get('phone'): owner_lines.append(owner['phone'])
+    for idx, line in enumerate(owner_lines):
+        blocks.append((line, 'regular', 0.75, idx == 0))
+    return blocks
+
+def _draw_label(canvas, x, y, item, config, owner, qr_matrix):
+    pad = config['padding']
+    inner_w = config['width'] - 2 * pad
+    inner_h = config['height'] - 2 * pad
+    vertical = config['vertical_layout']
+    qr_size = config['qr_size'] if config['show_qr'] else 0
+    gap = 3 if qr_size else 0
+
+    # 1. Available text box
+    if vertical:
+        text_w, text_h = inner_w, inner_h - qr_size - gap
+    else:
+        text_w, text_h = inner_w - qr_size - gap, inner_h
+
+    # 2. Lay out the lines (wrapping), drop what does not fit vertically
+    lines = []
+    used_h = 0
+    for text, font, factor, separator in _label_blocks(item, config, owner):
+        size = config['font_size'] * factor
+        line_h = size * LINE_HEIGHT * PT_TO_MM
+        for line in wrap_text(text, font, size, max(text_w, 1)):
+            extra = 1 if separator else 0
+            if used_h + line_h + extra > text_h:
+                break
+            lines.append((line, font, size, line_h, separator))
+            used_h += line_h + extra
+            separator = False
+
+    # 3. Draw (QR and text block are centred like the flexbox of the HTML view)
+    if vertical:
+        block_h = qr_size + (gap + used_h if lines else 0)
+        cur_y = y + pad + (inner_h - block_h) / 2
+        if qr_size:
+            canvas.qr(x + pad + (inner_w - qr_size) / 2, cur_y, qr_size, qr_matrix)
+            cur_y += qr_size + gap
+        text_x, align = x + pad + inner_w / 2, 'center'
+    else:
+        if qr_size:
+            canvas.qr(x + pad, y + pad + (inner_h - qr_size) / 2, qr_size, qr_matrix)
+        cur_y = y + pad + (inner_h - used_h) / 2
+        text_x, align = x + pad + qr_size + gap, 'left'
+
+    for line, font, size, line_h, separator in lines:
+        if separator:
+            left = x + pad + (0 if vertical else qr_size + gap)
+            canvas.line(left, cur_y + 0.5, left + text_w, cur_y + 0.5, width=0.1, gray=0.85)
+            cur_y += 1
+        # Baseline at ~80% of the line box
+        canvas.text(text_x, cur_y + line_h * 0.8, line, font=font, size=size, align=align)
+        cur_y += line_h
+
+def render_labels_pdf(items, config, owner, qr_matrix_func, page_size='a4'):
+    """
+    Generator: yields the PDF for a label run page by page.
+    items may contain None for skipped positions (start_at). page_size 'label' creates
+    one page per label (roll printers), otherwise labels are placed on a grid.
+    """
+    writer = PdfStreamWriter()
+    yield writer.begin()
+
+    if page_size == 'label':
+        page_w = config['width'] + config['margin_left']
+        page_h = config['height'] + config['margin_top']
+        columns, rows = 1, 1
+    else:
+        page_w, page_h = PAGE_SIZES.get(page_size, PAGE_SIZES['a4'])
+        columns = max(config['columns'], 1)
+        rows = max(int((page_h - config['margin_top']) // config['height']), 1)
+    per_page = columns * rows
+
+    canvas = None
+    slot = 0
+    for item in items:
+        if slot % per_page == 0:
+            if canvas is not None:
+                yield writer.page(canvas)
+            canvas = PdfCanvas(page_w, page_h)
+        pos = slot % per_page
+        slot += 1
+        if item is None:
+            continue
+        x = config['margin_left'] + (pos % columns) * config['width']
+        y = config['margin_top'] + (pos // columns) * config['height']
+        matrix = qr_matrix_func(item.inventory_number) if config['show_qr'] else None
+        _draw_label(canvas, x, y, item, config, owner, matrix)
+
+    yield writer.page(canvas or PdfCanvas(page_w, page_h))
+    yield writer.end()
+
+# -- LENDING LIST --
+
+def render_lent_pdf(items, labels, person=None, generated_on=''):
+    """
+    Generator: yields an A4 lending list (same content as lent_export.html) page by page.
+    labels: dict with the translated texts (title, header names, signatures).
+    """
+    page_w, page_h = PAGE_SIZES['a4']
+    margin = 15
+    table_w = page_w - 2 * margin
+    size = 9
+    line_h = size * LINE_HEIGHT * PT_TO_MM
+    cell_pad = 1.5
+
+    columns = [('title', 0.34), ('author_artist', 0.24), ('format', 0.16)]
+    if not person:
+        columns.append(('lent_to', 0.14))
+    columns.append(('lent_at_date', 0.12))
+    total = sum(w for _, w in columns)
+    columns = [(key, table_w * w / total) for key, w in columns]
+
+    writer = PdfStreamWriter()
+    yield writer.begin()
+
+    def new_page(first):
+        canvas = PdfCanvas(page_w, page_h)
+        y = margin
+        if first:
+            canvas.text(margin, y + 7, labels['lent_list'], font='bold', size=18)
+            canvas.line(margin, y + 10, page_w - margin, y + 10, width=0.5)
+            y += 17
+            canvas.text(margin, y, f"{labels['generated_on']}: {generated_on}", size=9)
+            y += 5
+            if person:
+                canvas.text(margin, y, f"{labels['borrower']}: {person}", size=9)
+                y += 5
+            y += 4
+        # Table header
+        x = margin
+        header_h = line_h + 2 * cell_pad
+        for key, width in columns:
+            canvas.rect(x, y, width, header_h, gray=0.8)
+            canvas.text(x + cell_pad, y + cell_pad + line_h * 0.8, labels[key], font='bold', size=size)
+            x += width
+        return canvas, y + header_h
+
+    canvas, y = new_page(True)
+    for row in items:
+        cells = [wrap_text(row.get(key) or '-', 'regular', size, width - 2 * cell_pad, max_lines=3)
+                 for key, width in columns]
+        row_h = max(len(c) for c in cells) * line_h + 2 * cell_pad
+        if y + row_h > page_h - margin:
+            yield writer.page(canvas)
+            canvas, y = new_page(False)
+        x = margin
+        for (key, width), lines in zip(columns, cells):
+            canvas.rect(x, y, width, row_h, gray=0.8)
+            for idx, line in enumerate(lines):
+                canvas.text(x + cell_pad, y + cell_pad + line_h * idx + line_h * 0.8, line, size=size)
+            x += width
+        y += row_h
+
+    # Signature lines
+    if y + 30 > page_h - margin:
+        yield writer.page(canvas)
+        canvas, y = new_page(False)
+    sig_y = y + 25
+    sig_w = table_w * 0.4
+    for sig_x, key in ((margin, 'signature_lender'), (page_w - margin - sig_w, 'signature_borrower')):
+        canvas.line(sig_x, sig_y, sig_x + sig_w, sig_y, width=0.3)
+        canvas.text(sig_x, sig_y + 4, labels[key], size=8)
+
+    yield writer.page(canvas)
+    yield writer.end()
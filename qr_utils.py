@@ -0,0 +1,182 @@
+import os
+import io
+import hashlib
+import itertools
+import tempfile
+from functools import lru_cache
+import qrcode
+from flask import current_app
+
+# Bump this when the rendering below changes, so cached files and browser ETags are invalidated
+QR_RENDER_VERSION = '1'
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+QR_MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+def qr_matrix(data):
+    """Returns the QR module matrix (including the quiet zone) as a tuple of bool tuples."""
+    qr = qrcode.QRCode(box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+def qr_etag(data, fmt):
+    """Stable ETag: inventory numbers never change, so the image for a value never changes either."""
+    return hashlib.sha1(f"{QR_RENDER_VERSION}:{fmt}:{data}".encode('utf-8')).hexdigest()
+
+def _render_png(data):
+    qr = qrcode.QRCode(box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    fp = io.BytesIO()
+    img.save(fp, 'PNG')
+    return fp.getvalue()
+
+def _render_svg(data):
+    """
+    Compact SVG: one path, consecutive dark modules of a row are merged into a single rectangle.
+    The viewBox is in module units, so the image scales to any size without loss.
+    """
+    matrix = qr_matrix(data)
+    size = len(matrix)
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                parts.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/>'
+            f'<path d="{"".join(parts)}" fill="#000"/></svg>').encode('utf-8')
+
+def _render_matrix(data):
+    """qr_matrix() as bytes for the caches: one line of 0/1 per row."""
+    return '\n'.join(''.join('1' if module else '0' for module in row) for row in qr_matrix(data)).encode('ascii')
+
+def _parse_matrix(content):
+    return tuple(tuple(c == '1' for c in line) for line in content.decode('ascii').split('\n'))
+
+_RENDERERS = {
+    'png': _render_png,
+    'svg': _render_svg,
+    'matrix': _render_matrix
+}
+
+def _cache_dir():
+    return os.path.join(current_app.instance_path, 'qrcache')
+
+def _read_disk_cache(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_disk_cache(path, content):
+    # Write to a temp file first and rename, so concurrent workers never read half-written files
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"QR Cache Error: {e}")
+
+@lru_cache(maxsize=2048)
+def _get_qr_code(cache_dir, data, fmt):
+    # 1. Disk cache (shared between worker processes and restarts)
+    path = os.path.join(cache_dir, f"{qr_etag(data, fmt)}.{fmt}")
+    content = _read_disk_cache(path)
+    if content is not None:
+        return content
+
+    # 2. Render and persist
+    content = _RENDERERS[fmt](data)
+    _write_disk_cache(path, content)
+    return content
+
+def get_qr_code(data, fmt='png'):
+    """
+    Returns the rendered QR code for data as bytes (fmt: 'png' or 'svg').
+    Lookup order: in-process LRU cache -> instance/qrcache -> render.
+    """
+    if fmt not in _RENDERERS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    return _get_qr_code(_cache_dir(), data, fmt)
+
+# Batches with more uncached codes than this are rendered on a process pool
+QR_POOL_THRESHOLD = 1000
+QR_POOL_CHUNKSIZE = 64
+
+def _render_batch(render, values):
+    workers = min(os.cpu_count() or 1, 4)
+    if len(values) < QR_POOL_THRESHOLD or workers < 2:
+        return [render(v) for v in values]
+
+    # Spawn instead of fork: the web worker may hold threads/locks (DB, sessions)
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(render, values, chunksize=QR_POOL_CHUNKSIZE))
+
+def _get_qr_batch(values, fmt):
+    """
+    Rendered codes for many values as a dict value -> bytes. Cached codes are reused, the
+    rest is rendered in one go (on a process pool for large runs) and written to the disk cache.
+    """
+    cache_dir = _cache_dir()
+    result = {}
+    missing = []
+    for value in dict.fromkeys(values):
+        path = os.path.join(cache_dir, f"{qr_etag(value, fmt)}.{fmt}")
+        if os.path.exists(path):
+            result[value] = _get_qr_code(cache_dir, value, fmt)
+        else:
+            missing.append(value)
+
+    for value, content in zip(missing, _render_batch(_RENDERERS[fmt], missing)):
+        _write_disk_cache(os.path.join(cache_dir, f"{qr_etag(value, fmt)}.{fmt}"), content)
+        result[value] = content
+    return result
+
+def get_qr_svgs(values):
+    """
+    Batch version of get_qr_code(..., 'svg') for label sheets.
+    Returns a dict value -> SVG markup (str).
+    """
+    return {value: content.decode('utf-8') for value, content in _get_qr_batch(values, 'svg').items()}
+
+# Labels of a streamed PDF run whose QR matrices are fetched per batch
+QR_MATRIX_CHUNK = 2000
+
+def with_qr_matrices(items, chunk_size=QR_MATRIX_CHUNK):
+    """
+    For streamed label runs: returns (items, lookup). The items (None allowed) are passed
+    through; before each chunk of them is handed out, the QR matrices of its inventory
+    numbers are fetched in one batch like get_qr_svgs(). lookup(value) returns the matrix
+    of a value of the current chunk.
+    """
+    matrices = {}
+
+    def chunks():
+        iterator = iter(items)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            matrices.clear()
+            matrices.update(_get_qr_batch([item.inventory_number for item in chunk if item is not None], 'matrix'))
+            yield from chunk
+
+    return chunks(), lambda value: _parse_matrix(matrices[value])
@@ -0,0 +1,418 @@
+import os
+import json
+import gzip
+import time
+import fcntl
+import shutil
+import struct
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from backup_utils import database_path, check_database_file, restore_database_file, BACKUP_CHUNK_SIZE
+
+# Continuous WAL shipping (same idea as Litestream). A replicator thread copies every
+# committed WAL frame to REPLICA_DIR shortly after the commit; together with a periodic
+# snapshot this rebuilds the database as of any moment since the oldest snapshot.
+#
+#   REPLICA_DIR/generations/<time>/snapshot.sqlite.gz   consistent copy, start of the generation
+#   REPLICA_DIR/generations/<time>/wal/<seq>_<time>.wal.gz  frames committed after it
+#   REPLICA_DIR/state.json                               where the copying stands
+#
+# No frame may disappear before it is copied. SQLite only rewrites the WAL from the start
+# after a checkpoint has copied all of it into the database, so while replication is on
+# the app connections do not checkpoint (wal_autocheckpoint=0, see app.py) and the
+# replicator checkpoints itself, right after copying and while holding the write lock.
+# Anything unexpected (WAL restarted by someone else, database replaced) starts a new
+# generation with a fresh snapshot.
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+CHECKPOINT_FRAMES = 1000   # Checkpoint once the WAL holds this many frames (SQLite default)
+LOCK_RETRY = 10            # Seconds between attempts of the other workers to take over
+
+def _timestamp(moment):
+    return moment.strftime('%Y%m%d%H%M%S')
+
+def _parse_timestamp(value):
+    return datetime.strptime(value, '%Y%m%d%H%M%S')
+
+def _write_gzip(source, target):
+    tmp_path = target + '.tmp'
+    with open(source, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=1) as dest:
+        shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)
+    os.replace(tmp_path, target)
+
+def scan_frames(header, data):
+    """
+    Length of the committed frames at the start of `data` (WAL bytes after the header):
+    frames must carry the salts of the header, and only whole transactions count.
+    """
+    page_size = struct.unpack('>I', header[8:12])[0]
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    position = committed = 0
+    while position + frame_size <= len(data):
+        commit_size = struct.unpack('>I', data[position + 4:position + 8])[0]
+        if data[position + 8:position + 16] != header[16:24]:
+            break  # Left over from before the last WAL restart
+        position += frame_size
+        if commit_size:
+            committed = position
+    return committed
+
+class WalReplicator:
+    """Copies the WAL of the live database to the replica folder (one instance per replica)."""
+
+    def __init__(self, db_path, replica_dir, snapshot_interval, retention):
+        self.db_path = db_path
+        self.wal_path = db_path + '-wal'
+        self.replica_dir = replica_dir
+        self.snapshot_interval = snapshot_interval
+        self.retention = retention
+        self.state = None
+        self._wal_stat = None
+        self._writer = self._checkpointer = None
+
+    # -- connections --
+
+    def _connect(self):
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.execute("PRAGMA wal_autocheckpoint=0")
+        return con
+
+    def _open(self):
+        self.close()
+        self._writer, self._checkpointer = self._connect(), self._connect()
+        mode = self._writer.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode != 'wal':
+            raise Exception(f"Replication needs journal_mode=WAL (database uses {mode})")
+
+    def close(self):
+        for con in (self._writer, self._checkpointer):
+            if con is not None:
+                con.close()
+        self._writer = self._checkpointer = None
+
+    # -- state --
+
+    def _state_path(self):
+        return os.path.join(self.replica_dir, 'state.json')
+
+    def _save_state(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.replica_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self._state_path())
+
+    def _load_state(self):
+        try:
+            with open(self._state_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('inode') != os.stat(self.db_path).st_ino:
+            return None  # Database file was replaced
+        if not os.path.isdir(os.path.join(self.replica_dir, 'generations', state.get('generation', ''))):
+            return None
+        return state
+
+    def _read_wal(self):
+        try:
+            with open(self.wal_path, 'rb') as f:
+                header = f.read(WAL_HEADER_SIZE)
+                if len(header) < WAL_HEADER_SIZE:
+                    return None, b''
+                f.seek(self.state['offset'] if header[16:24].hex() == self.state['salts'] else WAL_HEADER_SIZE)
+                return header, f.read()
+        except FileNotFoundError:
+            return None, b''
+
+    # -- generations --
+
+    def _generation_dir(self, generation):
+        return os.path.join(self.replica_dir, 'generations', generation)
+
+    def new_generation(self):
+        """Snapshot of the live database; the WAL position it corresponds to is pinned exactly."""
+        if self._writer is None:
+            self._open()
+        generation = _timestamp(datetime.now())
+        folder = self._generation_dir(generation)
+        os.makedirs(os.path.join(folder, 'wal'), exist_ok=True)
+
+        reader = self._connect()
+        try:
+            # Under the write lock the WAL holds only committed frames, and the read
+            # transaction started here sees exactly those
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                header, data = None, b''
+                if os.path.exists(self.wal_path):
+                    with open(self.wal_path, 'rb') as f:
+                        header = f.read(WAL_HEADER_SIZE)
+                        data = f.read()
+                reader.execute("BEGIN")
+                reader.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            finally:
+                self._writer.execute("ROLLBACK")
+
+            # The open read transaction also keeps the WAL from being rewritten meanwhile
+            raw_path = os.path.join(folder, 'snapshot.sqlite')
+            target = sqlite3.connect(raw_path)
+            try:
+                reader.backup(target, pages=-1)
+            finally:
+                target.close()
+            reader.execute("COMMIT")
+        finally:
+            reader.close()
+        _write_gzip(raw_path, os.path.join(folder, 'snapshot.sqlite.gz'))
+        os.remove(raw_path)
+
+        valid = header is not None and len(header) == WAL_HEADER_SIZE
+        self.state = {
+            'generation': generation,
+            'inode': os.stat(self.db_path).st_ino,
+            'salts': header[16:24].hex() if valid else None,
+            'offset': WAL_HEADER_SIZE + (scan_frames(header, data) if valid else 0),
+            'seq': 0,
+            'complete': False  # Set when our own checkpoint has moved the whole WAL into the database
+        }
+        self._save_state()
+        current_app.logger.info("Replication: new generation %s", generation)
+        self.prune()
+        return generation
+
+    def prune(self):
+        """Drops generations that are no longer needed to reach back `retention`."""
+        generations = list_generations(self.replica_dir)
+        limit = datetime.now() - self.retention
+        for generation, following in zip(generations, generations[1:]):
+            if _parse_timestamp(following) < limit:
+                shutil.rmtree(self._generation_dir(generation), ignore_errors=True)
+
+    # -- shipping --
+
+    def start(self):
+        self._open()
+        self.state = self._load_state()
+        if self.state is None:
+            self.new_generation()
+
+    def sync(self):
+        """Copies the frames committed since the last call. Returns the number of bytes shipped."""
+        try:
+            stat = os.stat(self.wal_path)
+            wal_stat = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        except FileNotFoundError:
+            wal_stat = None
+        generation_age = datetime.now() - _parse_timestamp(self.state['generation'])
+        if os.stat(self.db_path).st_ino != self.state['inode'] or generation_age >= self.snapshot_interval:
+            self._open()
+            self.new_generation()
+            self._wal_stat = None
+            return 0
+        if wal_stat == self._wal_stat:
+            return 0  # Nothing written since the last look
+
+        # Only the reading runs under the write lock (no commit can be half-written meanwhile);
+        # compressing and writing to the replica folder, maybe a slow mount, runs without it
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            header, data = self._read_wal()
+        finally:
+            self._writer.execute("ROLLBACK")
+        salts = header[16:24].hex() if header is not None else None
+        if salts != self.state['salts']:
+            if self.state['salts'] is not None and not self.state['complete']:
+                # Restarted or removed by someone else: frames may be gone, start over
+                self.new_generation()
+                self._wal_stat = None
+                return 0
+            self.state.update(salts=salts, offset=WAL_HEADER_SIZE)
+        shipped = data[:scan_frames(header, data)] if header is not None else b''
+        del data
+
+        # Frames stay in the WAL until our own checkpoint, so they can be copied unlocked
+        if shipped:
+            self.state['seq'] += 1
+            name = f"{self.state['seq']:08d}_{_timestamp(datetime.now())}.wal.gz"
+            path = os.path.join(self._generation_dir(self.state['generation']), 'wal', name)
+            with gzip.open(path + '.tmp', 'wb', compresslevel=1) as f:
+                f.write(header[8:12] + shipped)  # Page size, then the frames
+            os.replace(path + '.tmp', path)
+            self.state['offset'] += len(shipped)
+            self.state['complete'] = False
+
+        frames = (self.state['offset'] - WAL_HEADER_SIZE) // (WAL_FRAME_HEADER_SIZE + struct.unpack('>I', header[8:12])[0]) \
+            if header is not None else 0
+        if frames >= CHECKPOINT_FRAMES:
+            self._checkpoint(header, frames)
+
+        self._save_state()
+        self._wal_stat = wal_stat
+        return len(shipped)
+
+    def _checkpoint(self, header, frames):
+        """
+        Checkpoints under the write lock, but only if the WAL still holds exactly the
+        copied frames; otherwise the next sync copies the new ones and tries again.
+        """
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            with open(self.wal_path, 'rb') as f:
+                if f.read(WAL_HEADER_SIZE) != header:
+                    return
+                f.seek(self.state['offset'])
+                frame_header = f.read(WAL_FRAME_HEADER_SIZE)
+            if len(frame_header) == WAL_FRAME_HEADER_SIZE and frame_header[8:16] == header[16:24]:
+                return  # Frames written after the copy
+            busy, log, done = self._checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            self.state['complete'] = busy == 0 and log == done == frames
+        finally:
+            self._writer.execute("ROLLBACK")
+
+def list_generations(replica_dir):
+    folder = os.path.join(replica_dir, 'generations')
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder)
+                  if os.path.exists(os.path.join(folder, name, 'snapshot.sqlite.gz')))
+
+def _segments(replica_dir, generation):
+    folder = os.path.join(replica_dir, 'generations', generation, 'wal')
+    names = sorted(name for name in os.listdir(folder) if name.endswith('.wal.gz'))
+    return [(os.path.join(folder, name), _parse_timestamp(name.split('_')[1][:14])) for name in names]
+
+def restore_replica(replica_dir, output_path, moment=None):
+    """
+    Rebuilds the database as of `moment` (default: latest) into output_path: snapshot
+    of the newest generation started before it, plus its WAL frames up to that time.
+    Returns the time of the last change applied.
+    """
+    generations = list_generations(replica_dir)
+    if moment is not None:
+        generations = [g for g in generations if _parse_timestamp(g) <= moment]
+    if not generations:
+        raise Exception("No replica generation covers this point in time.")
+    generation = generations[-1]
+    folder = os.path.join(replica_dir, 'generations', generation)
+
+    with gzip.open(os.path.join(folder, 'snapshot.sqlite.gz'), 'rb') as src, open(output_path, 'wb') as dest:
+        shutil.copyfileobj(src, dest, BACKUP_CHUNK_SIZE)
+
+    restored_to = _parse_timestamp(generation)
+    with open(output_path, 'r+b') as db_file:
+        for path, shipped_at in _segments(replica_dir, generation):
+            if moment is not None and shipped_at > moment:
+                break
+            with gzip.open(path, 'rb') as f:
+                data = f.read()
+            page_size = struct.unpack('>I', data[:4])[0]
+            frame_size = WAL_FRAME_HEADER_SIZE + page_size
+            # Replay like SQLite's WAL recovery: pages of a transaction, then its database size
+            for position in range(4, len(data), frame_size):
+                page_number, commit_size = struct.unpack('>II', data[position:position + 8])
+                db_file.seek((page_number - 1) * page_size)
+                db_file.write(data[position + WAL_FRAME_HEADER_SIZE:position + frame_size])
+                if commit_size:
+                    db_file.truncate(commit_size * page_size)
+            restored_to = shipped_at
+
+    check_database_file(output_path)
+    return restored_to
+
+# -- IN-PROCESS REPLICATOR --
+
+def start_replicator(app):
+    """
+    Starts the replication thread of this process (no-op without REPLICA_DIR). Every
+    worker starts one; the lock file lets exactly one of them ship, the others wait to
+    take over if that worker goes away.
+    """
+    replica_dir = app.config['REPLICA_DIR']
+    if not replica_dir:
+        return None
+    os.makedirs(replica_dir, exist_ok=True)
+    with app.app_context():
+        db_path = database_path()
+    replicator = WalReplicator(db_path, replica_dir,
+                               timedelta(hours=app.config['REPLICA_SNAPSHOT_HOURS']),
+                               timedelta(days=app.config['REPLICA_RETENTION_DAYS']))
+
+    def loop():
+        with app.app_context(), open(os.path.join(replica_dir, '.lock'), 'w') as lock:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    time.sleep(LOCK_RETRY)
+            run_replicator(replicator, app.config['REPLICA_INTERVAL'])
+
+    thread = threading.Thread(target=loop, name='wal-replicator', daemon=True)
+    thread.start()
+    return thread
+
+def run_replicator(replicator, interval):
+    while True:
+        try:
+            replicator.start()
+            while True:
+                replicator.sync()
+                time.sleep(interval)
+        except Exception:
+            current_app.logger.exception("Replication failed")
+            replicator.close()
+            time.sleep(LOCK_RETRY)
+
+# -- CLI: flask --app app replica run|status|restore --
+
+replica_cli = AppGroup('replica', help='Continuous WAL replication to REPLICA_DIR.')
+
+def _replica_dir():
+    replica_dir = current_app.config['REPLICA_DIR']
+    if not replica_dir:
+        raise click.ClickException('REPLICA_DIR is not set.')
+    return replica_dir
+
+@replica_cli.command('status')
+def status_command():
+    """Show the generations and the time span they can restore."""
+    replica_dir = _replica_dir()
+    for generation in list_generations(replica_dir):
+        segments = _segments(replica_dir, generation)
+        until = segments[-1][1] if segments else _parse_timestamp(generation)
+        click.echo(f"{generation}: {_parse_timestamp(generation)} .. {until}  ({len(segments)} WAL segments)")
+
+@replica_cli.command('restore')
+@click.option('--to', 'moment', type=click.DateTime(), default=None, help='Point in time (local), default: latest.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Target file (default: next to the database).')
+@click.option('--apply', is_flag=True, help='Swap the rebuilt database in for the live one (stop the app first).')
+def restore_command(moment, output, apply):
+    """Rebuild the database as of a point in time."""
+    replica_dir = _replica_dir()
+    output = output or database_path() + '.replica'
+    restored_to = restore_replica(replica_dir, output, moment)
+    click.echo(f"Rebuilt as of {restored_to}: {output}")
+    if apply:
+        restore_database_file(output)
+        os.remove(output)
+        click.echo('Live database replaced (previous one kept as .bak).')
+
+@replica_cli.command('run')
+def run_command():
+    """Ship the WAL in the foreground (sidecar instead of the in-process thread)."""
+    replica_dir = _replica_dir()
+    config = current_app.config
+    replicator = WalReplicator(database_path(), replica_dir, timedelta(hours=config['REPLICA_SNAPSHOT_HOURS']),
+                               timedelta(days=config['REPLICA_RETENTION_DAYS']))
+    with open(os.path.join(replica_dir, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise click.ClickException('Another replicator is running.')
+        run_replicator(replicator, config['REPLICA_INTERVAL'])
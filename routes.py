@@ -3,22 +3,35 @@ import os
 import requests
 import re
 import io      
-import qrcode
-import base64
-import difflib
 import time
+import itertools
+import tempfile
 from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, send_file, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, send_file, session, Response, stream_with_context, abort
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.utils import secure_filename
-from extensions import db
-from models import User, Role, Location, MediaItem, Collection, Track, AppSetting
-from sqlalchemy import or_
-from backup_utils import create_backup_zip, restore_backup_zip
+from markupsafe import Markup
+from sqlalchemy import insert, select, table, column, func
+from extensions import db, begin_immediate, sqlite_pragma_status
+from models import User, Role, Location, MediaItem, Collection, Track, AppSetting, ApiToken, Stocktake, StocktakeScan, MediaBlockKey, Borrower, Loan, CATEGORIES, MEDIA_FILTER_KEYS, generate_inventory_number, media_filter_query, apply_media_sort, find_barcode_duplicates, DUPLICATE_CHECK_MAX, replace_tracks, format_duration
+from backup_utils import prepare_backup, iter_backup_zip, run_restore_job
+from qr_utils import get_qr_code, get_qr_svgs, qr_etag, with_qr_matrices, QR_MIMETYPES
+from pdf_utils import render_labels_pdf, render_lent_pdf
+from export_utils import ExportContext, EXPORT_COLUMNS, CSV_DELIMITERS, XLSX_MIMETYPE, iter_csv, write_xlsx, iter_file, run_export_job, build_location_paths
+from import_utils import run_import_job
+from stocktake import location_subtree, add_scans, subtree_contains, stocktake_sets, stocktake_counts, correct_misplaced, STOCKTAKE_MAX_BATCH, STOCKTAKE_LIST_LIMIT
+from duplicates import duplicate_candidates, merge_items, MIN_SCORE
+from loans import sync_loans, open_loans_query, current_borrowers, lending_stats, LENDING_HISTORY_LIMIT
+from lookups import LOOKUPS, lookup_client
+from jobs import create_job, start_job, get_job, artifact_path, jobs_folder
+from backup_schedule import backup_overview, run_backup_job
 from translations import TRANSLATIONS
 
 main = Blueprint('main', __name__)
 
+# Excel exports are kept in memory up to this size, larger ones spill to a temp file
+XLSX_SPOOL_SIZE = 8 * 1024 * 1024
+
 # -- HELPER --
 
 def get_config_value(key, default=None):
@@ -28,6 +41,15 @@ def get_config_value(key, default=None):
     except: pass
     return default
 
+def get_config_values(*keys):
+    """Reads several settings with a single query. Missing/empty values map to ''."""
+    values = {key: '' for key in keys}
+    try:
+        for setting in AppSetting.query.filter(AppSetting.key.in_(keys)).all():
+            if setting.value: values[setting.key] = setting.value
+    except: pass
+    return values
+
 def set_config_value(key, value):
     setting = AppSetting.query.filter_by(key=key).first()
     if not setting:
@@ -36,6 +58,37 @@ def set_config_value(key, value):
     setting.value = value
     db.session.commit()
 
+def iter_items_in_order(item_ids, chunk_size=500):
+    """Yields the MediaItems for item_ids in the given order, fetching chunk_size rows per query."""
+    for start in range(0, len(item_ids), chunk_size):
+        chunk = [str(iid) for iid in item_ids[start:start + chunk_size]]
+        items_map = {str(item.id): item for item in MediaItem.query.filter(MediaItem.id.in_(chunk)).all()}
+        for iid in chunk:
+            if iid in items_map: yield items_map[iid]
+
+def form_location_id():
+    """
+    Location posted by the create/edit forms. Without one (or with a deleted one) the item
+    goes to the default location 1 ("Unsortiert"), or to none if that was deleted as well.
+    """
+    for loc_id in (request.form.get('location_id', type=int), 1):
+        if loc_id and db.session.get(Location, loc_id):
+            return loc_id
+    return None
+
+def form_tracks():
+    """Tracklist rows posted by the create/edit forms (track_title/track_position/track_duration lists)."""
+    titles = request.form.getlist('track_title')
+    pos = request.form.getlist('track_position')
+    dur = request.form.getlist('track_duration')
+    tracks = []
+    for i, t in enumerate(titles):
+        if t.strip():
+            try: p = int(pos[i])
+            except: p = i + 1
+            tracks.append({'title': t, 'position': p, 'duration': dur[i] if i < len(dur) else None})
+    return tracks
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -73,46 +126,6 @@ def download_remote_image(url):
         print(f"Download Error: {e}")
     return None
 
-def get_spotify_access_token():
-    client_id = get_config_value('spotify_client_id')
-    client_secret = get_config_value('spotify_client_secret')
-    
-    if not client_id or not client_secret:
-        print(f"DEBUG: Spotify Credentials missing in DB. ID set: {bool(client_id)}, Secret set: {bool(client_secret)}")
-        return None
-
-    # Check if we have a valid token
-    token = get_config_value('spotify_access_token')
-    expiry = get_config_value('spotify_token_expiry')
-    
-    if token and expiry:
-        try:
-            # Check if token is still valid (with 60s buffer)
-            if float(expiry) > time.time():
-                return token
-        except: pass
-    
-    # Request new token
-    try:
-        auth_str = f"{client_id}:{client_secret}"
-        b64_auth = base64.b64encode(auth_str.encode()).decode()
-        headers = {'Authorization': f'Basic {b64_auth}'}
-        data = {'grant_type': 'client_credentials'}
-        
-        res = requests.post('https://accounts.spotify.com/api/token', headers=headers, data=data, timeout=5)
-        if res.status_code == 200:
-            js = res.json()
-            new_token = js.get('access_token')
-            expires_in = js.get('expires_in', 3600)
-            set_config_value('spotify_access_token', new_token)
-            set_config_value('spotify_token_expiry', str(time.time() + expires_in - 60))
-            return new_token
-        else:
-            print(f"DEBUG: Spotify Auth Failed. Status: {res.status_code}, Response: {res.text}")
-    except Exception as e:
-        print(f"Spotify Auth Error: {e}")
-    return None
-
 def create_initial_data():
     if not Role.query.first():
         db.session.add(Role(name='Admin'))
@@ -128,11 +141,6 @@ def create_initial_data():
         db.session.add(Location(name="Unsortiert"))
         db.session.commit()
 
-def generate_inventory_number():
-    year = datetime.now().year
-    unique = str(uuid.uuid4())[:8].upper()
-    return f"INV-{year}-{unique}"
-
 def get_text(key):
     lang = 'en'
     if current_user.is_authenticated and current_user.language:
@@ -143,320 +151,83 @@ def get_text(key):
 def inject_get_text():
     return dict(_=get_text)
 
+async def run_lookup(name, **args):
+    """Runs one of the external lookups (lookups.py) with its settings from the database."""
+    lookup, keys, _ = LOOKUPS[name]
+    settings = {key: get_config_value(key) for key in keys}
+    async with lookup_client() as client:
+        data, updates = await lookup(client, settings, **args)
+    for key, value in updates.items():
+        set_config_value(key, value)
+    return data
+
+# External lookups wait on the network almost all the time: async views here (development
+# server), served directly on the event loop in production (asgi.py).
+
 # -- API: DISCOGS TEXT SEARCH --
 @main.route('/api/search_discogs')
 @login_required
-def api_search_discogs():
+async def api_search_discogs():
     artist = request.args.get('artist', '').strip()
     title = request.args.get('title', '').strip()
-    
-    discogs_token = get_config_value('discogs_token')
-    if not discogs_token:
-        return jsonify({"success": False, "message": get_text("flash_no_permission")})
-
-    data = {"success": False, "images": [], "tracks": [], "year": "", "category": ""}
 
-    try:
-        headers = {"User-Agent": "HomeInventoryApp/1.0", "Authorization": f"Discogs token={discogs_token}"}
-        url = "https://api.discogs.com/database/search"
-        params = {"artist": artist, "release_title": title, "type": "release", "per_page": 1}
-        
-        res = requests.get(url, headers=headers, params=params, timeout=5)
-        if res.status_code == 200 and res.json().get("results"):
-            item = res.json()["results"][0]
-            data["success"] = True
-            data["year"] = item.get("year", "")
-            
-            formats = item.get("format", [])
-            if "Vinyl" in formats: data["category"] = "Vinyl/LP"
-            elif "CD" in formats: data["category"] = "CD"
-            
-            resource_url = item.get("resource_url")
-            if resource_url:
-                det_res = requests.get(resource_url, headers=headers, timeout=5)
-                if det_res.status_code == 200:
-                    det = det_res.json()
-                    
-                    if "images" in det:
-                        data["images"] = [img.get("uri", "") for img in det["images"] if img.get("uri")]
-                    
-                    if not data["images"]:
-                        thumb = item.get("cover_image") or item.get("thumb")
-                        if thumb: data["images"].append(thumb)
-
-                    for t in det.get("tracklist", []):
-                        if t.get("type_") == "heading": continue
-                        data["tracks"].append({
-                            "position": t.get("position", ""),
-                            "title": t.get("title", ""),
-                            "duration": t.get("duration", "")
-                        })
-    except Exception as e:
-        return jsonify({"success": False, "message": str(e)})
-
-    return jsonify(data)
+    if not get_config_value('discogs_token'):
+        return jsonify({"success": False, "message": get_text("flash_no_permission")})
+    return jsonify(await run_lookup('discogs', artist=artist, title=title))
 
 # -- API: SPOTIFY SEARCH --
 @main.route('/api/spotify/search')
 @login_required
-def api_spotify_search():
+async def api_spotify_search():
     artist = request.args.get('artist', '').strip()
     title = request.args.get('title', '').strip()
     
     if not artist or not title:
         return jsonify({"success": False, "message": "Missing artist or title"})
-        
-    token = get_spotify_access_token()
-    if not token:
-        print("DEBUG: Spotify Token missing")
+    if not get_config_value('spotify_client_id') or not get_config_value('spotify_client_secret'):
+        print("DEBUG: Spotify Credentials missing in DB")
         return jsonify({"success": False, "message": "Spotify not configured or auth failed"})
-        
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        def do_search(q_param):
-            # market=DE improves hit rate for German users and filters unplayable content
-            print(f"DEBUG: Spotify Search Q='{q_param}'")
-            return requests.get("https://api.spotify.com/v1/search", 
-                                headers=headers, 
-                                params={"q": q_param, "type": "album", "limit": 5, "market": "DE"}, 
-                                timeout=5)
-
-        def find_best_match(items):
-            if not items: return None
-            target_artist = artist.lower()
-            target_title = title.lower()
-            
-            for item in items:
-                # 1. Artist Check
-                sp_artists = [a.get('name', '').lower() for a in item.get('artists', [])]
-                artist_match = False
-                for sp_a in sp_artists:
-                    # Exact substring or high similarity (Ratio > 0.6)
-                    if target_artist in sp_a or sp_a in target_artist:
-                        artist_match = True
-                        break
-                    if difflib.SequenceMatcher(None, target_artist, sp_a).ratio() > 0.6:
-                        artist_match = True
-                        break
-                
-                if not artist_match: continue
-
-                # 2. Title Check
-                sp_album = item.get('name', '').lower()
-                if target_title in sp_album or sp_album in target_title:
-                    return item.get('id')
-                if difflib.SequenceMatcher(None, target_title, sp_album).ratio() > 0.6:
-                    return item.get('id')
-            
-            return None
-
-        # Attempt 1: Strict with fields
-        res = do_search(f'artist:"{artist}" album:"{title}"')
-        if res.status_code == 200:
-            items = res.json().get("albums", {}).get("items", [])
-            match_id = find_best_match(items)
-            if match_id:
-                return jsonify({"success": True, "spotify_id": match_id})
-        
-        # Attempt 2: Loose (Simple string concat) - also finds "Remastered" etc.
-        res = do_search(f"{artist} {title}")
-        if res.status_code == 200:
-            items = res.json().get("albums", {}).get("items", [])
-            match_id = find_best_match(items)
-            if match_id:
-                return jsonify({"success": True, "spotify_id": match_id})
-
-    except Exception as e:
-        print(f"Spotify Search Error: {e}")
-        
-    return jsonify({"success": False, "message": "Not found"})
+    return jsonify(await run_lookup('spotify', artist=artist, title=title))
 
 # -- API: BARCODE LOOKUP (With Amazon Fallback) --
 @main.route('/api/lookup/<barcode>')
 @login_required
-def api_lookup(barcode):
-    data = { "success": False, "title": "", "author": "", "year": "", "description": "", "image_url": "", "category": "", "tracks": [] }
-    clean_isbn = ''.join(c for c in barcode if c.isdigit() or c.upper() == 'X')
-    
-    # 1. Google Books
-    try:
-        res = requests.get(f"https://www.googleapis.com/books/v1/volumes?q=isbn:{clean_isbn}", timeout=5)
-        if res.status_code == 200:
-            g = res.json()
-            if "items" in g and len(g["items"]) > 0:
-                info = g["items"][0].get("volumeInfo", {})
-                data.update({
-                    "success": True, "title": info.get("title", ""), 
-                    "author": ", ".join(info.get("authors", [])),
-                    "description": info.get("description", "")[:800], "category": "Buch",
-                    "year": info.get("publishedDate", "")[:4] if len(info.get("publishedDate", ""))>=4 else ""
-                })
-                imgs = info.get("imageLinks", {})
-                if imgs.get("thumbnail"): data["image_url"] = imgs.get("thumbnail").replace("http://", "https://")
-    except: pass
-
-    # 2. Open Library
-    if not data["success"] or not data["image_url"]:
-        try:
-            res = requests.get(f"https://openlibrary.org/api/books?bibkeys=ISBN:{clean_isbn}&format=json&jscmd=data", timeout=5)
-            if res.status_code == 200 and res.json():
-                bk = list(res.json().values())[0]
-                if not data["success"]: # Only adopt metadata if Google had nothing
-                    data.update({
-                        "success": True, "title": bk.get("title", ""), 
-                        "author": ", ".join([a["name"] for a in bk.get("authors", [])]),
-                        "category": "Buch"
-                    })
-                    match = re.search(r'\d{4}', bk.get("publish_date", ""))
-                    if match: data["year"] = match.group(0)
-
-                # Get image
-                if "cover" in bk: data["image_url"] = bk["cover"].get("large", "")
-        except: pass
-
-    # 3. Amazon Direct Image Fallback (NEW!)
-    # Often works for German books if Google/OpenLibrary have no cover
-    if data["success"] and not data["image_url"]:
-        try:
-            # Amazon image URL pattern
-            amazon_url = f"https://images-na.ssl-images-amazon.com/images/P/{clean_isbn}.01.LZZZZZZZ.jpg"
-            
-            # We do a HEAD request to check if the image exists
-            # and is larger than 1x1 pixel (Amazon returns 43 bytes for "not found")
-            check = requests.get(amazon_url, timeout=3)
-            if check.status_code == 200 and len(check.content) > 100:
-                print(f"DEBUG: Amazon Cover gefunden für {clean_isbn}")
-                data["image_url"] = amazon_url
-        except Exception as e:
-            print(f"DEBUG: Amazon Fallback Fehler: {e}")
-
-    # 4. Discogs (for music)
-    token = get_config_value('discogs_token')
-    if token and (not data["success"] or data["category"] == ""): 
-        try:
-            h = {"User-Agent": "HomeInventoryApp/1.0", "Authorization": f"Discogs token={token}"}
-            res = requests.get("https://api.discogs.com/database/search", headers=h, params={"barcode": barcode, "type": "release", "per_page": 1}, timeout=5)
-            if res.status_code == 200 and res.json().get("results"):
-                it = res.json()["results"][0]
-                data["success"] = True
-                
-                # Title/Author separation at Discogs often "Artist - Title"
-                full_title = it.get("title", "")
-                if " - " in full_title and not data["author"]:
-                    parts = full_title.split(" - ", 1)
-                    data["author"] = parts[0].strip()
-                    data["title"] = parts[1].strip()
-                elif not data["title"]:
-                    data["title"] = full_title
-                
-                if not data["year"]: data["year"] = it.get("year", "")
-                
-                # If we don't have an image yet (or Amazon/Google failed)
-                if not data["image_url"]:
-                    data["image_url"] = it.get("cover_image", "")
-                
-                # Determine category
-                fmts = it.get("format", [])
-                if "Vinyl" in fmts: data["category"] = "Vinyl/LP"
-                elif "CD" in fmts: data["category"] = "CD"
-                elif "DVD" in fmts: data["category"] = "Film (DVD/BluRay)"
-
-                # Load tracks
-                if it.get("resource_url"):
-                    det = requests.get(it["resource_url"], headers=h, timeout=5).json()
-                    for t in det.get("tracklist", []):
-                        if t.get("type_") != "heading":
-                            data["tracks"].append({"position": t.get("position"), "title": t.get("title"), "duration": t.get("duration")})
-        except: pass
-    
-    # 5. Blu-ray.com (EAN Search)
-    # Replaces TMDB and OFDb as they are unreliable for EANs
-    if not data["success"] or data["category"] == "":
-        try:
-            url = f"https://www.blu-ray.com/search/?quicksearch=1&quicksearch_country=all&quicksearch_keyword={barcode}"
-            # User-Agent is required for blu-ray.com
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            res = requests.get(url, headers=headers, timeout=5)
-            
-            if res.status_code == 200:
-                content = res.text
-                movie_url = None
-                d_content = ""
-
-                # Check if redirected to detail page
-                if "/movies/" in res.url:
-                    movie_url = res.url
-                    d_content = content
-                else:
-                    # Search results page - find first movie link
-                    # Pattern: <a href="https://www.blu-ray.com/movies/..." ... title="...">
-                    link_match = re.search(r'href="(https://www.blu-ray.com/movies/[^"]+)"[^>]*title="([^"]+)"', content)
-                    if link_match:
-                        movie_url = link_match.group(1)
-                        # Fetch detail page
-                        detail_res = requests.get(movie_url, headers=headers, timeout=5)
-                        if detail_res.status_code == 200:
-                            d_content = detail_res.text
-                        else:
-                            movie_url = None
-
-                if movie_url and d_content:
-                    data["success"] = True
-                    data["category"] = "Film (DVD/BluRay)"
-                    
-                    # Title (OG Meta tag is usually reliable)
-                    title_match = re.search(r'<meta property="og:title" content="([^"]+)"', d_content)
-                    if title_match:
-                        # Cleanup title (remove "Blu-ray", "4K", etc.)
-                        t = title_match.group(1)
-                        t = re.sub(r'\s+\(Blu-ray\)', '', t)
-                        t = re.sub(r'\s+\(4K\)', '', t)
-                        t = re.sub(r'\s+\(3D\)', '', t)
-                        data["title"] = t.strip()
-                    
-                    # Description
-                    desc_match = re.search(r'<meta property="og:description" content="([^"]+)"', d_content)
-                    if desc_match:
-                        data["description"] = desc_match.group(1)
-
-                    # Image
-                    img_match = re.search(r'<meta property="og:image" content="([^"]+)"', d_content)
-                    if img_match:
-                        data["image_url"] = img_match.group(1)
-                        
-                    # Year
-                    year_match = re.search(r'href="https://www.blu-ray.com/movies/movies.php\?year=(\d{4})"', d_content)
-                    if year_match:
-                        data["year"] = year_match.group(1)
-                        
-                    # Director
-                    dir_match = re.search(r'Directors?:.*?<a[^>]+>([^<]+)</a>', d_content, re.DOTALL)
-                    if dir_match:
-                        data["author"] = dir_match.group(1)
-
-        except Exception as e:
-            print(f"Blu-ray.com Error: {e}")
-
-    return jsonify(data)
+async def api_lookup(barcode):
+    return jsonify(await run_lookup('barcode', barcode=barcode))
 
 @main.route('/api/check_duplicate/<barcode>')
 @login_required
 def api_check_duplicate(barcode):
-    exists = MediaItem.query.filter_by(barcode=barcode).first() is not None
+    exists = bool(find_barcode_duplicates([barcode]))
     return jsonify({'exists': exists})
 
+@main.route('/api/check_duplicates', methods=['POST'])
+@login_required
+def api_check_duplicates():
+    """
+    Batch duplicate check: {"codes": [...]} -> {"duplicates": {code: [{id, inventory_number, title}]}}.
+    Codes are compared by normalized key, so ISBN-10/ISBN-13 and UPC/EAN forms match.
+    """
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    if not isinstance(codes, list) or len(codes) > DUPLICATE_CHECK_MAX:
+        return jsonify({'success': False, 'message': 'Invalid batch'}), 400
+    found = find_barcode_duplicates(str(c) for c in codes if c is not None)
+    return jsonify({'success': True, 'duplicates': {
+        code: [{'id': i.id, 'inventory_number': i.inventory_number, 'title': i.title} for i in items]
+        for code, items in found.items()}})
+
 # -- QR Code --
 @main.route('/qrcode_image/<inventory_number>')
 def qrcode_image(inventory_number):
-    qr = qrcode.QRCode(box_size=10, border=4)
-    qr.add_data(inventory_number)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    fp = io.BytesIO()
-    img.save(fp, 'PNG')
-    fp.seek(0)
-    return send_file(fp, mimetype='image/png')
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in QR_MIMETYPES: fmt = 'png'
+
+    # The image for an inventory number never changes -> cache forever in the browser
+    response = Response(get_qr_code(inventory_number, fmt), mimetype=QR_MIMETYPES[fmt])
+    response.set_etag(qr_etag(inventory_number, fmt))
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
 
 # -- ROUTES --
 
@@ -506,54 +277,8 @@ def index():
     sort_field = request.args.get('sort_field', default_sort_field) 
     sort_order = request.args.get('sort_order', default_sort_order)
 
-    query = MediaItem.query
-
-    # -- FILTERING --
-    if q_str:
-        s = f"%{q_str}%"
-        query = query.filter(or_(
-            MediaItem.title.ilike(s),
-            MediaItem.author_artist.ilike(s),
-            MediaItem.inventory_number.ilike(s),
-            MediaItem.barcode.ilike(s),
-            MediaItem.lent_to.ilike(s), # Also search for borrower!
-            MediaItem.tracks.any(Track.title.ilike(s)) # Search in tracks
-        ))
-    
-    if cat: 
-        query = query.filter(MediaItem.category == cat)
-    
-    if loc: 
-        query = query.filter(MediaItem.location_id == int(loc))
-
-    # Rental status filter
-    if lent == 'yes':
-        query = query.filter(MediaItem.lent_to != None)
-    elif lent == 'no':
-        query = query.filter(MediaItem.lent_to == None)
-
-    # -- FLEXIBLE SORTING WITH CASCADING --
-    primary_sort = None
-    secondary_sorts = []
-
-    if sort_field == 'title':
-        primary_sort = MediaItem.title
-        secondary_sorts = [MediaItem.author_artist.asc()] 
-    elif sort_field == 'author':
-        primary_sort = MediaItem.author_artist
-        secondary_sorts = [MediaItem.title.asc(), MediaItem.release_year.desc()]
-    elif sort_field == 'year':
-        primary_sort = MediaItem.release_year
-        secondary_sorts = [MediaItem.author_artist.asc(), MediaItem.title.asc()]
-    else: # 'added' oder Fallback
-        primary_sort = MediaItem.id
-        secondary_sorts = []
-
-    # Apply direction
-    if sort_order == 'asc':
-        query = query.order_by(primary_sort.asc(), *secondary_sorts)
-    else:
-        query = query.order_by(primary_sort.desc(), *secondary_sorts)
+    query = media_filter_query({'q': q_str, 'category': cat, 'location': loc, 'lent': lent})
+    query = apply_media_sort(query, sort_field, sort_order)
 
     # -- PAGINATION LOGIC --
     items = []
@@ -572,7 +297,7 @@ def index():
         items = pagination.items
 
     locations = sorted(Location.query.all(), key=lambda x: x.full_path)
-    categories = ["Buch", "Film (DVD/BluRay)", "CD", "Vinyl/LP", "Videospiel", "Sonstiges"]
+    categories = CATEGORIES
 
     # Filter status for template
     current_filters = {
@@ -649,9 +374,16 @@ def settings():
             flash(get_text('settings_saved'), 'success')
             return redirect(url_for('main.settings', tab='api'))
         
+    # Collection statistics (aggregates over the track table, no rows loaded)
+    track_count, total_seconds = db.session.query(func.count(Track.id), func.sum(Track.duration_seconds)).one()
     return render_template('settings.html',
                            active_tab=active_tab,
+                           item_count=MediaItem.query.count(), track_count=track_count,
+                           total_playtime=format_duration(total_seconds),
+                           sqlite_pragmas=sqlite_pragma_status(db.session.connection(), current_app.config['SQLITE_PRAGMAS']),
+                           backup=backup_overview(),
                            users=User.query.all(),
+                           api_tokens=ApiToken.query.order_by(ApiToken.created_at).all(),
                            roles=Role.query.all(),
                            locations=sorted(Location.query.all(), key=lambda x: x.full_path),
                            discogs_token=get_config_value('discogs_token', ''),
@@ -683,11 +415,25 @@ def change_password():
 def admin_backup_download():
     if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
     try:
-        path, fname = create_backup_zip()
-        return send_file(path, as_attachment=True, download_name=fname)
+        snapshot_path, fname = prepare_backup()
     except Exception as e:
         flash(f'Error: {e}', 'error')
         return redirect(url_for('main.settings', tab='backup'))
+    # Streamed while it is built: starts at once, no archive file in the instance folder
+    response = Response(stream_with_context(iter_backup_zip(snapshot_path)), mimetype='application/zip')
+    # Also runs when the client disconnects before the first chunk
+    response.call_on_close(lambda: os.remove(snapshot_path))
+    response.headers.set('Content-Disposition', 'attachment', filename=fname)
+    return response
+
+@main.route('/admin/backup/run', methods=['POST'])
+@login_required
+def admin_backup_run():
+    if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
+    # Same run as the scheduler (incremental archive in the backup folder + pruning)
+    job = create_job('backup', user_id=current_user.id)
+    start_job(job, run_backup_job)
+    return redirect(url_for('main.job_status', job_id=job['id']))
 
 @main.route('/admin/restore', methods=['POST'])
 @login_required
@@ -695,17 +441,12 @@ def admin_restore():
     if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
     f = request.files.get('backup_file')
     if f and f.filename.endswith('.zip'):
-        if not os.path.exists(current_app.instance_path): os.makedirs(current_app.instance_path)
-        p = os.path.join(current_app.instance_path, 'restore.zip')
-        f.save(p)
-        try:
-            restore_backup_zip(p)
-            flash(get_text('flash_backup_restore'), 'success')
-            if os.path.exists(p): os.remove(p)
-            return redirect(url_for('main.index'))
-        except Exception as e:
-            flash(f'Error: {e}', 'error')
-            return redirect(url_for('main.settings', tab='backup'))
+        job = create_job('restore', user_id=current_user.id, filename=f.filename)
+        # The upload is stored next to the job state and removed by the job when done
+        path = os.path.join(jobs_folder(), f"{job['id']}_restore.zip")
+        f.save(path)
+        start_job(job, run_restore_job, path)
+        return redirect(url_for('main.job_status', job_id=job['id']))
     flash(get_text('flash_invalid_file'), 'error')
     return redirect(url_for('main.settings', tab='backup'))
 
@@ -748,7 +489,10 @@ def admin_cleanup_images():
 def media_detail(item_id):
     item = MediaItem.query.get_or_404(item_id)
     spotify_enabled = bool(get_config_value('spotify_client_id'))
-    return render_template('media_detail.html', item=item, tracks=item.tracks.order_by(Track.position).all(), spotify_enabled=spotify_enabled)
+    total_seconds = db.session.query(func.sum(Track.duration_seconds)).filter(Track.media_item_id == item.id).scalar()
+    loans = item.loans.join(Borrower).order_by(Loan.lent_at.desc()).limit(LENDING_HISTORY_LIMIT).all()
+    return render_template('media_detail.html', item=item, tracks=item.tracks.order_by(Track.position).all(),
+                           total_duration=format_duration(total_seconds), loans=loans, spotify_enabled=spotify_enabled)
 
 @main.route('/media/create', methods=['GET', 'POST'])
 @login_required
@@ -766,7 +510,7 @@ def media_create():
         ry = request.form.get('release_year')
         
         # Remember location (for bulk entry in the same room)
-        loc_id = int(request.form.get('location_id') or 1)
+        loc_id = form_location_id()
         session['last_location_id'] = loc_id
 
         item = MediaItem(
@@ -785,24 +529,17 @@ def media_create():
         db.session.commit()
 
         # Tracks
-        titles = request.form.getlist('track_title')
-        pos = request.form.getlist('track_position')
-        dur = request.form.getlist('track_duration')
-        for i, t in enumerate(titles):
-            if t.strip():
-                try: p = int(pos[i])
-                except: p = i + 1
-                db.session.add(Track(media_item_id=item.id, title=t, position=p, duration=dur[i]))
+        replace_tracks(item.id, form_tracks())
         db.session.commit()
 
         flash(get_text('flash_created'), 'success')
         if request.form.get('commit_action') == 'save_next': return redirect(url_for('main.media_create'))
         return redirect(url_for('main.index'))
 
-    default_location_id = session.get('last_location_id', 1)
+    default_location_id = session.get('last_location_id') or 1
     return render_template('media_create.html', 
                            locations=sorted(Location.query.all(), key=lambda x: x.full_path), 
-                           categories=["Buch", "Film (DVD/BluRay)", "CD", "Vinyl/LP", "Videospiel", "Sonstiges"], 
+                           categories=CATEGORIES, 
                            default_location_id=default_location_id,
                            duplicate_check=get_config_value('duplicate_check', 'false'))
 
@@ -818,7 +555,7 @@ def media_edit(item_id):
         item.release_year = int(ry) if ry and ry.strip() else None
         item.barcode = request.form.get('barcode')
         item.description = request.form.get('description')
-        item.location_id = int(request.form.get('location_id') or 1)
+        item.location_id = form_location_id()
         item.lent_to = request.form.get('lent_to') or None
         if item.lent_to and not item.lent_at: item.lent_at = datetime.now()
         if not item.lent_to: item.lent_at = None
@@ -830,21 +567,13 @@ def media_edit(item_id):
 
         # Overwrite tracks
         if request.form.get('overwrite_tracks') == 'yes':
-            Track.query.filter_by(media_item_id=item.id).delete()
-            titles = request.form.getlist('track_title')
-            pos = request.form.getlist('track_position')
-            dur = request.form.getlist('track_duration')
-            for i, t in enumerate(titles):
-                if t.strip():
-                    try: p = int(pos[i])
-                    except: p = i + 1
-                    db.session.add(Track(media_item_id=item.id, title=t, position=p, duration=dur[i]))
+            replace_tracks(item.id, form_tracks())
 
         db.session.commit()
         flash(get_text('flash_saved'), 'success')
         return redirect(url_for('main.media_detail', item_id=item.id))
 
-    return render_template('media_edit.html', item=item, locations=sorted(Location.query.all(), key=lambda x: x.full_path), categories=["Buch", "Film (DVD/BluRay)", "CD", "Vinyl/LP", "Videospiel", "Sonstiges"])
+    return render_template('media_edit.html', item=item, locations=sorted(Location.query.all(), key=lambda x: x.full_path), categories=CATEGORIES)
 
 @main.route('/media/delete/<int:item_id>')
 @login_required
@@ -857,6 +586,38 @@ def media_delete(item_id):
     db.session.commit()
     return redirect(url_for('main.index'))
 
+# -- BULK ACTIONS --
+def bulk_filters():
+    """Dashboard filter state posted with "select all matching" (None if single items were checked)."""
+    if not request.form.get('select_matching'):
+        return None
+    return {k: request.form.get(k, '') for k in MEDIA_FILTER_KEYS + ['sort_field', 'sort_order']}
+
+def bulk_selection_query():
+    """
+    Query for the items a bulk action applies to: the checked item_ids or, in
+    "select all matching" mode, every item matching the posted filters.
+    Used for set-based UPDATE/DELETE statements, the rows are never loaded.
+    """
+    filters = bulk_filters()
+    if filters is not None:
+        return media_filter_query(filters)
+    item_ids = request.form.getlist('item_ids')
+    if not item_ids:
+        return None
+    return MediaItem.query.filter(MediaItem.id.in_(item_ids))
+
+BULK_SELECTION = table('bulk_selection', column('id'))
+
+def snapshot_selection(query):
+    """Copies the ids of query into a per-connection temp table (INSERT ... SELECT) and returns a subquery on it."""
+    conn = db.session.connection()
+    begin_immediate(conn)  # The selection is read and then written in one transaction
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS bulk_selection (id INTEGER PRIMARY KEY)")
+    conn.exec_driver_sql("DELETE FROM bulk_selection")
+    conn.execute(insert(BULK_SELECTION).from_select(['id'], query.with_entities(MediaItem.id)))
+    return select(BULK_SELECTION.c.id)
+
 @main.route('/media/bulk_move', methods=['POST'])
 @login_required
 def bulk_move():
@@ -864,10 +625,10 @@ def bulk_move():
         flash(get_text('flash_no_permission'), 'error')
         return redirect(url_for('main.index'))
 
-    item_ids = request.form.getlist('item_ids')
+    query = bulk_selection_query()
     target_location_id = request.form.get('target_location_id')
     
-    if not item_ids:
+    if query is None:
         flash(get_text('no_selection'), 'warning')
         return redirect(url_for('main.index'))
         
@@ -881,7 +642,7 @@ def bulk_move():
             flash(get_text('invalid_target'), 'error')
             return redirect(url_for('main.index'))
             
-        count = MediaItem.query.filter(MediaItem.id.in_(item_ids)).update({MediaItem.location_id: target_loc.id}, synchronize_session=False)
+        count = query.update({MediaItem.location_id: target_loc.id}, synchronize_session=False)
         db.session.commit()
         flash(f'{count} {get_text("item_moved")}', 'success')
         
@@ -891,12 +652,75 @@ def bulk_move():
         
     return redirect(url_for('main.index'))
 
+@main.route('/media/bulk_action', methods=['POST'])
+@login_required
+def bulk_action():
+    if not current_user.has_role('Admin'):
+        flash(get_text('flash_no_permission'), 'error')
+        return redirect(url_for('main.index'))
+
+    query = bulk_selection_query()
+    if query is None:
+        flash(get_text('no_selection'), 'warning')
+        return redirect(url_for('main.index'))
+
+    action = request.form.get('action')
+    try:
+        if action == 'category':
+            category = request.form.get('target_category')
+            if category not in CATEGORIES:
+                flash(get_text('no_target'), 'warning')
+                return redirect(url_for('main.index'))
+            count = query.update({MediaItem.category: category}, synchronize_session=False)
+            message = get_text('items_updated')
+
+        elif action == 'lend':
+            lent_to = request.form.get('lent_to', '').strip()
+            if not lent_to:
+                flash(get_text('no_target'), 'warning')
+                return redirect(url_for('main.index'))
+            # Fixed selection: a "lent" filter would no longer match after the UPDATE
+            selected_ids = snapshot_selection(query)
+            count = MediaItem.query.filter(MediaItem.id.in_(selected_ids)).update(
+                {MediaItem.lent_to: lent_to[:100], MediaItem.lent_at: datetime.now()}, synchronize_session=False)
+            sync_loans(db.session.connection(), selected_ids)
+            message = get_text('items_updated')
+
+        elif action == 'return':
+            selected_ids = snapshot_selection(query.filter(MediaItem.lent_to != None))
+            count = MediaItem.query.filter(MediaItem.id.in_(selected_ids)).update(
+                {MediaItem.lent_to: None, MediaItem.lent_at: None}, synchronize_session=False)
+            sync_loans(db.session.connection(), selected_ids)
+            message = get_text('items_updated')
+
+        elif action == 'delete':
+            # The selection may depend on tracks (search), so its ids are fixed in a temp table first.
+            # Then tracks (no ON DELETE CASCADE in the schema) and items go with one DELETE each.
+            selected_ids = snapshot_selection(query)
+            Track.query.filter(Track.media_item_id.in_(selected_ids)).delete(synchronize_session=False)
+            MediaBlockKey.query.filter(MediaBlockKey.media_item_id.in_(selected_ids)).delete(synchronize_session=False)
+            Loan.query.filter(Loan.media_item_id.in_(selected_ids)).delete(synchronize_session=False)
+            count = MediaItem.query.filter(MediaItem.id.in_(selected_ids)).delete(synchronize_session=False)
+            message = get_text('items_deleted')
+
+        else:
+            abort(400)
+
+        db.session.commit()
+        flash(f'{count} {message}', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'error')
+
+    return redirect(url_for('main.index'))
+
 @main.route('/media/<int:item_id>/add_track', methods=['POST'])
 @login_required
 def track_add(item_id):
     t = request.form.get('title')
     if t:
-        db.session.add(Track(media_item_id=item_id, title=t, position=request.form.get('position', 0), duration=request.form.get('duration')))
+        db.session.add(Track(media_item_id=item_id, title=t, position=request.form.get('position', 0, type=int), duration=request.form.get('duration')))
         db.session.commit()
         flash(get_text('track_added'), 'success')
     return redirect(url_for('main.media_detail', item_id=item_id))
@@ -915,22 +739,165 @@ def track_delete(track_id):
 @main.route('/lent')
 @login_required
 def lent_overview():
-    # Load all lent items
-    items = MediaItem.query.filter(MediaItem.lent_to != None).order_by(MediaItem.lent_to, MediaItem.lent_at).all()
-    # Create list of all persons who have borrowed something (for the dropdown)
-    borrowers = sorted(list(set([i.lent_to for i in items if i.lent_to])))
-    return render_template('lent_items.html', items=items, borrowers=borrowers)
+    # Open loans (partial index) and the borrowers for the dropdown (GROUP BY)
+    items = open_loans_query().all()
+    return render_template('lent_items.html', items=items, borrowers=current_borrowers(), stats=lending_stats())
 
 @main.route('/lent/export')
 @login_required
 def lent_export():
     person = request.args.get('person')
-    query = MediaItem.query.filter(MediaItem.lent_to != None)
-    if person:
-        query = query.filter(MediaItem.lent_to == person)
-    
-    items = query.order_by(MediaItem.lent_to, MediaItem.lent_at).all()
-    return render_template('lent_export.html', items=items, person=person, now=datetime.now())
+    query = open_loans_query(person)
+
+    if request.args.get('format') == 'pdf':
+        labels = {key: get_text(key) for key in ['lent_list', 'generated_on', 'borrower', 'title', 'author_artist',
+                                                  'format', 'lent_to', 'lent_at_date', 'signature_lender', 'signature_borrower']}
+        rows = ({
+            'title': item.title,
+            'author_artist': item.author_artist,
+            'format': get_text(item.category),
+            'lent_to': item.lent_to,
+            'lent_at_date': item.lent_at.strftime('%d.%m.%Y') if item.lent_at else None
+        } for item in query.yield_per(500))
+        pdf = render_lent_pdf(rows, labels, person=person, generated_on=datetime.now().strftime('%d.%m.%Y %H:%M'))
+        response = Response(stream_with_context(pdf), mimetype='application/pdf')
+        response.headers.set("Content-Disposition", "inline", filename=f"lent_list_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+        return response
+
+    return render_template('lent_export.html', items=query.all(), person=person, now=datetime.now())
+
+# -- DUPLICATES --
+@main.route('/admin/duplicates')
+@login_required
+def duplicates_report():
+    if not current_user.has_role('Admin'):
+        flash(get_text('flash_no_permission'), 'error')
+        return redirect(url_for('main.index'))
+    min_score = min(max(request.args.get('min_score', MIN_SCORE, type=float), 0.5), 1.0)
+    start = time.time()
+    candidates, total = duplicate_candidates(min_score)
+    return render_template('duplicates.html', candidates=candidates, total=total, min_score=min_score,
+                           duration=time.time() - start)
+
+@main.route('/admin/duplicates/merge', methods=['POST'])
+@login_required
+def duplicates_merge():
+    if not current_user.has_role('Admin'):
+        abort(403)
+    keep = MediaItem.query.get_or_404(request.form.get('keep_id', type=int))
+    drop = MediaItem.query.get_or_404(request.form.get('drop_id', type=int))
+    if keep.id != drop.id:
+        try:
+            merge_items(keep, drop)
+        except ValueError:
+            flash(get_text('merge_both_lent'), 'error')
+            return redirect(url_for('main.duplicates_report', min_score=request.form.get('min_score')))
+        db.session.commit()
+        flash(get_text('items_merged'), 'success')
+    return redirect(url_for('main.duplicates_report', min_score=request.form.get('min_score')))
+
+# -- STOCKTAKE --
+def get_stocktake_or_404(stocktake_id):
+    stocktake = Stocktake.query.get_or_404(stocktake_id)
+    if not current_user.has_role('Admin'):
+        abort(403)
+    return stocktake
+
+@main.route('/stocktake', methods=['GET', 'POST'])
+@login_required
+def stocktake_list():
+    if not current_user.has_role('Admin'):
+        flash(get_text('flash_no_permission'), 'error')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        location = Location.query.get(request.form.get('location_id', type=int) or 0)
+        if not location:
+            flash(get_text('no_target'), 'warning')
+            return redirect(url_for('main.stocktake_list'))
+        name = request.form.get('name', '').strip() or f"{location.name} {datetime.now().strftime('%Y-%m-%d')}"
+        stocktake = Stocktake(name=name[:100], location_id=location.id, user_id=current_user.id)
+        db.session.add(stocktake)
+        db.session.commit()
+        return redirect(url_for('main.stocktake_scan', stocktake_id=stocktake.id))
+
+    return render_template('stocktake_list.html',
+                           stocktakes=Stocktake.query.order_by(Stocktake.created_at.desc()).all(),
+                           locations=sorted(Location.query.all(), key=lambda x: x.full_path))
+
+@main.route('/stocktake/<int:stocktake_id>')
+@login_required
+def stocktake_scan(stocktake_id):
+    stocktake = get_stocktake_or_404(stocktake_id)
+    # Sub-locations to scan shelf by shelf (root first)
+    tree = location_subtree(stocktake.location_id)
+    paths = build_location_paths()
+    sub_locations = sorted(((loc_id, paths.get(loc_id, '')) for (loc_id,) in db.session.execute(select(tree.c.id))),
+                           key=lambda x: x[1])
+    return render_template('stocktake_scan.html', stocktake=stocktake, sub_locations=sub_locations,
+                           scan_count=stocktake.scans.count())
+
+@main.route('/stocktake/<int:stocktake_id>/scans', methods=['POST'])
+@login_required
+def stocktake_add_scans(stocktake_id):
+    """JSON: {"codes": [...], "location_id": optional}. Called by the scan page in batches."""
+    stocktake = get_stocktake_or_404(stocktake_id)
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    if stocktake.status != 'open':
+        return jsonify({'success': False, 'message': get_text('stocktake_closed')}), 409
+    if not isinstance(codes, list) or len(codes) > STOCKTAKE_MAX_BATCH:
+        return jsonify({'success': False, 'message': 'Invalid batch'}), 400
+    location_id = data.get('location_id') or None
+    if location_id is not None and not subtree_contains(stocktake, location_id):
+        return jsonify({'success': False, 'message': get_text('invalid_target')}), 400
+
+    added = add_scans(stocktake, codes, location_id)
+    db.session.commit()
+    return jsonify({'success': True, 'added': added, 'scans': stocktake.scans.count()})
+
+@main.route('/stocktake/<int:stocktake_id>/report')
+@login_required
+def stocktake_report(stocktake_id):
+    stocktake = get_stocktake_or_404(stocktake_id)
+    sets = stocktake_sets(stocktake)
+    counts = stocktake_counts(stocktake)
+    paths = build_location_paths()
+    lists = {name: query.order_by(None).limit(STOCKTAKE_LIST_LIMIT).all() for name, query in sets.items()}
+    return render_template('stocktake_report.html', stocktake=stocktake, counts=counts, lists=lists,
+                           location_paths=paths, list_limit=STOCKTAKE_LIST_LIMIT)
+
+@main.route('/stocktake/<int:stocktake_id>/correct', methods=['POST'])
+@login_required
+def stocktake_correct(stocktake_id):
+    stocktake = get_stocktake_or_404(stocktake_id)
+    try:
+        count = correct_misplaced(stocktake)
+        db.session.commit()
+        flash(f'{count} {get_text("item_moved")}', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'error')
+    return redirect(url_for('main.stocktake_report', stocktake_id=stocktake.id))
+
+@main.route('/stocktake/<int:stocktake_id>/close', methods=['POST'])
+@login_required
+def stocktake_close(stocktake_id):
+    stocktake = get_stocktake_or_404(stocktake_id)
+    stocktake.status = 'closed'
+    stocktake.closed_at = datetime.utcnow()
+    db.session.commit()
+    return redirect(url_for('main.stocktake_report', stocktake_id=stocktake.id))
+
+@main.route('/stocktake/<int:stocktake_id>/delete', methods=['POST'])
+@login_required
+def stocktake_delete(stocktake_id):
+    stocktake = get_stocktake_or_404(stocktake_id)
+    StocktakeScan.query.filter_by(stocktake_id=stocktake.id).delete(synchronize_session=False)
+    db.session.delete(stocktake)
+    db.session.commit()
+    flash(get_text('flash_deleted'), 'success')
+    return redirect(url_for('main.stocktake_list'))
 
 @main.route('/admin/users/create', methods=['POST'])
 @login_required
@@ -947,9 +914,36 @@ def user_create():
 def user_delete(user_id):
     if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
     u = User.query.get_or_404(user_id)
-    if u.id != current_user.id: db.session.delete(u); db.session.commit()
+    if u.id != current_user.id:
+        # Foreign keys are enforced: the user's items and stocktakes stay and pass to the deleting admin
+        MediaItem.query.filter_by(user_id=u.id).update({'user_id': current_user.id}, synchronize_session=False)
+        Stocktake.query.filter_by(user_id=u.id).update({'user_id': current_user.id}, synchronize_session=False)
+        ApiToken.query.filter_by(user_id=u.id).delete(synchronize_session=False)
+        db.session.delete(u); db.session.commit()
     return redirect(url_for('main.settings', tab='users'))
 
+@main.route('/admin/api_tokens/create', methods=['POST'])
+@login_required
+def api_token_create():
+    if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
+    name = request.form.get('name', '').strip()
+    user = User.query.get(request.form.get('user_id', type=int) or current_user.id)
+    if name and user:
+        token, plaintext = ApiToken.issue(name[:100], user)
+        db.session.add(token); db.session.commit()
+        # The plaintext is not stored, so this is the only time it can be shown
+        flash(f"{get_text('api_token_created')} {plaintext}", 'success')
+    return redirect(url_for('main.settings', tab='api'))
+
+@main.route('/admin/api_tokens/delete/<int:token_id>', methods=['POST'])
+@login_required
+def api_token_delete(token_id):
+    if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
+    token = ApiToken.query.get_or_404(token_id)
+    db.session.delete(token); db.session.commit()
+    flash(get_text('flash_deleted'), 'success')
+    return redirect(url_for('main.settings', tab='api'))
+
 @main.route('/admin/locations/edit/<int:loc_id>', methods=['GET', 'POST'])
 @login_required
 def location_edit(loc_id):
@@ -980,7 +974,9 @@ def location_create():
 def location_delete(loc_id):
     if not current_user.has_role('Admin'): return redirect(url_for('main.index'))
     l = Location.query.get_or_404(loc_id)
-    if not l.children and l.items.count() == 0: db.session.delete(l); db.session.commit()
+    in_use = l.children or l.items.count() or Stocktake.query.filter_by(location_id=l.id).first() \
+        or StocktakeScan.query.filter_by(location_id=l.id).first()
+    if not in_use: db.session.delete(l); db.session.commit()
     return redirect(url_for('main.settings', tab='locations'))
 
 @main.route('/labels/config', methods=['POST'])
@@ -991,7 +987,8 @@ def labels_config():
         return redirect(url_for('main.index'))
     
     item_ids = request.form.getlist('item_ids')
-    if not item_ids:
+    filters = bulk_filters()
+    if not item_ids and filters is None:
         flash(get_text('no_selection'), 'warning')
         return redirect(url_for('main.index'))
 
@@ -1003,6 +1000,9 @@ def labels_config():
     except:
         custom_presets = {}
 
+    if filters is not None:
+        return render_template('labels_config.html', item_ids=[], filters=filters,
+                               total=media_filter_query(filters).count(), custom_presets=custom_presets)
     return render_template('labels_config.html', item_ids=item_ids, custom_presets=custom_presets)
 
 @main.route('/labels/print', methods=['POST'])
@@ -1013,14 +1013,17 @@ def labels_print():
         return redirect(url_for('main.index'))
     
     item_ids = request.form.getlist('item_ids')
-    if not item_ids:
+    filters = bulk_filters()
+    if not item_ids and filters is None:
         flash(get_text('no_selection'), 'warning')
         return redirect(url_for('main.index'))
 
-    # Fetch items and MAINTAIN ORDER of item_ids
-    items_map = {str(item.id): item for item in MediaItem.query.filter(MediaItem.id.in_(item_ids)).all()}
-    items = [items_map[str(iid)] for iid in item_ids if str(iid) in items_map]
-    
+    if filters is not None:
+        # "All matching": labels in dashboard order, streamed from the query
+        selected_items = apply_media_sort(media_filter_query(filters), filters['sort_field'], filters['sort_order']).yield_per(500)
+    else:
+        selected_items = iter_items_in_order(item_ids)
+
     try:
         width = float(request.form.get('width', '62'))
         height = float(request.form.get('height', '29'))
@@ -1030,14 +1033,10 @@ def labels_print():
         margin_top = float(request.form.get('margin_top', '0'))
         margin_left = float(request.form.get('margin_left', '0'))
         start_at = int(request.form.get('start_at', '1'))
+        if width <= 0 or height <= 0: raise ValueError()
     except ValueError:
         width, height, padding, font_size, columns, margin_top, margin_left, start_at = 62.0, 29.0, 2.0, 10.0, 1, 0.0, 0.0, 1
 
-    # Inject empty items for start_at logic
-    if start_at > 1:
-        # We use None as placeholders for empty labels
-        items = [None] * (start_at - 1) + items
-
     # Calculate QR size
     if 'vertical_layout' in request.form:
         qr_size = (height - (2 * padding)) * 0.5
@@ -1066,13 +1065,36 @@ def labels_print():
         'start_at': start_at
     }
 
+    owner_settings = get_config_values('owner_name', 'owner_address', 'owner_phone')
     owner_info = {
-        'name': get_config_value('owner_name', ''),
-        'address': get_config_value('owner_address', ''),
-        'phone': get_config_value('owner_phone', '')
+        'name': owner_settings['owner_name'],
+        'address': owner_settings['owner_address'],
+        'phone': owner_settings['owner_phone']
     }
+
+    # We use None as placeholders for empty labels (start_at logic)
+    placeholders = [None] * (start_at - 1) if start_at > 1 else []
+
+    # Vector PDF: items are fetched in chunks and pages are streamed as they are drawn
+    if request.form.get('output') == 'pdf':
+        page_size = request.form.get('page_size', 'a4')
+        items_iter, qr_lookup = itertools.chain(placeholders, selected_items), None
+        if config['show_qr']:
+            # QR matrices come from the caches, new ones are encoded per batch (process pool for large runs)
+            items_iter, qr_lookup = with_qr_matrices(items_iter)
+        pdf = render_labels_pdf(items_iter, config, owner_info, qr_lookup, page_size=page_size)
+        response = Response(stream_with_context(pdf), mimetype='application/pdf')
+        response.headers.set("Content-Disposition", "inline", filename=f"labels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+        return response
+
+    items = placeholders + list(selected_items)
+
+    # Render all QR codes in one pass and inline them, instead of one image request per label
+    qr_codes = {}
+    if config['show_qr']:
+        qr_codes = {k: Markup(v) for k, v in get_qr_svgs([i.inventory_number for i in items if i]).items()}
     
-    return render_template('labels_print.html', items=items, config=config, owner=owner_info)
+    return render_template('labels_print.html', items=items, config=config, owner=owner_info, qr_codes=qr_codes)
 
 @main.route('/labels/save_preset', methods=['POST'])
 @login_required
@@ -1106,19 +1128,27 @@ def save_label_preset():
     set_config_value('custom_label_presets', json.dumps(custom_presets))
     return jsonify({'success': True})
 
-@main.route('/media/export_config', methods=['POST'])
+@main.route('/media/export_config', methods=['GET', 'POST'])
 @login_required
 def media_export_config():
     if not current_user.has_role('Admin'):
         flash(get_text('flash_no_permission'), 'error')
         return redirect(url_for('main.index'))
+
+    # GET / "select all matching": export everything matching the dashboard filters (runs as background job)
+    filters = bulk_filters()
+    if request.method == 'GET':
+        filters = {k: request.args.get(k, '') for k in MEDIA_FILTER_KEYS + ['sort_field', 'sort_order']}
+    if filters is not None:
+        total = media_filter_query(filters).count()
+        return render_template('export_config.html', item_ids=[], filters=filters, total=total, export_columns=EXPORT_COLUMNS)
     
     item_ids = request.form.getlist('item_ids')
     if not item_ids:
         flash(get_text('no_selection'), 'warning')
         return redirect(url_for('main.index'))
 
-    return render_template('export_config.html', item_ids=item_ids)
+    return render_template('export_config.html', item_ids=item_ids, export_columns=EXPORT_COLUMNS)
 
 @main.route('/media/bulk_export', methods=['POST'])
 @login_required
@@ -1140,112 +1170,110 @@ def media_bulk_export():
         flash(get_text('flash_error'), 'error')
         return redirect(url_for('main.index'))
 
-    # Fetch items and maintain order
-    items = MediaItem.query.filter(MediaItem.id.in_(item_ids)).all()
-    items_map = {str(i.id): i for i in items}
-    sorted_items = [items_map[str(iid)] for iid in item_ids if str(iid) in items_map]
-
-    field_labels = {
-        'inventory_number': get_text('inventory_num'),
-        'title': get_text('title'),
-        'author_artist': get_text('author_artist'),
-        'category': get_text('category'),
-        'release_year': get_text('release_year'),
-        'barcode': get_text('isbn_barcode'),
-        'location': get_text('location'),
-        'lent_to': get_text('lent_to'),
-        'lent_at': get_text('since'),
-        'description': get_text('description')
-    }
-
-    from flask import Response
-    import io
+    ctx = ExportContext(selected_fields, get_text)
+    items = iter_items_in_order(item_ids)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
     if export_format == 'excel':
-        import openpyxl
-        from openpyxl.styles import Font
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Oryvian Export"
-        
-        # Header
-        header = [field_labels.get(f, f) for f in selected_fields]
-        ws.append(header)
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            
-        # Data
-        for item in sorted_items:
-            row = []
-            for f in selected_fields:
-                val = ""
-                if f == 'inventory_number': val = item.inventory_number
-                elif f == 'title': val = item.title
-                elif f == 'author_artist': val = item.author_artist
-                elif f == 'category': val = get_text(item.category)
-                elif f == 'release_year': val = item.release_year
-                elif f == 'barcode': val = item.barcode
-                elif f == 'location': val = item.location.full_path if item.location else ""
-                elif f == 'lent_to': val = item.lent_to
-                elif f == 'lent_at': val = item.lent_at.strftime('%Y-%m-%d %H:%M') if item.lent_at else ""
-                elif f == 'description': val = item.description
-                row.append(val if val is not None else "")
-            ws.append(row)
-            
-        # Auto-adjust column width (simple version)
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except: pass
-            ws.column_dimensions[column].width = max_length + 2
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = Response(output.read(), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response.headers.set("Content-Disposition", "attachment", filename=f"oryvian_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+        # Write-only workbook into a spooled temp file (spills to disk for large exports), then stream it
+        output = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE)
+        try:
+            write_xlsx(items, ctx, output)
+        except Exception:
+            output.close()
+            raise
+
+        response = Response(iter_file(output), mimetype=XLSX_MIMETYPE)
+        response.headers.set("Content-Disposition", "attachment", filename=f"oryvian_export_{timestamp}.xlsx")
         return response
 
     else:
-        # CSV Logic
-        import csv
-        delimiters = {'comma': ',', 'semicolon': ';', 'tab': '\t'}
-        delim = delimiters.get(delimiter_name, ';')
-        
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=delim, quoting=csv.QUOTE_MINIMAL)
-        
-        # Header
-        writer.writerow([field_labels.get(f, f) for f in selected_fields])
-        
-        # Data
-        for item in sorted_items:
-            row = []
-            for f in selected_fields:
-                val = ""
-                if f == 'inventory_number': val = item.inventory_number
-                elif f == 'title': val = item.title
-                elif f == 'author_artist': val = item.author_artist
-                elif f == 'category': val = get_text(item.category)
-                elif f == 'release_year': val = item.release_year
-                elif f == 'barcode': val = item.barcode
-                elif f == 'location': val = item.location.full_path if item.location else ""
-                elif f == 'lent_to': val = item.lent_to
-                elif f == 'lent_at': val = item.lent_at.strftime('%Y-%m-%d %H:%M') if item.lent_at else ""
-                elif f == 'description': val = item.description
-                row.append(val if val is not None else "")
-            writer.writerow(row)
-
-        response = Response("\ufeff" + output.getvalue(), mimetype='text/csv')
-        response.headers.set("Content-Disposition", "attachment", filename=f"oryvian_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        # CSV: streamed chunk by chunk while the rows are fetched
+        delim = CSV_DELIMITERS.get(delimiter_name, ';')
+        response = Response(stream_with_context(iter_csv(items, ctx, delimiter=delim)), mimetype='text/csv')
+        response.headers.set("Content-Disposition", "attachment", filename=f"oryvian_export_{timestamp}.csv")
         return response
 
+@main.route('/media/export_job', methods=['POST'])
+@login_required
+def media_export_job():
+    if not current_user.has_role('Admin'):
+        flash(get_text('flash_no_permission'), 'error')
+        return redirect(url_for('main.index'))
+
+    selected_fields = request.form.getlist('fields')
+    if not selected_fields:
+        flash(get_text('flash_error'), 'error')
+        return redirect(url_for('main.index'))
+
+    filters = {k: request.form.get(k, '') for k in MEDIA_FILTER_KEYS}
+    job = create_job('export', user_id=current_user.id, filters=filters)
+    start_job(job, run_export_job, filters,
+              request.form.get('sort_field') or current_user.sort_field or 'added',
+              request.form.get('sort_order') or current_user.sort_order or 'desc',
+              selected_fields,
+              request.form.get('format', 'csv'),
+              request.form.get('delimiter', 'semicolon'),
+              current_user.language or 'en')
+    return redirect(url_for('main.job_status', job_id=job['id']))
+
+@main.route('/media/import', methods=['GET', 'POST'])
+@login_required
+def media_import():
+    if not current_user.has_role('Admin'):
+        flash(get_text('flash_no_permission'), 'error')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        f = request.files.get('import_file')
+        ext = os.path.splitext(f.filename)[1].lower() if f and f.filename else ''
+        if ext not in ('.csv', '.xlsx'):
+            flash(get_text('flash_invalid_file'), 'error')
+            return redirect(url_for('main.media_import'))
+
+        dry_run = 'dry_run' in request.form
+        job = create_job('import', user_id=current_user.id, filename=f.filename, dry_run=dry_run)
+        # The upload is stored next to the job state and removed by the job when done
+        path = os.path.join(jobs_folder(), f"{job['id']}_upload{ext}")
+        f.save(path)
+        start_job(job, run_import_job, path, current_user.id,
+                  request.form.get('location_id', type=int),
+                  'create_locations' in request.form,
+                  dry_run)
+        return redirect(url_for('main.job_status', job_id=job['id']))
+
+    return render_template('media_import.html',
+                           export_columns=EXPORT_COLUMNS,
+                           locations=sorted(Location.query.all(), key=lambda x: x.full_path))
+
+# -- BACKGROUND JOBS --
+def get_own_job_or_404(job_id):
+    job = get_job(job_id)
+    if job is None or (job['user_id'] != current_user.id and not current_user.has_role('Admin')):
+        abort(404)
+    return job
+
+@main.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    return render_template('job_status.html', job=get_own_job_or_404(job_id))
+
+@main.route('/jobs/<job_id>/status')
+@login_required
+def job_status_json(job_id):
+    job = get_own_job_or_404(job_id)
+    return jsonify({k: job[k] for k in ['id', 'kind', 'status', 'progress', 'total', 'message', 'result', 'finished_at']}
+                   | {'download': bool(job.get('artifact')) and job['status'] == 'done'})
+
+@main.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    job = get_own_job_or_404(job_id)
+    path = artifact_path(job)
+    if job['status'] != 'done' or not path or not os.path.exists(path):
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=job['download_name'])
+
 @main.route('/labels/delete_preset/<name>', methods=['POST'])
 @login_required
 def delete_label_preset(name):
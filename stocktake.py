@@ -0,0 +1,85 @@
+from datetime import datetime
+from sqlalchemy import select, func, and_, or_, exists
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from extensions import db
+from models import Location, MediaItem, StocktakeScan
+
+# Stocktake (inventory audit): scanned inventory numbers are collected per session and compared
+# with the recorded locations of the audited subtree. All sets are computed in SQL, so a session
+# with thousands of scans never loads more rows than a report page shows.
+
+STOCKTAKE_MAX_BATCH = 5000
+STOCKTAKE_LIST_LIMIT = 200  # Rows shown per set on the report page
+
+def location_subtree(root_id):
+    """Recursive CTE with the ids of root_id and all locations below it."""
+    tree = select(Location.id).where(Location.id == root_id).cte('location_subtree', recursive=True)
+    return tree.union_all(select(Location.id).where(Location.parent_id == tree.c.id))
+
+def clean_codes(codes):
+    """Strips, truncates and dedupes scanned codes (order kept)."""
+    cleaned = (str(c).strip()[:50] for c in codes if c is not None)
+    return list(dict.fromkeys(c for c in cleaned if c))
+
+def add_scans(stocktake, codes, location_id=None):
+    """
+    Stores a batch of scans with one INSERT ... ON CONFLICT DO UPDATE (executemany).
+    A code scanned again is moved to the new location. Returns the number of codes stored.
+    """
+    codes = clean_codes(codes)
+    if not codes:
+        return 0
+    now = datetime.utcnow()
+    stmt = sqlite_insert(StocktakeScan)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['stocktake_id', 'code'],
+        set_={'location_id': stmt.excluded.location_id, 'scanned_at': stmt.excluded.scanned_at})
+    db.session.execute(stmt, [{'stocktake_id': stocktake.id, 'code': code, 'location_id': location_id, 'scanned_at': now}
+                              for code in codes])
+    return len(codes)
+
+def subtree_contains(stocktake, location_id):
+    tree = location_subtree(stocktake.location_id)
+    return db.session.execute(select(tree.c.id).where(tree.c.id == location_id)).first() is not None
+
+def stocktake_sets(stocktake):
+    """
+    Queries for the four result sets:
+      found     - scanned items recorded where they were scanned (or anywhere in the subtree)
+      misplaced - scanned items recorded somewhere else
+      missing   - items recorded in the subtree that were not scanned
+      unknown   - scanned codes that match no inventory number (StocktakeScan rows)
+    """
+    tree = location_subtree(stocktake.location_id)
+    in_tree = MediaItem.location_id.in_(select(tree.c.id))
+    scan = StocktakeScan
+    matched = and_(scan.stocktake_id == stocktake.id, scan.code == MediaItem.inventory_number)
+    misplaced = or_(
+        and_(scan.location_id != None, MediaItem.location_id.is_distinct_from(scan.location_id)),
+        and_(scan.location_id == None, or_(MediaItem.location_id == None, ~in_tree)))
+
+    return {
+        'found': MediaItem.query.join(scan, matched).filter(~misplaced),
+        'misplaced': MediaItem.query.join(scan, matched).filter(misplaced),
+        'missing': MediaItem.query.filter(in_tree, ~exists().where(matched)),
+        'unknown': StocktakeScan.query.filter(
+            scan.stocktake_id == stocktake.id,
+            ~exists().where(MediaItem.inventory_number == scan.code))
+    }
+
+def stocktake_counts(stocktake):
+    counts = {name: query.order_by(None).count() for name, query in stocktake_sets(stocktake).items()}
+    counts['scans'] = stocktake.scans.count()
+    return counts
+
+def correct_misplaced(stocktake):
+    """
+    Moves every misplaced item to the location it was scanned in (the subtree root if the scan
+    had no location) with a single UPDATE. Returns the number of moved items.
+    """
+    ids = stocktake_sets(stocktake)['misplaced'].with_entities(MediaItem.id).subquery()
+    target = select(func.coalesce(StocktakeScan.location_id, stocktake.location_id)) \
+        .where(StocktakeScan.stocktake_id == stocktake.id, StocktakeScan.code == MediaItem.inventory_number) \
+        .scalar_subquery()
+    return MediaItem.query.filter(MediaItem.id.in_(select(ids.c.id))) \
+        .update({MediaItem.location_id: target}, synchronize_session=False)
@@ -0,0 +1,38 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, init_db
+from extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh database, with instance, upload and backup folders in tmp_path."""
+    instance = tmp_path / 'instance'
+    instance.mkdir()
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{instance / 'inventory.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'BACKUP_FOLDER': str(tmp_path / 'backups'),
+    })
+    app.instance_path = str(instance)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    with app.app_context():
+        init_db()
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the default admin."""
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
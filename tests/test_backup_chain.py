@@ -0,0 +1,100 @@
+import os
+import types
+import datetime
+import zipfile
+import pytest
+import backup_chain
+from backup_chain import (create_incremental_backup, backup_chain as chain_of, verify_backup,
+                          restore_incremental_backup, read_manifest, list_backups)
+from extensions import db
+from models import MediaItem
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """One second per backup, so archive names never collide."""
+    now = [datetime.datetime(2026, 1, 1, 3, 0, 0)]
+
+    class Clock(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            now[0] += datetime.timedelta(seconds=1)
+            return now[0]
+
+    monkeypatch.setattr(backup_chain, 'datetime', types.SimpleNamespace(datetime=Clock))
+
+
+def write_image(app, rel, data):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def add_item(title):
+    db.session.add(MediaItem(inventory_number=title, title=title, category='CD', user_id=1))
+    db.session.commit()
+
+
+def titles():
+    db.session.remove()
+    return sorted(item.title for item in MediaItem.query)
+
+
+def test_chain_manifests(app):
+    with app.app_context():
+        write_image(app, 'a.jpg', b'a' * 100)
+        write_image(app, 'covers/b.jpg', b'b' * 100)
+        full = create_incremental_backup()
+        write_image(app, 'c.jpg', b'c')
+        write_image(app, 'a.jpg', b'A' * 100)  # Changed content, same size
+        os.utime(os.path.join(app.config['UPLOAD_FOLDER'], 'a.jpg'), (1600000000, 1600000000))
+        incremental = create_incremental_backup()
+
+        assert full['name'].endswith('_full.zip') and full['base'] is None and full['added'] == 2
+        assert incremental['name'].endswith('_incremental.zip') and incremental['base'] == full['name']
+        assert incremental['added'] == 2
+        files = incremental['files']
+        assert files['covers/b.jpg']['archive'] == full['name']
+        assert files['a.jpg']['archive'] == files['c.jpg']['archive'] == incremental['name']
+        assert files['a.jpg']['sha256'] != full['files']['a.jpg']['sha256']
+        assert read_manifest(incremental['name']) == incremental
+        with zipfile.ZipFile(os.path.join(app.config['BACKUP_FOLDER'], incremental['name'])) as zipf:
+            assert sorted(zipf.namelist()) == ['database.sqlite', 'manifest.json', 'uploads/a.jpg', 'uploads/c.jpg']
+
+        assert chain_of(incremental['name'])[1] == [full['name'], incremental['name']]
+        assert verify_backup(incremental['name']) == []
+        assert create_incremental_backup(full=True)['added'] == 3
+        assert len(list_backups()) == 3
+
+
+def test_verify_reports_missing_archive(app):
+    with app.app_context():
+        write_image(app, 'a.jpg', b'a')
+        full = create_incremental_backup()
+        incremental = create_incremental_backup()
+        assert incremental['added'] == 0
+        os.remove(os.path.join(app.config['BACKUP_FOLDER'], full['name']))
+        assert verify_backup(incremental['name']) == [f"{full['name']}: missing (1 files)"]
+        with pytest.raises(Exception, match='cannot be restored'):
+            restore_incremental_backup(incremental['name'])
+
+
+def test_restore_from_middle_of_chain(app):
+    with app.app_context():
+        write_image(app, 'a.jpg', b'first')
+        add_item('One')
+        create_incremental_backup()
+        write_image(app, 'b.jpg', b'second')
+        add_item('Two')
+        middle = create_incremental_backup()
+        write_image(app, 'a.jpg', b'third!')
+        add_item('Three')
+        create_incremental_backup()
+        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'b.jpg'))
+
+        restore_incremental_backup(middle['name'])
+        assert titles() == ['One', 'Two']
+        for rel, data in (('a.jpg', b'first'), ('b.jpg', b'second')):
+            with open(os.path.join(app.config['UPLOAD_FOLDER'], rel), 'rb') as f:
+                assert f.read() == data
@@ -0,0 +1,135 @@
+import os
+import time
+import types
+from datetime import datetime, timedelta
+import pytest
+import backup_chain
+from backup_chain import backup_folder, create_incremental_backup, list_backups, verify_backup
+from backup_schedule import (parse_cron, cron_matches, next_run, select_retained, prune_backups, run_backup,
+                             read_status, STALE_TEMP_AGE)
+
+
+def test_parse_cron_forms():
+    minute, hour, day, month, weekday = parse_cron('*/15 3 1-5,20 * 7')
+    assert minute == {0, 15, 30, 45}
+    assert hour == {3}
+    assert day == {1, 2, 3, 4, 5, 20}
+    assert len(month) == 12
+    assert weekday == {0}
+    assert parse_cron('5/20 * * * *')[0] == {5, 25, 45}
+    assert parse_cron('* * * * 5-7')[4] == {5, 6, 0}
+
+
+@pytest.mark.parametrize('expr', [
+    '', '* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *', '* * * * 8',
+    '5-1 * * * *', 'x * * * *',
+    '0 0 30 2 *',      # 30 February
+    '0 0 31 4,6 *',    # 31 April/June
+])
+def test_parse_cron_rejects(expr):
+    with pytest.raises(ValueError):
+        parse_cron(expr)
+
+
+def test_restricted_weekday_allows_impossible_day():
+    # Day or weekday: 30 February never occurs, but every Monday in February does
+    assert next_run(parse_cron('0 0 30 2 1'), datetime(2026, 10, 19)) == datetime(2027, 2, 1)
+
+
+def test_next_run():
+    after = datetime(2026, 10, 19, 3, 30, 20)  # A Monday
+    assert next_run(parse_cron('30 3 * * *'), after) == datetime(2026, 10, 20, 3, 30)
+    assert next_run(parse_cron('31 3 * * *'), after) == datetime(2026, 10, 19, 3, 31)
+    assert next_run(parse_cron('0 4 * * 0'), after) == datetime(2026, 10, 25, 4, 0)
+    assert next_run(parse_cron('0 0 1 1 *'), after) == datetime(2027, 1, 1)
+    assert next_run(parse_cron('0 0 29 2 *'), after) == datetime(2028, 2, 29)
+    assert next_run(parse_cron('0 0 29 2 1'), after) == datetime(2027, 2, 1)
+
+
+def test_next_run_matches_minute_search():
+    fields = parse_cron('10,40 1,13 */10 * 2-3')
+    moment = datetime(2026, 12, 30, 12, 0)
+    expected = moment + timedelta(minutes=1)
+    while not cron_matches(fields, expected):
+        expected += timedelta(minutes=1)
+    assert next_run(fields, moment) == expected
+
+
+def test_select_retained():
+    start = datetime(2026, 1, 1, 3, 0)
+    names = [f"backup_{(start + timedelta(days=d)).strftime('%Y-%m-%d_%H-%M-%S')}_full.zip" for d in range(100)]
+    names.append(names[-1].replace('03-00-00', '15-00-00'))  # Second run on the last day
+    keep = select_retained(names, daily=3, weekly=2, monthly=3)
+    assert sorted(keep) == sorted([
+        'backup_2026-04-10_15-00-00_full.zip', 'backup_2026-04-09_03-00-00_full.zip',
+        'backup_2026-04-08_03-00-00_full.zip',   # Daily
+        'backup_2026-04-05_03-00-00_full.zip',   # Last of the previous ISO week
+        'backup_2026-03-31_03-00-00_full.zip',   # Last of March
+        'backup_2026-02-28_03-00-00_full.zip'])  # Last of February
+    assert select_retained(names, 0, 0, 0) == {'backup_2026-04-10_15-00-00_full.zip'}
+
+
+def test_run_backup(app):
+    with app.app_context():
+        run = run_backup(trigger='manual', slot='2026-10-19T03:30:00')
+        assert run['status'] == 'ok' and run['archive'].endswith('_full.zip')
+        assert run_backup(slot='2026-10-19T03:30:00') is None  # Slot taken
+        assert read_status()['runs'][0]['archive'] == run['archive']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [None]
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0]
+
+    def set_time(moment):
+        now[0] = moment
+    monkeypatch.setattr(backup_chain, 'datetime', types.SimpleNamespace(datetime=Clock))
+    return set_time
+
+
+def test_prune_keeps_chains_of_retained_archives(app, clock):
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    def backup(moment, full=False, add=(), remove=()):
+        for name in add:
+            with open(os.path.join(upload_folder, name), 'wb') as f:
+                f.write(name.encode() * 100)
+        for name in remove:
+            os.remove(os.path.join(upload_folder, name))
+        clock(moment)
+        return create_incremental_backup(full=full)['name']
+
+    with app.app_context():
+        folder = backup_folder()
+        full_1 = backup(datetime(2026, 10, 18, 3), add=['a.jpg'])
+        inc_1 = backup(datetime(2026, 10, 18, 4), add=['b.jpg'])
+        full_2 = backup(datetime(2026, 10, 19, 3), full=True)
+        inc_2a = backup(datetime(2026, 10, 19, 4), add=['x.jpg'])
+        inc_2b = backup(datetime(2026, 10, 19, 5), add=['y.jpg'])
+        assert inc_2b.endswith('_incremental.zip') and full_2.endswith('_full.zip')
+
+        stale, fresh = os.path.join(folder, 'old.tmp'), os.path.join(folder, 'new.sqlite')
+        for path in (stale, os.path.join(folder, 'old.sqlite'), fresh, os.path.join(folder, 'notes.txt')):
+            open(path, 'w').close()
+        day_old = time.time() - STALE_TEMP_AGE - 60
+        for path in (stale, os.path.join(folder, 'old.sqlite'), os.path.join(folder, 'notes.txt')):
+            os.utime(path, (day_old, day_old))
+
+        # Two days kept: the newest archive of each day, with the full bases they build on
+        assert prune_backups(2, 0, 0) == []
+        # One day: the newest archive with its full base and the incremental holding x.jpg
+        assert prune_backups(1, 0, 0) == [full_1, inc_1]
+        assert list_backups() == [full_2, inc_2a, inc_2b]
+        # Leftovers of interrupted runs go after a day, other files stay
+        assert sorted(name for name in os.listdir(folder) if not name.startswith('backup_')) == ['new.sqlite', 'notes.txt']
+
+        # x.jpg deleted: the incremental that only held it is no longer needed
+        inc_2c = backup(datetime(2026, 10, 19, 6), remove=['x.jpg'])
+        assert backup_chain.backup_chain(inc_2c)[1] == [full_2, inc_2b, inc_2c]
+        assert prune_backups(1, 0, 0) == [inc_2a]
+        assert verify_backup(inc_2c) == []
@@ -0,0 +1,32 @@
+import pytest
+from models import normalize_barcode
+
+
+@pytest.mark.parametrize('code, key', [
+    ('0-306-40615-2', '9780306406157'),    # ISBN-10
+    ('080442957X', '9780804429573'),       # ISBN-10 with X check digit
+    ('978-0-306-40615-7', '9780306406157'),
+    ('036000291452', '0036000291452'),     # UPC-A
+    ('96385074', '0000096385074'),         # EAN-8
+    ('00036000291452', '0036000291452'),   # GTIN-14
+    ('10036000291459', '10036000291459'),  # GTIN-14 with packaging indicator stays
+    (' abc-123 x ', 'ABC123X'),
+    ('0306406153', '0306406153'),          # Invalid ISBN-10 check digit: no conversion
+    ('', None),
+    (None, None),
+    (' - ', None),
+])
+def test_normalize_barcode(code, key):
+    assert normalize_barcode(code) == key
+
+
+def test_barcode_key_follows_barcode(app, client):
+    client.post('/media/create', data={'title': 'Dune', 'category': 'Buch', 'barcode': '0-306-40615-2'})
+    r = client.post('/api/check_duplicates', json={'codes': ['9780306406157', '0306406152', '4006381333931']})
+    found = r.get_json()['duplicates']
+    assert set(found) == {'9780306406157', '0306406152'}
+    assert found['0306406152'][0]['title'] == 'Dune'
+
+
+def test_check_duplicates_rejects_invalid_batch(client):
+    assert client.post('/api/check_duplicates', json={'codes': 'x'}).status_code == 400
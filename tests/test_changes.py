@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import pytest
+import changes
+from changes import changes_since, prune_tombstones, min_cursor
+from extensions import db
+from models import ApiToken, ChangeTombstone, Location, MediaItem, Track, User
+
+
+@pytest.fixture
+def api(app):
+    with app.app_context():
+        token, plaintext = ApiToken.issue('test', db.session.get(User, 1))
+        db.session.add(token)
+        db.session.commit()
+    client = app.test_client()
+    return lambda since: client.get(f'/api/v1/changes?since={since}', headers={'Authorization': f'Bearer {plaintext}'})
+
+
+def add_item(title):
+    item = MediaItem(inventory_number=title, title=title, category='CD', user_id=1, location_id=1)
+    item.tracks.append(Track(position=1, title='Intro'))
+    db.session.add(item)
+    db.session.commit()
+    return item.id
+
+
+def test_changes_carry_updated_at(app):
+    with app.app_context():
+        add_item('One')
+        feed = changes_since(0)
+    for table in ('location', 'media_item', 'track'):
+        fields, rows = feed['tables'][table]['fields'], feed['tables'][table]['rows']
+        assert 'updated_at' in fields and rows
+        assert all(row[fields.index('updated_at')] for row in rows)
+
+
+def test_deletions_and_cursor(app):
+    with app.app_context():
+        item_id = add_item('One')
+        cursor = changes_since(0)['cursor']
+        db.session.delete(db.session.get(MediaItem, item_id))
+        db.session.commit()
+        feed = changes_since(cursor)
+    assert feed['deleted']['media_item'] == [item_id]
+    assert len(feed['deleted']['track']) == 1
+    assert feed['cursor'] > cursor and not feed['more']
+
+
+def test_prune_tombstones_raises_min_cursor(app, api, monkeypatch):
+    with app.app_context():
+        first, second = add_item('One'), add_item('Two')
+        cursor = changes_since(0)['cursor']
+        for item_id in (first, second):
+            db.session.delete(db.session.get(MediaItem, item_id))
+            db.session.commit()
+        tombstones = ChangeTombstone.query.order_by(ChangeTombstone.row_version).all()
+        old_version = max(t.row_version for t in tombstones if t.table_name == 'media_item' and t.row_id == first)
+        for tombstone in tombstones:
+            if tombstone.row_version <= old_version:
+                tombstone.deleted_at = datetime.utcnow() - timedelta(days=changes.TOMBSTONE_RETENTION_DAYS + 1)
+        db.session.commit()
+
+        assert prune_tombstones() == 2  # Item and its track
+        assert prune_tombstones() == 0
+        assert min_cursor() == old_version
+        assert [t.row_id for t in ChangeTombstone.query if t.table_name == 'media_item'] == [second]
+
+    # The cursor from before the pruned deletions must resync; newer and fresh ones are served
+    monkeypatch.setattr(changes, '_last_prune', None)
+    assert api(cursor).status_code == 410
+    assert api(old_version).get_json()['deleted']['media_item'] == [second]
+    r = api(0)
+    assert r.status_code == 200 and r.get_json()['tables']['location']['rows']
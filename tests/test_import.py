@@ -0,0 +1,75 @@
+import csv
+import pytest
+from import_utils import iter_rows, map_columns, parse_tracks, run_import_job
+from models import MediaItem
+
+
+def write(tmp_path, name, text, encoding='utf-8'):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+@pytest.mark.parametrize('text', [
+    'title;category\nAbbey Road;CD\nDune;Buch\n',
+    'title,category\nAbbey Road,CD\nDune,Buch\n',
+    '﻿title;category\r\nAbbey Road;CD\r\nDune;Buch\r\n',
+    '﻿title,category\nAbbey Road,CD\nDune,Buch\n',
+])
+def test_iter_rows_sniffs_delimiter_and_strips_bom(tmp_path, text):
+    rows = list(iter_rows(write(tmp_path, 'import.csv', text)))
+    assert rows == [['title', 'category'], ['Abbey Road', 'CD'], ['Dune', 'Buch']]
+
+
+def test_iter_rows_quoted_delimiters(tmp_path):
+    text = 'title;author_artist\n"Hello; World";"Smith, John"\n'
+    assert list(iter_rows(write(tmp_path, 'import.csv', text)))[1] == ['Hello; World', 'Smith, John']
+
+
+def test_iter_rows_fallback_keeps_csv_excel(tmp_path):
+    # A single column gives the sniffer nothing to detect: ';' is assumed
+    assert list(iter_rows(write(tmp_path, 'import.csv', 'title\nAbbey Road\n'))) == [['title'], ['Abbey Road']]
+    assert csv.excel.delimiter == ','
+
+
+def test_iter_rows_xlsx(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    wb = openpyxl.Workbook()
+    wb.active.append(['title', 'release_year'])
+    wb.active.append(['Abbey Road', 1969])
+    path = str(tmp_path / 'import.xlsx')
+    wb.save(path)
+    assert list(iter_rows(path)) == [['title', 'release_year'], ['Abbey Road', 1969]]
+
+
+def test_map_columns_accepts_translated_labels():
+    mapping, ignored = map_columns(['Titel', 'category', 'Unknown'])
+    assert mapping == ['title', 'category', None]
+    assert ignored == ['Unknown']
+
+
+def test_parse_tracks():
+    assert parse_tracks('1. Come Together (4:20) | 2. Something') == [
+        {'position': 1, 'title': 'Come Together', 'duration': '4:20'},
+        {'position': 2, 'title': 'Something', 'duration': None}]
+
+
+def run_import(app, path, dry_run=False):
+    with app.app_context():
+        return run_import_job('test', lambda *a, **k: None, path, 1, 1, True, dry_run)
+
+
+def test_import_creates_items(app, tmp_path):
+    path = write(tmp_path, 'import.csv', 'title;category;location\nAbbey Road;CD;Keller > Regal\nDune;Nope;\n')
+    report = run_import(app, path)
+    assert (report['rows'], report['created'], report['errors'], report['locations_created']) == (2, 1, 1, 2)
+    with app.app_context():
+        item = MediaItem.query.one()
+        assert (item.title, item.category, item.location.full_path) == ('Abbey Road', 'CD', 'Keller > Regal')
+
+
+def test_import_dry_run_writes_nothing(app, tmp_path):
+    report = run_import(app, write(tmp_path, 'import.csv', 'title;category\nAbbey Road;CD\n'), dry_run=True)
+    assert report['created'] == 1
+    with app.app_context():
+        assert MediaItem.query.count() == 0
@@ -0,0 +1,98 @@
+import time
+import jobs
+from jobs import create_job, start_job, get_job, update_job, JOB_INTERRUPTED, JOB_STALE
+
+
+def wait_for(job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = get_job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result_and_progress(app):
+    def count(job_id, progress, n):
+        for i in range(n):
+            progress(i + 1, n, force=True)
+        return {'counted': n}
+
+    with app.app_context():
+        job = create_job('test', user_id=1, n=3)
+        assert get_job(job['id'])['status'] == 'queued'
+        start_job(job, count, 3).join()
+        job = wait_for(job['id'])
+    assert job['status'] == 'done'
+    assert job['result'] == {'counted': 3}
+    assert (job['progress'], job['total']) == (3, 3)
+    assert job['finished_at']
+
+
+def test_failed_job_keeps_message(app):
+    def fail(job_id, progress):
+        raise ValueError('broken input')
+
+    with app.app_context():
+        job = create_job('test')
+        start_job(job, fail).join()
+        job = wait_for(job['id'])
+    assert job['status'] == 'failed'
+    assert job['message'] == 'broken input'
+
+
+def test_get_job_rejects_foreign_ids(app):
+    with app.app_context():
+        assert get_job('../../etc/passwd') is None
+        assert get_job('') is None
+        assert update_job('0' * 32, status='done') is None
+
+
+def test_export_job_writes_artifact(app, client):
+    client.post('/media/create', data={'title': 'Abbey Road', 'category': 'CD'})
+    r = client.post('/media/export_job', data={'fields': ['title', 'category'], 'format': 'csv'})
+    assert r.status_code == 302
+    job_id = r.headers['Location'].rstrip('/').rsplit('/', 1)[1]
+    with app.app_context():
+        job = wait_for(job_id)
+    assert job['status'] == 'done'
+    r = client.get(f'/jobs/{job_id}/download')
+    assert r.status_code == 200
+    assert b'Abbey Road' in r.data
+
+
+def test_interrupted_job_reported_failed(app):
+    with app.app_context():
+        job = create_job('test')
+        update_job(job['id'], status='running')
+        assert get_job(job['id'])['status'] == 'running'
+
+        # Worker process gone (replaced on reload, recycled or crashed)
+        update_job(job['id'], pid=2 ** 22 + 1)
+        job = get_job(job['id'])
+        assert (job['status'], job['message']) == ('failed', JOB_INTERRUPTED)
+        assert job['finished_at']
+
+        # Process unknown here (other host), heartbeat stale
+        update_job(job['id'], host='elsewhere', heartbeat=time.time() - JOB_STALE - 1)
+        assert get_job(job['id'])['status'] == 'failed'
+        update_job(job['id'], heartbeat=time.time())
+        assert get_job(job['id'])['status'] == 'running'
+
+
+def test_heartbeat_keeps_quiet_job_alive(app, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_HEARTBEAT', 0.05)
+    monkeypatch.setattr(jobs, 'JOB_STALE', 0.5)
+
+    def quiet(job_id, progress):
+        time.sleep(1)  # No progress reports
+        return {'ok': True}
+
+    with app.app_context():
+        job = create_job('test')
+        thread = start_job(job, quiet)
+        time.sleep(0.8)
+        assert get_job(job['id'])['status'] == 'running'
+        thread.join()
+        assert get_job(job['id'])['status'] == 'done'
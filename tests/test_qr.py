@@ -0,0 +1,40 @@
+import os
+from types import SimpleNamespace
+import qr_utils
+from qr_utils import qr_matrix, with_qr_matrices, get_qr_svgs, get_qr_code
+
+
+def test_matrices_per_chunk_from_cache(app, monkeypatch):
+    items = [None] + [SimpleNamespace(inventory_number=f'INV-{i}') for i in range(5)]
+    encoded = []
+    monkeypatch.setattr(qr_utils, '_render_batch', 
+                        lambda render, values: (encoded.append(values) if values else None) or [render(v) for v in values])
+    with app.app_context():
+        iterator, lookup = with_qr_matrices(iter(items), chunk_size=4)
+        for item in iterator:
+            if item is not None:
+                assert lookup(item.inventory_number) == qr_matrix(item.inventory_number)
+        assert encoded == [['INV-0', 'INV-1', 'INV-2'], ['INV-3', 'INV-4']]
+        assert len(os.listdir(os.path.join(app.instance_path, 'qrcache'))) == 5
+
+        # Second run: everything from the disk cache
+        iterator, lookup = with_qr_matrices(iter(items))
+        assert [lookup(item.inventory_number) for item in iterator if item] == [qr_matrix(i.inventory_number) for i in items[1:]]
+        assert len(encoded) == 2
+
+
+def test_svg_batch_matches_single_render(app):
+    with app.app_context():
+        svgs = get_qr_svgs(['A', 'B', 'A'])
+        assert list(svgs) == ['A', 'B']
+        assert svgs['A'].encode('utf-8') == get_qr_code('A', 'svg')
+
+
+def test_pdf_labels(client):
+    client.post('/media/create', data={'title': 'Abbey Road', 'category': 'CD'})
+    data = {'item_ids': ['1'], 'show_id': 'on', 'output': 'pdf'}
+    plain = client.post('/labels/print', data=data)
+    with_qr = client.post('/labels/print', data=data | {'show_qr': 'on'})
+    assert plain.status_code == with_qr.status_code == 200
+    assert with_qr.data.startswith(b'%PDF')
+    assert len(with_qr.data) > len(plain.data) + 100  # QR code drawn as rectangles
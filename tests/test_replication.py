@@ -0,0 +1,112 @@
+import os
+import struct
+import sqlite3
+import datetime
+import pytest
+import replication
+from replication import WalReplicator, scan_frames, restore_replica, list_generations, CHECKPOINT_FRAMES
+
+
+def frame(page_size, salts, commit_size=0, page_number=1):
+    return struct.pack('>II', page_number, commit_size) + salts + b'\0' * 8 + b'p' * page_size
+
+
+def test_scan_frames():
+    salts = b'SALTSALT'
+    header = b'\0' * 8 + struct.pack('>I', 512) + b'\0' * 4 + salts + b'\0' * 8
+    size = 24 + 512
+    committed = frame(512, salts) + frame(512, salts, commit_size=2)
+    assert scan_frames(header, committed) == 2 * size
+    assert scan_frames(header, committed + frame(512, salts)) == 2 * size  # Open transaction
+    assert scan_frames(header, committed + frame(512, b'OLDSALTS', commit_size=3)) == 2 * size
+    assert scan_frames(header, committed + b'partial') == 2 * size
+    assert scan_frames(header, b'') == 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [datetime.datetime(2026, 10, 19, 10, 0, 0)]
+
+    class Clock(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0]
+
+    def advance(**kwargs):
+        now[0] += datetime.timedelta(**kwargs)
+        return now[0]
+    monkeypatch.setattr(replication, 'datetime', Clock)
+    return advance
+
+
+@pytest.fixture
+def live(tmp_path):
+    """WAL database that only the replicator checkpoints, as with REPLICA_DIR set."""
+    path = str(tmp_path / 'live.db')
+    con = sqlite3.connect(path, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA wal_autocheckpoint=0")
+    con.execute("CREATE TABLE user (id INTEGER PRIMARY KEY)")
+    con.execute("CREATE TABLE media_item (id INTEGER PRIMARY KEY, title TEXT)")
+    yield path, con
+    con.close()
+
+
+def insert(con, count=1, size=10):
+    con.executemany("INSERT INTO media_item (title) VALUES (?)", [('x' * size,)] * count)
+
+
+def restored_count(replica, tmp_path, moment=None):
+    output = str(tmp_path / 'restored.db')
+    restore_replica(replica, output, moment)
+    con = sqlite3.connect(output)
+    try:
+        return con.execute("SELECT COUNT(*) FROM media_item").fetchone()[0]
+    finally:
+        con.close()
+
+
+def test_replicate_and_restore_point_in_time(app, tmp_path, live, clock):
+    path, con = live
+    replica = str(tmp_path / 'replica')
+    os.makedirs(replica)
+    replicator = WalReplicator(path, replica, datetime.timedelta(hours=1), datetime.timedelta(days=1))
+    with app.app_context():
+        insert(con)
+        replicator.start()
+        points = []
+        for count in (2, 3, 4):
+            clock(minutes=1)
+            insert(con)
+            assert replicator.sync() > 0
+            points.append((clock(seconds=30), count))
+        assert replicator.sync() == 0  # Nothing new
+
+        # Big transaction: the replicator checkpoints, the WAL restarts, same generation
+        clock(minutes=1)
+        insert(con, CHECKPOINT_FRAMES + 10, size=3000)
+        replicator.sync()
+        assert replicator.state['complete']
+        clock(minutes=1)
+        insert(con)
+        replicator.sync()
+        points.append((clock(seconds=30), CHECKPOINT_FRAMES + 15))
+        assert len(list_generations(replica)) == 1
+
+        for moment, count in points:
+            assert restored_count(replica, tmp_path, moment) == count
+        assert restored_count(replica, tmp_path, datetime.datetime(2026, 10, 19, 10, 0, 30)) == 1
+        assert restored_count(replica, tmp_path) == CHECKPOINT_FRAMES + 15
+        with pytest.raises(Exception, match='No replica generation'):
+            restore_replica(replica, str(tmp_path / 'x.db'), datetime.datetime(2026, 10, 19, 9, 0))
+
+        # Checkpoint by someone else before the frames were copied: new generation
+        clock(minutes=1)
+        insert(con)
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        insert(con)
+        clock(minutes=1)
+        replicator.sync()
+        assert len(list_generations(replica)) == 2
+        assert restored_count(replica, tmp_path) == CHECKPOINT_FRAMES + 17
+        replicator.close()
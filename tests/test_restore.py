@@ -0,0 +1,135 @@
+import os
+import json
+import zipfile
+import pytest
+import backup_utils
+from backup_utils import (snapshot_database, run_restore_job, restore_database_file, recover_interrupted_restore,
+                          keep_previous_database, database_path)
+from extensions import db
+from models import MediaItem
+
+
+def progress(*args, **kwargs):
+    pass
+
+
+def add_item(title):
+    db.session.add(MediaItem(inventory_number=title, title=title, category='CD', user_id=1))
+    db.session.commit()
+
+
+def titles():
+    db.session.remove()
+    return sorted(item.title for item in MediaItem.query)
+
+
+def image(app, rel):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], rel)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_image(app, rel, data):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.fixture
+def archive(app, tmp_path):
+    """Backup ZIP with items 'Old' and cover.jpg = b'old'; the live state then has 'New'
+    and cover.jpg = b'new' plus new.jpg."""
+    path = str(tmp_path / 'backup.zip')
+    with app.app_context():
+        add_item('Old')
+        snapshot = snapshot_database(str(tmp_path / 'snapshot.sqlite'))
+        with zipfile.ZipFile(path, 'w') as zipf:
+            zipf.write(snapshot, 'database.sqlite')
+            zipf.writestr('uploads/cover.jpg', b'old')
+            zipf.writestr('uploads/sub/extra.jpg', b'extra-data')
+        add_item('New')
+        write_image(app, 'cover.jpg', b'new')
+        write_image(app, 'new.jpg', b'kept')
+    return path
+
+
+def assert_unchanged(app):
+    assert titles() == ['New', 'Old']
+    assert (image(app, 'cover.jpg'), image(app, 'new.jpg'), image(app, 'sub/extra.jpg')) == (b'new', b'kept', None)
+    assert not os.path.exists(database_path() + '.restoring')
+    assert [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.startswith('.')] == []
+
+
+def test_restore_job(app, archive):
+    with app.app_context():
+        assert run_restore_job('job', progress, archive) == {'images': 2, 'database': 'database.sqlite'}
+        assert titles() == ['Old']
+        assert (image(app, 'cover.jpg'), image(app, 'new.jpg'), image(app, 'sub/extra.jpg')) == (b'old', b'kept', b'extra-data')
+        assert not os.path.exists(archive)
+        assert not os.path.exists(database_path() + '.restoring')
+
+
+def test_failed_migration_rolls_back(app, archive, monkeypatch):
+    def fail():
+        raise RuntimeError('migration failed')
+    monkeypatch.setattr(backup_utils, 'upgrade_database', fail)
+    with app.app_context():
+        with pytest.raises(RuntimeError, match='migration failed'):
+            run_restore_job('job', progress, archive)
+        assert_unchanged(app)
+
+
+def test_corrupt_image_leaves_state_unchanged(app, archive):
+    with open(archive, 'r+b') as f:
+        data = f.read()
+        f.seek(data.rindex(b'extra-data'))
+        f.write(b'EXTRA-DATA')  # CRC mismatch on extraction
+    with app.app_context():
+        with pytest.raises(zipfile.BadZipFile):
+            run_restore_job('job', progress, archive)
+        assert_unchanged(app)
+
+
+@pytest.mark.parametrize('member', ['uploads/../evil.jpg', 'uploads/a/../../evil.jpg', 'uploads/C:x.jpg'])
+def test_path_traversal_rejected(app, archive, member):
+    with zipfile.ZipFile(archive, 'a') as zipf:
+        zipf.writestr(member, b'evil')
+    with app.app_context():
+        with pytest.raises(Exception, match='Invalid path'):
+            run_restore_job('job', progress, archive)
+        assert_unchanged(app)
+    assert not os.path.exists(os.path.join(os.path.dirname(app.config['UPLOAD_FOLDER']), 'evil.jpg'))
+
+
+def test_invalid_database_rejected(app, tmp_path):
+    path = str(tmp_path / 'broken.sqlite')
+    with open(path, 'wb') as f:
+        f.write(b'not a database' * 100)
+    with app.app_context():
+        add_item('Live')
+        with pytest.raises(Exception, match='Invalid database'):
+            restore_database_file(path)
+        assert titles() == ['Live']
+
+
+def test_recover_interrupted_restore(app, archive):
+    with app.app_context():
+        assert recover_interrupted_restore() is False
+        # State of a restore killed after the images were swapped and the database copied
+        upload_folder = app.config['UPLOAD_FOLDER']
+        state = {'backup': keep_previous_database(), 'database': True, 'images': ['cover.jpg', 'sub/extra.jpg'],
+                 'upload_folder': upload_folder, 'staging': os.path.join(upload_folder, '.restore-x'),
+                 'rollback': os.path.join(upload_folder, '.rollback-x')}
+        with open(database_path() + '.restoring', 'w') as f:
+            json.dump(state, f)
+        write_image(app, '.rollback-x/cover.jpg', b'new')
+        write_image(app, 'cover.jpg', b'old')
+        write_image(app, 'sub/extra.jpg', b'extra-data')
+        backup_utils._copy_into_live(os.path.join(os.path.dirname(archive), 'snapshot.sqlite'))
+        assert titles() == ['Old']
+
+        assert recover_interrupted_restore() is True
+        assert_unchanged(app)
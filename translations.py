@@ -251,6 +251,110 @@ TRANSLATIONS = {
         'export': 'Export',
         'export_excel': 'Excel Export',
         'export_format': 'Export Format',
+        'output_format': 'Output',
+        'output_html': 'Browser preview (print dialog)',
+        'output_pdf': 'PDF (vector, exact size)',
+        'page_size': 'Page Size',
+        'page_size_label': 'One label per page (roll printer)',
+        'pdf_download': 'PDF Download',
+        'export_all_matching': 'Export all matching',
+        'export_job_hint': 'All items matching the current filter are exported in the background. You can download the file as soon as the job has finished.',
+        'job_status': 'Background Job',
+        'job_export': 'Export',
+        'job_queued': 'Queued',
+        'job_running': 'Running...',
+        'job_done': 'Finished',
+        'job_failed': 'Failed',
+        'download': 'Download',
+        'job_import': 'Import',
+        'import_items': 'Import Items',
+        'import_desc': 'Import items from a CSV or Excel file. The columns are the same as in the export, so exported files can be imported again.',
+        'import_file': 'File (.csv or .xlsx)',
+        'import_columns_hint': 'Recognized columns (field name or column title in any language):',
+        'import_default_location': 'Location for rows without location',
+        'import_create_locations': 'Create missing locations',
+        'import_dry_run': 'Dry run (only check, do not save anything)',
+        'import_submit': 'Start Import',
+        'select_all_matching': 'All matching',
+        'change_category': '-- Change category to... --',
+        'mark_lent': 'Lend',
+        'mark_returned': 'Returned',
+        'confirm_bulk_delete': 'Really delete the selected items irrevocably?',
+        'items_updated': 'items updated.',
+        'items_deleted': 'items deleted.',
+        'api_tokens': 'API Tokens',
+        'api_tokens_hint': 'Tokens for scanner apps and other clients of the JSON API (/api/v1). Send them as "Authorization: Bearer <token>".',
+        'api_token_name': 'Name (e.g. Scanner Basement)',
+        'api_token_create': 'Create Token',
+        'api_token_created': 'Token created. Copy it now, it will not be shown again:',
+        'api_token_last_used': 'Last used',
+        'really_revoke_token': 'Really revoke this token?',
+        'stocktake': 'Stocktake',
+        'stocktake_started': 'Started',
+        'status': 'Status',
+        'stocktake_open': 'Open',
+        'stocktake_closed': 'Closed',
+        'really_delete_stocktake': 'Really delete this stocktake and all its scans?',
+        'no_stocktakes': 'No stocktakes yet.',
+        'new_stocktake': 'New stocktake',
+        'stocktake_location_hint': 'All locations below this one are audited.',
+        'start_stocktake': 'Start scanning',
+        'stocktake_scans': 'scans',
+        'stocktake_scan_location': 'Scanning at',
+        'stocktake_anywhere': 'Anywhere',
+        'stocktake_scan_hint': 'Scan or type inventory number + Enter',
+        'stocktake_pending': 'Not yet sent',
+        'stocktake_offline': 'Connection lost - scans are kept and sent again.',
+        'stocktake_report': 'Report',
+        'stocktake_continue': 'Continue scanning',
+        'stocktake_close': 'Close stocktake',
+        'stocktake_found': 'Found',
+        'stocktake_misplaced': 'Misplaced',
+        'stocktake_missing': 'Missing',
+        'stocktake_unknown': 'Unknown codes',
+        'stocktake_correct': 'Move to scanned location',
+        'stocktake_correct_confirm': 'Move all misplaced items to the location they were scanned at?',
+        'stocktake_list_limit': 'Lists show at most',
+        'duplicate_candidates': 'Possible duplicates',
+        'duplicate_candidates_desc': 'Finds items with similar title/artist, also without barcode',
+        'min_similarity': 'Minimum similarity',
+        'similarity': 'Similarity',
+        'merge': 'Merge',
+        'merge_keep': 'Keep',
+        'really_merge': 'Merge both items? The other item is deleted, its missing details, tracks and lending history are taken over.',
+        'items_merged': 'Items merged.',
+        'merge_both_lent': 'Both items are lent right now. Return one of them before merging.',
+        'no_duplicates': 'No possible duplicates found.',
+        'statistics': 'Statistics',
+        'total_playtime': 'Total playtime',
+        'lending_history': 'Lending history',
+        'loans_total': 'Loans',
+        'loans_returned': 'Returned',
+        'avg_loan_duration': 'Average loan duration',
+        'days': 'days',
+        'top_borrowers': 'Top borrowers',
+        'most_borrowed': 'Most borrowed',
+        'database_tuning': 'Database',
+        'database_tuning_desc': 'SQLite settings of the connections (change with the SQLITE_PRAGMAS environment variable).',
+        'setting': 'Setting',
+        'configured': 'Configured',
+        'active_value': 'Active',
+        'auto_backup': 'Automatic backups',
+        'auto_backup_desc': 'Incremental archives in the backup folder (only new or changed images), pruned by the retention policy. Configured with the BACKUP_* environment variables.',
+        'backup_schedule': 'Schedule',
+        'backup_schedule_off': 'Off',
+        'next_run': 'Next run',
+        'retention': 'Retention',
+        'daily': 'daily',
+        'weekly': 'weekly',
+        'monthly': 'monthly',
+        'backup_archives': 'Archives',
+        'backup_now': 'Back up now',
+        'started_at': 'Started',
+        'archive': 'Archive',
+        'images_added': 'Images added',
+        'job_backup': 'Backup',
+        'job_restore': 'Restore',
     },
     'de': {
         'app_name': 'Oryvian',
@@ -504,6 +608,110 @@ TRANSLATIONS = {
         'export': 'Exportieren',
         'export_excel': 'Excel Export',
         'export_format': 'Export-Format',
+        'output_format': 'Ausgabe',
+        'output_html': 'Browser-Vorschau (Druckdialog)',
+        'output_pdf': 'PDF (Vektor, exakte Größe)',
+        'page_size': 'Seitenformat',
+        'page_size_label': 'Ein Etikett pro Seite (Rollendrucker)',
+        'pdf_download': 'PDF herunterladen',
+        'export_all_matching': 'Alle Treffer exportieren',
+        'export_job_hint': 'Alle Medien, die dem aktuellen Filter entsprechen, werden im Hintergrund exportiert. Die Datei kann heruntergeladen werden, sobald der Vorgang abgeschlossen ist.',
+        'job_status': 'Hintergrundauftrag',
+        'job_export': 'Export',
+        'job_queued': 'Wartend',
+        'job_running': 'Läuft...',
+        'job_done': 'Abgeschlossen',
+        'job_failed': 'Fehlgeschlagen',
+        'download': 'Herunterladen',
+        'job_import': 'Import',
+        'import_items': 'Medien importieren',
+        'import_desc': 'Medien aus einer CSV- oder Excel-Datei importieren. Die Spalten entsprechen denen des Exports, exportierte Dateien können also wieder importiert werden.',
+        'import_file': 'Datei (.csv oder .xlsx)',
+        'import_columns_hint': 'Erkannte Spalten (Feldname oder Spaltentitel in einer beliebigen Sprache):',
+        'import_default_location': 'Standort für Zeilen ohne Standort',
+        'import_create_locations': 'Fehlende Standorte anlegen',
+        'import_dry_run': 'Probelauf (nur prüfen, nichts speichern)',
+        'import_submit': 'Import starten',
+        'select_all_matching': 'Alle Treffer',
+        'change_category': '-- Kategorie ändern zu... --',
+        'mark_lent': 'Verleihen',
+        'mark_returned': 'Zurückgegeben',
+        'confirm_bulk_delete': 'Die ausgewählten Medien wirklich unwiderruflich löschen?',
+        'items_updated': 'Medien aktualisiert.',
+        'items_deleted': 'Medien gelöscht.',
+        'api_tokens': 'API-Tokens',
+        'api_tokens_hint': 'Tokens für Scanner-Apps und andere Clients der JSON-API (/api/v1). Sie werden als "Authorization: Bearer <token>" gesendet.',
+        'api_token_name': 'Name (z.B. Scanner Keller)',
+        'api_token_create': 'Token erstellen',
+        'api_token_created': 'Token erstellt. Jetzt kopieren, er wird nicht noch einmal angezeigt:',
+        'api_token_last_used': 'Zuletzt benutzt',
+        'really_revoke_token': 'Diesen Token wirklich widerrufen?',
+        'stocktake': 'Inventur',
+        'stocktake_started': 'Begonnen',
+        'status': 'Status',
+        'stocktake_open': 'Offen',
+        'stocktake_closed': 'Abgeschlossen',
+        'really_delete_stocktake': 'Diese Inventur samt aller Scans wirklich löschen?',
+        'no_stocktakes': 'Noch keine Inventuren.',
+        'new_stocktake': 'Neue Inventur',
+        'stocktake_location_hint': 'Alle Standorte unterhalb dieses Standorts werden geprüft.',
+        'start_stocktake': 'Scannen starten',
+        'stocktake_scans': 'Scans',
+        'stocktake_scan_location': 'Scanne bei',
+        'stocktake_anywhere': 'Beliebig',
+        'stocktake_scan_hint': 'Inventarnummer scannen oder eingeben + Enter',
+        'stocktake_pending': 'Noch nicht gesendet',
+        'stocktake_offline': 'Verbindung verloren - Scans bleiben erhalten und werden erneut gesendet.',
+        'stocktake_report': 'Auswertung',
+        'stocktake_continue': 'Weiter scannen',
+        'stocktake_close': 'Inventur abschließen',
+        'stocktake_found': 'Gefunden',
+        'stocktake_misplaced': 'Falscher Standort',
+        'stocktake_missing': 'Fehlend',
+        'stocktake_unknown': 'Unbekannte Codes',
+        'stocktake_correct': 'An Scan-Standort verschieben',
+        'stocktake_correct_confirm': 'Alle falsch einsortierten Medien an den Standort verschieben, an dem sie gescannt wurden?',
+        'stocktake_list_limit': 'Listen zeigen höchstens',
+        'duplicate_candidates': 'Mögliche Dubletten',
+        'duplicate_candidates_desc': 'Findet Medien mit ähnlichem Titel/Interpret, auch ohne Barcode',
+        'min_similarity': 'Mindest-Ähnlichkeit',
+        'similarity': 'Ähnlichkeit',
+        'merge': 'Zusammenführen',
+        'merge_keep': 'Behalten',
+        'really_merge': 'Beide Medien zusammenführen? Das andere Medium wird gelöscht, fehlende Angaben, Tracks und Ausleihen werden übernommen.',
+        'items_merged': 'Medien zusammengeführt.',
+        'merge_both_lent': 'Beide Medien sind gerade verliehen. Bitte zuerst eines zurückgeben.',
+        'no_duplicates': 'Keine möglichen Dubletten gefunden.',
+        'statistics': 'Statistik',
+        'total_playtime': 'Gesamtspielzeit',
+        'lending_history': 'Verleih-Historie',
+        'loans_total': 'Ausleihen',
+        'loans_returned': 'Zurückgegeben',
+        'avg_loan_duration': 'Durchschnittliche Leihdauer',
+        'days': 'Tage',
+        'top_borrowers': 'Häufigste Ausleiher',
+        'most_borrowed': 'Am häufigsten verliehen',
+        'database_tuning': 'Datenbank',
+        'database_tuning_desc': 'SQLite-Einstellungen der Verbindungen (änderbar über die Umgebungsvariable SQLITE_PRAGMAS).',
+        'setting': 'Einstellung',
+        'configured': 'Konfiguriert',
+        'active_value': 'Aktiv',
+        'auto_backup': 'Automatische Backups',
+        'auto_backup_desc': 'Inkrementelle Archive im Backup-Ordner (nur neue oder geänderte Bilder), bereinigt nach der Aufbewahrungsregel. Einstellbar über die Umgebungsvariablen BACKUP_*.',
+        'backup_schedule': 'Zeitplan',
+        'backup_schedule_off': 'Aus',
+        'next_run': 'Nächster Lauf',
+        'retention': 'Aufbewahrung',
+        'daily': 'täglich',
+        'weekly': 'wöchentlich',
+        'monthly': 'monatlich',
+        'backup_archives': 'Archive',
+        'backup_now': 'Jetzt sichern',
+        'started_at': 'Gestartet',
+        'archive': 'Archiv',
+        'images_added': 'Neue Bilder',
+        'job_backup': 'Backup',
+        'job_restore': 'Wiederherstellung',
     },
     'es': {
         'app_name': 'Oryvian',
@@ -738,6 +946,110 @@ TRANSLATIONS = {
         'export': 'Exportar',
         'export_excel': 'Exportar a Excel',
         'export_format': 'Formato de exportación',
+        'output_format': 'Salida',
+        'output_html': 'Vista previa en el navegador (diálogo de impresión)',
+        'output_pdf': 'PDF (vectorial, tamaño exacto)',
+        'page_size': 'Tamaño de página',
+        'page_size_label': 'Una etiqueta por página (impresora de rollo)',
+        'pdf_download': 'Descargar PDF',
+        'export_all_matching': 'Exportar todos los resultados',
+        'export_job_hint': 'Todos los elementos que coinciden con el filtro actual se exportan en segundo plano. Puede descargar el archivo en cuanto termine el proceso.',
+        'job_status': 'Tarea en segundo plano',
+        'job_export': 'Exportación',
+        'job_queued': 'En cola',
+        'job_running': 'En curso...',
+        'job_done': 'Terminado',
+        'job_failed': 'Fallido',
+        'download': 'Descargar',
+        'job_import': 'Importación',
+        'import_items': 'Importar elementos',
+        'import_desc': 'Importar elementos desde un archivo CSV o Excel. Las columnas son las mismas que en la exportación, por lo que los archivos exportados se pueden volver a importar.',
+        'import_file': 'Archivo (.csv o .xlsx)',
+        'import_columns_hint': 'Columnas reconocidas (nombre del campo o título de columna en cualquier idioma):',
+        'import_default_location': 'Ubicación para filas sin ubicación',
+        'import_create_locations': 'Crear ubicaciones que falten',
+        'import_dry_run': 'Simulación (solo comprobar, no guardar nada)',
+        'import_submit': 'Iniciar importación',
+        'select_all_matching': 'Todos los resultados',
+        'change_category': '-- Cambiar categoría a... --',
+        'mark_lent': 'Prestar',
+        'mark_returned': 'Devuelto',
+        'confirm_bulk_delete': '¿Eliminar definitivamente los elementos seleccionados?',
+        'items_updated': 'elementos actualizados.',
+        'items_deleted': 'elementos eliminados.',
+        'api_tokens': 'Tokens de API',
+        'api_tokens_hint': 'Tokens para aplicaciones de escáner y otros clientes de la API JSON (/api/v1). Se envían como "Authorization: Bearer <token>".',
+        'api_token_name': 'Nombre (p. ej. Escáner sótano)',
+        'api_token_create': 'Crear token',
+        'api_token_created': 'Token creado. Cópielo ahora, no se volverá a mostrar:',
+        'api_token_last_used': 'Último uso',
+        'really_revoke_token': '¿Revocar realmente este token?',
+        'stocktake': 'Inventario',
+        'stocktake_started': 'Iniciado',
+        'status': 'Estado',
+        'stocktake_open': 'Abierto',
+        'stocktake_closed': 'Cerrado',
+        'really_delete_stocktake': '¿Eliminar realmente este inventario y todos sus escaneos?',
+        'no_stocktakes': 'Aún no hay inventarios.',
+        'new_stocktake': 'Nuevo inventario',
+        'stocktake_location_hint': 'Se revisan todas las ubicaciones por debajo de esta.',
+        'start_stocktake': 'Empezar a escanear',
+        'stocktake_scans': 'escaneos',
+        'stocktake_scan_location': 'Escaneando en',
+        'stocktake_anywhere': 'Cualquiera',
+        'stocktake_scan_hint': 'Escanee o escriba el número de inventario + Enter',
+        'stocktake_pending': 'Aún no enviados',
+        'stocktake_offline': 'Conexión perdida: los escaneos se conservan y se reenvían.',
+        'stocktake_report': 'Informe',
+        'stocktake_continue': 'Seguir escaneando',
+        'stocktake_close': 'Cerrar inventario',
+        'stocktake_found': 'Encontrados',
+        'stocktake_misplaced': 'Mal ubicados',
+        'stocktake_missing': 'Faltantes',
+        'stocktake_unknown': 'Códigos desconocidos',
+        'stocktake_correct': 'Mover a la ubicación escaneada',
+        'stocktake_correct_confirm': '¿Mover todos los elementos mal ubicados a la ubicación donde se escanearon?',
+        'stocktake_list_limit': 'Las listas muestran como máximo',
+        'duplicate_candidates': 'Posibles duplicados',
+        'duplicate_candidates_desc': 'Encuentra elementos con título/artista similar, también sin código de barras',
+        'min_similarity': 'Similitud mínima',
+        'similarity': 'Similitud',
+        'merge': 'Fusionar',
+        'merge_keep': 'Conservar',
+        'really_merge': '¿Fusionar ambos elementos? El otro se elimina; se conservan sus datos y pistas que falten y sus préstamos.',
+        'items_merged': 'Elementos fusionados.',
+        'merge_both_lent': 'Ambos elementos están prestados. Devuelve uno de ellos antes de fusionar.',
+        'no_duplicates': 'No se encontraron posibles duplicados.',
+        'statistics': 'Estadísticas',
+        'total_playtime': 'Duración total',
+        'lending_history': 'Historial de préstamos',
+        'loans_total': 'Préstamos',
+        'loans_returned': 'Devueltos',
+        'avg_loan_duration': 'Duración media del préstamo',
+        'days': 'días',
+        'top_borrowers': 'Prestatarios principales',
+        'most_borrowed': 'Más prestados',
+        'database_tuning': 'Base de datos',
+        'database_tuning_desc': 'Ajustes SQLite de las conexiones (modificables con la variable de entorno SQLITE_PRAGMAS).',
+        'setting': 'Ajuste',
+        'configured': 'Configurado',
+        'active_value': 'Activo',
+        'auto_backup': 'Copias automáticas',
+        'auto_backup_desc': 'Archivos incrementales en la carpeta de copias (solo imágenes nuevas o modificadas), depurados según la política de retención. Configurable con las variables de entorno BACKUP_*.',
+        'backup_schedule': 'Programación',
+        'backup_schedule_off': 'Desactivado',
+        'next_run': 'Próxima ejecución',
+        'retention': 'Retención',
+        'daily': 'diarias',
+        'weekly': 'semanales',
+        'monthly': 'mensuales',
+        'backup_archives': 'Archivos',
+        'backup_now': 'Copiar ahora',
+        'started_at': 'Inicio',
+        'archive': 'Archivo',
+        'images_added': 'Imágenes nuevas',
+        'job_backup': 'Copia de seguridad',
+        'job_restore': 'Restauración',
     },
     'fr': {
         'app_name': 'Oryvian',
@@ -972,5 +1284,109 @@ TRANSLATIONS = {
         'export': 'Exporter',
         'export_excel': 'Export Excel',
         'export_format': 'Format d\'exportation',
+        'output_format': 'Sortie',
+        'output_html': 'Aperçu navigateur (boîte d\'impression)',
+        'output_pdf': 'PDF (vectoriel, taille exacte)',
+        'page_size': 'Format de page',
+        'page_size_label': 'Une étiquette par page (imprimante à rouleau)',
+        'pdf_download': 'Télécharger le PDF',
+        'export_all_matching': 'Exporter tous les résultats',
+        'export_job_hint': 'Tous les éléments correspondant au filtre actuel sont exportés en arrière-plan. Vous pouvez télécharger le fichier dès que la tâche est terminée.',
+        'job_status': 'Tâche en arrière-plan',
+        'job_export': 'Export',
+        'job_queued': 'En attente',
+        'job_running': 'En cours...',
+        'job_done': 'Terminé',
+        'job_failed': 'Échoué',
+        'download': 'Télécharger',
+        'job_import': 'Import',
+        'import_items': 'Importer des éléments',
+        'import_desc': "Importer des éléments depuis un fichier CSV ou Excel. Les colonnes sont les mêmes que pour l'export, les fichiers exportés peuvent donc être réimportés.",
+        'import_file': 'Fichier (.csv ou .xlsx)',
+        'import_columns_hint': 'Colonnes reconnues (nom du champ ou titre de colonne dans une langue quelconque) :',
+        'import_default_location': 'Emplacement pour les lignes sans emplacement',
+        'import_create_locations': 'Créer les emplacements manquants',
+        'import_dry_run': 'Essai (vérifier seulement, ne rien enregistrer)',
+        'import_submit': "Lancer l'import",
+        'select_all_matching': 'Tous les résultats',
+        'change_category': '-- Changer la catégorie en... --',
+        'mark_lent': 'Prêter',
+        'mark_returned': 'Rendu',
+        'confirm_bulk_delete': 'Supprimer définitivement les éléments sélectionnés ?',
+        'items_updated': 'éléments mis à jour.',
+        'items_deleted': 'éléments supprimés.',
+        'api_tokens': 'Jetons API',
+        'api_tokens_hint': 'Jetons pour les applications de scan et autres clients de l\'API JSON (/api/v1). Ils sont envoyés comme "Authorization: Bearer <token>".',
+        'api_token_name': 'Nom (ex. Scanner cave)',
+        'api_token_create': 'Créer un jeton',
+        'api_token_created': 'Jeton créé. Copiez-le maintenant, il ne sera plus affiché :',
+        'api_token_last_used': 'Dernière utilisation',
+        'really_revoke_token': 'Révoquer vraiment ce jeton ?',
+        'stocktake': 'Inventaire',
+        'stocktake_started': 'Commencé',
+        'status': 'Statut',
+        'stocktake_open': 'Ouvert',
+        'stocktake_closed': 'Clôturé',
+        'really_delete_stocktake': 'Supprimer vraiment cet inventaire et tous ses scans ?',
+        'no_stocktakes': 'Aucun inventaire pour le moment.',
+        'new_stocktake': 'Nouvel inventaire',
+        'stocktake_location_hint': 'Tous les emplacements situés sous celui-ci sont contrôlés.',
+        'start_stocktake': 'Commencer le scan',
+        'stocktake_scans': 'scans',
+        'stocktake_scan_location': 'Scan à',
+        'stocktake_anywhere': 'N\'importe où',
+        'stocktake_scan_hint': 'Scannez ou saisissez le numéro d\'inventaire + Entrée',
+        'stocktake_pending': 'Pas encore envoyés',
+        'stocktake_offline': 'Connexion perdue - les scans sont conservés et renvoyés.',
+        'stocktake_report': 'Rapport',
+        'stocktake_continue': 'Continuer le scan',
+        'stocktake_close': 'Clôturer l\'inventaire',
+        'stocktake_found': 'Trouvés',
+        'stocktake_misplaced': 'Mal placés',
+        'stocktake_missing': 'Manquants',
+        'stocktake_unknown': 'Codes inconnus',
+        'stocktake_correct': 'Déplacer vers l\'emplacement scanné',
+        'stocktake_correct_confirm': 'Déplacer tous les éléments mal placés vers l\'emplacement où ils ont été scannés ?',
+        'stocktake_list_limit': 'Les listes affichent au maximum',
+        'duplicate_candidates': 'Doublons possibles',
+        'duplicate_candidates_desc': 'Trouve les éléments au titre/artiste similaire, même sans code-barres',
+        'min_similarity': 'Similarité minimale',
+        'similarity': 'Similarité',
+        'merge': 'Fusionner',
+        'merge_keep': 'Conserver',
+        'really_merge': 'Fusionner les deux éléments ? L\'autre est supprimé, ses informations et pistes manquantes ainsi que ses prêts sont repris.',
+        'items_merged': 'Éléments fusionnés.',
+        'merge_both_lent': 'Les deux éléments sont prêtés. Rendez-en un avant la fusion.',
+        'no_duplicates': 'Aucun doublon possible trouvé.',
+        'statistics': 'Statistiques',
+        'total_playtime': 'Durée totale',
+        'lending_history': 'Historique des prêts',
+        'loans_total': 'Prêts',
+        'loans_returned': 'Rendus',
+        'avg_loan_duration': 'Durée moyenne de prêt',
+        'days': 'jours',
+        'top_borrowers': 'Principaux emprunteurs',
+        'most_borrowed': 'Les plus prêtés',
+        'database_tuning': 'Base de données',
+        'database_tuning_desc': 'Paramètres SQLite des connexions (modifiables via la variable d\'environnement SQLITE_PRAGMAS).',
+        'setting': 'Paramètre',
+        'configured': 'Configuré',
+        'active_value': 'Actif',
+        'auto_backup': 'Sauvegardes automatiques',
+        'auto_backup_desc': 'Archives incrémentielles dans le dossier de sauvegarde (seules les images nouvelles ou modifiées), nettoyées selon la règle de rétention. Configurables via les variables d\'environnement BACKUP_*.',
+        'backup_schedule': 'Planification',
+        'backup_schedule_off': 'Désactivée',
+        'next_run': 'Prochaine exécution',
+        'retention': 'Rétention',
+        'daily': 'quotidiennes',
+        'weekly': 'hebdomadaires',
+        'monthly': 'mensuelles',
+        'backup_archives': 'Archives',
+        'backup_now': 'Sauvegarder maintenant',
+        'started_at': 'Démarrée',
+        'archive': 'Archive',
+        'images_added': 'Images ajoutées',
+        'job_backup': 'Sauvegarde',
+        'job_restore': 'Restauration',
     },
 }
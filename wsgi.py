@@ -0,0 +1,6 @@
+# Plain WSGI entry point (any WSGI server; lookups then hold a thread while they wait).
+# The Docker image serves asgi:app instead, see gunicorn.conf.py.
+# Run `flask --app app init-db` once before starting (migrations, default data).
+from app import create_app
+
+app = create_app()